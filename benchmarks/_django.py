@@ -0,0 +1,42 @@
+# benchmarks/_django.py
+"""
+Shared bootstrap for the benchmark scripts. Each script is run from the project root, e.g.
+`python -m benchmarks.bench_throttle`, and works against a throwaway in-memory SQLite database
+unless DB_ENGINE/DB_NAME point somewhere else.
+"""
+import os
+import statistics
+import time
+
+
+def setup(migrate=False):
+    """Configures Django for a benchmark run, optionally creating the schema."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ecommerce_store.settings')
+    os.environ.setdefault('DB_ENGINE', 'django.db.backends.sqlite3')
+    os.environ.setdefault('DB_NAME', ':memory:')
+    os.environ.setdefault('DJANGO_DEBUG', 'False')
+    os.environ.setdefault('DJANGO_ALLOWED_HOSTS', 'testserver,localhost')
+
+    import django
+    django.setup()
+    if migrate:
+        from django.core.management import call_command
+        call_command('migrate', verbosity=0)
+
+
+def time_calls(func, repeat):
+    """Calls `func` `repeat` times and returns the per-call durations in microseconds."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        func()
+        samples.append((time.perf_counter_ns() - start) / 1000)
+    return samples
+
+
+def report(label, samples):
+    """Prints mean / p50 / p99 / max for a list of per-call microsecond timings."""
+    ordered = sorted(samples)
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+    print(f"{label:<40} n={len(samples):<8} mean={statistics.fmean(samples):8.2f}us "
+          f"p50={statistics.median(samples):8.2f}us p99={p99:8.2f}us max={ordered[-1]:9.2f}us")
@@ -0,0 +1,75 @@
+# benchmarks/bench_autocomplete.py
+"""
+Measures the product autocomplete index: build time, memory footprint and search latency.
+
+    python -m benchmarks.bench_autocomplete [--products 1000000] [--repeat N]
+
+Products are generated in memory (no database) and loaded with ProductAutocomplete.load().
+Memory is the tracemalloc growth retained by the loaded index, next to the same entries held
+as a plain sorted list of tuples. Search timings include the per-request version check against
+the configured cache, and cover 1-6 character prefixes of real names plus prefixes that match nothing.
+"""
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+
+from benchmarks import _django
+
+ADJECTIVES = ['Compact', 'Rugged', 'Wireless', 'Smart', 'Portable', 'Classic', 'Ultra', 'Café', 'Modular', 'Silent']
+NOUNS = ['Router', 'Camera', 'Lamp', 'Keyboard', 'Speaker', 'Table', 'Drone', 'Charger', 'Monitor', 'Backpack']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--products', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=100_000)
+    args = parser.parse_args()
+    _django.setup()
+
+    from django.core.cache import cache
+
+    from store.autocomplete import AUTOCOMPLETE_VERSION_KEY, ProductAutocomplete, product_entries
+
+    rng = random.Random(42)
+    rows = []
+    for pk in range(1, args.products + 1):
+        name = f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {rng.choice('ABCDEFGHJKLMNPRSTVXZ')}{rng.randrange(10_000)}"
+        rows.append((pk, name, f"{name.lower().replace(' ', '-').replace('é', 'e')}-{pk}"))
+
+    cache.set(AUTOCOMPLETE_VERSION_KEY, 0, timeout=None)
+    index = ProductAutocomplete()
+    start = time.perf_counter()
+    index.load(rows, version=0)
+    build_seconds = time.perf_counter() - start
+
+    index = ProductAutocomplete()
+    gc.collect()
+    tracemalloc.start()
+    index.load(rows, version=0)
+    gc.collect()
+    index_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    gc.collect()
+    tracemalloc.start()
+    tuples = sorted(product_entries(rows))
+    gc.collect()
+    tuple_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    entries = len(tuples)
+    del tuples
+
+    print(f"products: {args.products:,}  entries: {entries:,}  build: {build_seconds:.1f}s")
+    print(f"index memory: {index_bytes / 1e6:.1f}MB  (sorted list of tuples: {tuple_bytes / 1e6:.1f}MB)")
+
+    names = [name for _, name, _ in rng.sample(rows, 1000)]
+    queries = [name[:rng.randint(1, 6)] for name in names] + ['zzz', 'qx', 'wireless routerz']
+    position = iter(range(10 ** 12))
+    _django.report('search() limit=10', _django.time_calls(
+        lambda: index.search(queries[next(position) % len(queries)], 10), args.repeat))
+
+
+if __name__ == '__main__':
+    main()
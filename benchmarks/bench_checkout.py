@@ -0,0 +1,104 @@
+# benchmarks/bench_checkout.py
+"""
+Compares committing checkouts one transaction each with micro-batched commits.
+
+    python -m benchmarks.bench_checkout [--threads 16] [--orders 2000] [--batch-size 50] [--wait-ms 2]
+
+`--threads` threads commit `--orders` prepared checkouts (three cart lines each, drawn from a
+small catalog so stock rows are contended): first each in its own transaction, as
+CHECKOUT_BATCHING=False does, then through a MicroBatcher as CHECKOUT_BATCHING=True does. Reported per mode: throughput,
+p50 / p99 / max latency per checkout and, for batching, the mean batch size. A temporary SQLite
+file is used unless DB_ENGINE/DB_NAME say otherwise.
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--orders', type=int, default=2000)
+    parser.add_argument('--batch-size', type=int, default=50)
+    parser.add_argument('--wait-ms', type=float, default=2)
+    args = parser.parse_args()
+
+    os.environ.setdefault('DB_NAME', os.path.join(tempfile.mkdtemp(), 'checkout.sqlite3'))
+    from benchmarks import _django
+    _django.setup(migrate=True)
+
+    from django.db import OperationalError, connection
+
+    from store.checkout import MicroBatcher, _commit_batch, build_checkout, commit_checkouts
+    from store.factories import CategoryFactory, ProductFactory
+    from store.models import Cart, CartItem, User
+
+    products = ProductFactory.create_batch(20, stock=10 ** 6, category=CategoryFactory(name='Benchmark'))
+    rng = random.Random(1)
+
+    def prepare(label):
+        users = User.objects.bulk_create([User(username=f'{label}-{i}') for i in range(args.orders)])
+        carts = Cart.objects.bulk_create([Cart(user=user) for user in users])
+        CartItem.objects.bulk_create([CartItem(cart=cart, product=product, quantity=rng.randint(1, 3))
+                                      for cart in carts for product in rng.sample(products, 3)])
+        items = {}
+        for item in CartItem.objects.filter(cart__in=carts).select_related('product'):
+            items.setdefault(item.cart_id, []).append(item)
+        return [build_checkout(cart.user, items[cart.pk], {'city': 'Benchville'}) for cart in carts]
+
+    def commit_alone(checkout):
+        while True:
+            try:
+                return commit_checkouts([checkout])[0]
+            except OperationalError:  # SQLite: "database is locked"
+                continue
+
+    batch_sizes = []
+
+    def handler(checkouts):
+        batch_sizes.append(len(checkouts))
+        return _commit_batch(checkouts)
+
+    batcher = MicroBatcher(handler, args.batch_size, args.wait_ms / 1000, name='bench-checkout-batcher')
+    modes = (('per checkout', commit_alone),
+             ('batched', lambda checkout: batcher.submit(checkout).result()))
+
+    print(f"{'mode':<14} {'orders/s':>9} {'p50':>9} {'p99':>9} {'max':>9} {'batch':>6}")
+    for label, commit in modes:
+        pending = prepare(label.split()[0])
+        latencies, lock = [], threading.Lock()
+
+        def worker():
+            while True:
+                with lock:
+                    if not pending:
+                        break
+                    checkout = pending.pop()
+                start = time.perf_counter()
+                commit(checkout)
+                elapsed = (time.perf_counter() - start) * 1000
+                with lock:
+                    latencies.append(elapsed)
+            connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(args.threads)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        ordered = sorted(latencies)
+        p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+        batch = f"{statistics.fmean(batch_sizes):.1f}" if batch_sizes else '-'
+        print(f"{label:<14} {len(latencies) / elapsed:>9,.0f} {statistics.median(ordered):>7.1f}ms "
+              f"{p99:>7.1f}ms {ordered[-1]:>7.1f}ms {batch:>6}")
+
+
+if __name__ == '__main__':
+    main()
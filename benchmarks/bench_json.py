@@ -0,0 +1,83 @@
+# benchmarks/bench_json.py
+"""
+Compares JSON encoding of large API list responses: DRF's JSONRenderer, store.renderers.FastJSONRenderer,
+and the streamed array written by StreamingJSONRenderer.
+
+    python -m benchmarks.bench_json [--rows 100000] [--repeat N] [--chunk-size N]
+
+Rows are built in memory (no database) in two shapes: "serialized" rows as ProductSerializer
+returns them (decimals and datetimes already strings) and "raw" rows holding Decimal and
+datetime values, as in the sales report. Timings cover encoding only (rows are prebuilt). Peak
+memory, measured with tracemalloc in a separate pass, includes building the rows: the full
+renderers need the whole list in memory, while the streamed encoder pulls rows from a generator
+and drops each chunk once written, as a StreamingHttpResponse does.
+"""
+import argparse
+import statistics
+import time
+import tracemalloc
+from datetime import timedelta
+from decimal import Decimal
+
+from benchmarks import _django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--chunk-size', type=int, default=500)
+    args = parser.parse_args()
+    _django.setup()
+
+    from django.utils import timezone
+    from rest_framework.renderers import JSONRenderer
+
+    from store.renderers import FastJSONRenderer, StreamingJSONRenderer
+
+    now = timezone.now()
+    description = "A compact, field-ready device for hardware hacking and security research."
+
+    def serialized_row(pk):
+        return {'id': pk, 'name': f"Product {pk}", 'slug': f"product-{pk}", 'description': description,
+                'price': f"{19 + pk % 500}.99", 'stock': pk % 7, 'is_available': True, 'category': pk % 12,
+                'category_name': f"Category {pk % 12}", 'image': None,
+                'date_added': (now - timedelta(minutes=pk)).isoformat(), 'date_updated': now.isoformat()}
+
+    def raw_row(pk):
+        return {'day': (now - timedelta(days=pk % 365)).date(), 'product_id': pk, 'units': pk % 40,
+                'revenue': Decimal(pk % 5000) + Decimal('0.99'), 'order_count': pk % 17, 'updated': now}
+
+    def drf(rows):
+        return len(JSONRenderer().render(list(rows)))
+
+    def fast(rows):
+        return len(FastJSONRenderer().render(list(rows)))
+
+    def streamed(rows):
+        return sum(len(chunk) for chunk in StreamingJSONRenderer().render_stream(iter(rows), args.chunk_size))
+
+    print(f"{'rows':<11} {'encoder':<9} {'median':>10} {'rows/s':>12} {'MB/s':>8} {'size':>9} {'peak mem':>10}")
+    for shape, make_row in (('serialized', serialized_row), ('raw', raw_row)):
+        prebuilt = [make_row(pk) for pk in range(args.rows)]
+        for label, encode in (('drf', drf), ('fast', fast), ('streamed', streamed)):
+            samples = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                size = encode(prebuilt)
+                samples.append(time.perf_counter() - start)
+            seconds = statistics.median(samples)
+
+            # Memory includes the rows themselves: a generator for the streamed encoder,
+            # a fully materialized list (as ListSerializer.data is) for the others.
+            tracemalloc.start()
+            encode(make_row(pk) for pk in range(args.rows))
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            print(f"{shape:<11} {label:<9} {seconds * 1000:>8.0f}ms {args.rows / seconds:>12,.0f} "
+                  f"{size / seconds / 1e6:>8.1f} {size / 1e6:>7.1f}MB {peak / 1e6:>8.1f}MB")
+
+
+if __name__ == '__main__':
+    main()
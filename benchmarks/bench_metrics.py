@@ -0,0 +1,65 @@
+# benchmarks/bench_metrics.py
+"""
+Measures the cost of recording metrics on hot paths and of a /metrics scrape.
+
+    python -m benchmarks.bench_metrics [--repeat N] [--workers 8] [--routes 60]
+
+Per-event timings cover a labelled counter increment, a histogram observation and the full
+per-request bookkeeping done by MetricsMiddleware (observe_request), first with in-memory
+values and then with memory-mapped files in a temporary METRICS_DIR. The scrape is timed with
+`--workers` forked processes that have each recorded requests on `--routes` routes.
+"""
+import argparse
+import os
+import tempfile
+
+from benchmarks import _django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=200_000)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--routes', type=int, default=60)
+    args = parser.parse_args()
+    _django.setup()
+
+    from django.test import override_settings
+
+    from store import metrics
+
+    def record_events(label):
+        counter = metrics.CHECKOUTS
+        histogram = metrics.STRIPE_REQUEST_DURATION
+        _django.report(f'{label}: counter.labels().inc()',
+                       _django.time_calls(lambda: counter.labels('success').inc(), args.repeat))
+        _django.report(f'{label}: histogram.labels().observe()',
+                       _django.time_calls(lambda: histogram.labels('payment_intent.create', 'ok').observe(0.042),
+                                          args.repeat))
+        _django.report(f'{label}: observe_request()',
+                       _django.time_calls(lambda: metrics.observe_request('api-product-list', 'GET', 200, 0.012),
+                                          args.repeat))
+
+    metrics._forget_values()
+    record_events('memory')
+
+    with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+        metrics._forget_values()
+        record_events('mmap')
+
+        for worker in range(args.workers):
+            pid = os.fork()
+            if pid == 0:
+                for route in range(args.routes):
+                    for status_code in (200, 404):
+                        metrics.observe_request(f'route-{route}', 'GET', status_code, 0.001 * route)
+                os._exit(0)
+            os.waitpid(pid, 0)
+        output = metrics.render_metrics()
+        print(f"scrape: {args.workers + 1} files, {output.count(chr(10)):,} lines, {len(output) / 1e3:.0f}KB")
+        _django.report('render_metrics()', _django.time_calls(metrics.render_metrics, 20))
+        metrics._forget_values()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+# benchmarks/bench_render.py
+"""
+Compares product list page render times with cold and warm product card fragment caches.
+
+    python -m benchmarks.bench_render [--sizes 1000 5000 10000] [--repeat N]
+
+Products are built in memory (no database) so only template rendering is measured.
+"uncached" uses a DummyCache, i.e. every card is rendered on every request; "cold" and "warm"
+use a local-memory cache large enough to hold every card.
+"""
+import argparse
+import statistics
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from benchmarks import _django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 5000, 10000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    _django.setup()
+
+    from django.contrib.auth.models import AnonymousUser
+    from django.core.cache import cache
+    from django.template.loader import render_to_string
+    from django.test import RequestFactory, override_settings
+    from django.utils import timezone
+
+    from store.models import Product
+
+    now = timezone.now()
+    description = "A compact, field-ready device for hardware hacking and security research. " * 4
+    facets = {'count': 0, 'categories': [], 'price_ranges': [], 'stock': {'in_stock': 0, 'out_of_stock': 0}}
+
+    def render(products):
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        context = {'products': products, 'sort': 'newest', 'facets': facets, 'filters': {}}
+        return render_to_string('store/product_list.html', context, request=request)
+
+    def timed(products, before=None):
+        samples = []
+        for _ in range(args.repeat):
+            if before:
+                before()
+            start = time.perf_counter()
+            render(products)
+            samples.append((time.perf_counter() - start) * 1000)
+        return statistics.median(samples)
+
+    print(f"{'products':>9} {'uncached':>12} {'cold':>12} {'warm':>12} {'speedup':>8}")
+    for size in args.sizes:
+        products = [
+            Product(pk=pk, name=f"Product {pk}", slug=f"product-{pk}", description=description,
+                    price=Decimal('19.99') + pk, stock=pk % 7, date_updated=now - timedelta(minutes=pk))
+            for pk in range(1, size + 1)
+        ]
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}):
+            uncached = timed(products)
+        # The default local-memory cache only keeps 300 entries; size it like a real shared cache.
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                                   'OPTIONS': {'MAX_ENTRIES': 10 * size}}}):
+            cold = timed(products, before=cache.clear)
+            render(products)
+            warm = timed(products)
+        print(f"{size:>9} {uncached:>10.1f}ms {cold:>10.1f}ms {warm:>10.1f}ms {uncached / warm:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+# benchmarks/bench_startup.py
+"""
+Measures worker cold start: module import cost and time to first response.
+
+    python -m benchmarks.bench_startup [--runs 5] [--top 15] [--path /api/products/ ...]
+
+A throwaway SQLite database is migrated and seeded once. Each run then starts a fresh Python
+process that loads ecommerce_store.wsgi (as a server worker does) and sends requests straight to
+the WSGI application, with and without WORKER_WARMUP. Reported per mode: boot time and the
+first and second response time for each path (medians over --runs). One extra run under
+`python -X importtime` breaks the imports done by boot plus the first requests down by
+top-level package.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+
+WORKER = r'''
+import io, json, sys, time
+start = time.perf_counter()
+from ecommerce_store.wsgi import application
+timings = {'boot': time.perf_counter() - start}
+
+def get(url):
+    path, _, query = url.partition('?')
+    environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query, 'SERVER_NAME': 'localhost',
+               'SERVER_PORT': '80', 'HTTP_HOST': 'localhost', 'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr,
+               'wsgi.url_scheme': 'http', 'wsgi.multithread': False, 'wsgi.multiprocess': True,
+               'wsgi.run_once': False}
+    statuses = []
+    start = time.perf_counter()
+    body = b''.join(application(environ, lambda status, headers, exc_info=None: statuses.append(status)))
+    assert statuses[0].startswith('200'), (url, statuses, body[:500])
+    return time.perf_counter() - start
+
+for path in sys.argv[1:]:
+    timings[path] = [get(path), get(path)]
+timings['modules'] = len(sys.modules)
+print(json.dumps(timings))
+'''
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--path', action='append', default=None,
+                        help="Path to request (repeatable); defaults to a few cheap pages and API endpoints.")
+    args = parser.parse_args()
+    paths = args.path or ['/login/', '/product/1/', '/api/categories/', '/api/products/autocomplete/?q=s']
+
+    with tempfile.TemporaryDirectory() as directory:
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': 'ecommerce_store.settings',
+               'DB_ENGINE': 'django.db.backends.sqlite3', 'DB_NAME': os.path.join(directory, 'startup.sqlite3'),
+               'DJANGO_DEBUG': 'False', 'DJANGO_ALLOWED_HOSTS': 'localhost', 'PYTHONDONTWRITEBYTECODE': ''}
+        for command in (['migrate', '-v', '0'], ['seed_data', '--users', '50', '--products', '500',
+                                                 '--orders', '500', '--seed', '1']):
+            subprocess.run([sys.executable, 'manage.py', *command], env=env, check=True, stdout=subprocess.DEVNULL)
+
+        print(f"{'mode':<8} {'path':<32} {'boot':>9} {'1st request':>12} {'2nd request':>12} {'modules':>8}")
+        for mode, warmup in (('cold', 'False'), ('warmup', 'True')):
+            runs = [_run_worker(paths, {**env, 'WORKER_WARMUP': warmup}) for _ in range(args.runs)]
+            boot = statistics.median(run['boot'] for run in runs) * 1000
+            modules = statistics.median(run['modules'] for run in runs)
+            for path in paths:
+                first = statistics.median(run[path][0] for run in runs) * 1000
+                second = statistics.median(run[path][1] for run in runs) * 1000
+                print(f"{mode:<8} {path:<32} {boot:>7.0f}ms {first:>10.1f}ms {second:>10.1f}ms {modules:>8.0f}")
+
+        by_package, total = _import_times(paths, env)
+        print(f"\nimports during boot and first requests (cold): {total / 1000:.0f}ms")
+        for package, micros in sorted(by_package.items(), key=lambda item: -item[1])[:args.top]:
+            print(f"  {package:<28} {micros / 1000:>8.1f}ms")
+
+
+def _run_worker(paths, env, *flags):
+    result = subprocess.run([sys.executable, *flags, '-c', WORKER, *paths], env=env, check=True,
+                            capture_output=True, text=True)
+    return json.loads(result.stdout) if not flags else result.stderr
+
+
+def _import_times(paths, env):
+    """Self time per top-level package from `-X importtime` output, in microseconds, plus the total."""
+    by_package = defaultdict(int)
+    for line in _run_worker(paths, env, '-X', 'importtime').splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        by_package[name.strip().split('.')[0]] += int(self_us)
+    return by_package, sum(by_package.values())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+# benchmarks/bench_throttle.py
+"""
+Measures the overhead the token-bucket throttle adds to each request.
+
+    python -m benchmarks.bench_throttle [--repeat N]
+
+Reports the cost of a bare bucket operation and of the full middleware check
+(route-group lookup, identity resolution and bucket update) against the configured cache.
+"""
+import argparse
+
+from benchmarks import _django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=100_000)
+    args = parser.parse_args()
+    _django.setup()
+
+    from django.contrib.auth.models import AnonymousUser
+    from django.core.cache import cache, caches
+    from django.test import RequestFactory, override_settings
+    from django.urls import resolve
+
+    from store.middleware import ThrottleMiddleware
+    from store.throttling import consume
+    from store.views import product_list
+
+    backend = caches['default'].__class__
+    print(f"cache backend: {backend.__module__}.{backend.__name__}")
+    cache.clear()
+
+    # A huge, slowly refilling bucket so every call takes the common "allowed" path (a single incr).
+    _django.report('consume() allowed', _django.time_calls(
+        lambda: consume('bench:allowed', capacity=10 ** 9, period=10 ** 6), args.repeat))
+    # An empty bucket so every call takes the "rejected" path (incr + decr + touch).
+    consume('bench:rejected', capacity=1, period=3600)
+    _django.report('consume() rejected', _django.time_calls(
+        lambda: consume('bench:rejected', capacity=1, period=3600), args.repeat))
+
+    middleware = ThrottleMiddleware(lambda request: None)
+    request = RequestFactory().get('/')
+    request.user = AnonymousUser()
+    request.resolver_match = resolve('/')
+    with override_settings(THROTTLE_RATES={'catalog': f'{10 ** 9}/d', 'default': None}):
+        _django.report('ThrottleMiddleware.process_view()', _django.time_calls(
+            lambda: middleware.process_view(request, product_list, (), {}), args.repeat))
+
+
+if __name__ == '__main__':
+    main()
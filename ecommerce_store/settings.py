@@ -32,6 +32,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'store.middleware.MetricsMiddleware',
+    'store.middleware.QueryInspectionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -39,6 +41,8 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'store.middleware.ThrottleMiddleware',
+    'store.middleware.UserDataMovingMiddleware',
 ]
 
 ROOT_URLCONF = 'ecommerce_store.urls'
@@ -60,6 +64,17 @@ TEMPLATES = [
     },
 ]
 
+if not DEBUG:
+    # Compile each template once per process. Django already does this by default; pinning it
+    # here keeps production fast even if custom loaders are added later.
+    TEMPLATES[0]['APP_DIRS'] = False
+    TEMPLATES[0]['OPTIONS']['loaders'] = [
+        ('django.template.loaders.cached.Loader', [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ]),
+    ]
+
 WSGI_APPLICATION = 'ecommerce_store.wsgi.application'
 
 # --- Database Configuration ---
@@ -83,6 +98,39 @@ DATABASES = {
     }
 }
 
+# --- User Sharding ---
+# Carts and orders (Cart, CartItem, Order, OrderItem) are spread over USER_SHARDS databases by a
+# consistent hash of the user id (store.sharding, store.routers); the catalog, users and all other
+# tables stay on 'default', which is also shard 0. Shard N is DB_SHARD_N_NAME on DB_SHARD_N_HOST
+# (same credentials as 'default'; the name defaults to '<DB_NAME>_shard_N'). After adding shards,
+# migrate each one (`manage.py migrate --database shard_N`) and run `manage.py reshard_users`.
+USER_SHARDS = int(os.getenv('USER_SHARDS', '1'))
+for _index in range(1, USER_SHARDS):
+    DATABASES[f'shard_{_index}'] = {
+        **DATABASES['default'],
+        'NAME': os.getenv(f'DB_SHARD_{_index}_NAME', f"{DATABASES['default']['NAME']}_shard_{_index}"),
+        'HOST': os.getenv(f'DB_SHARD_{_index}_HOST', DATABASES['default']['HOST']),
+    }
+USER_SHARD_ALIASES = ['default'] + [f'shard_{index}' for index in range(1, USER_SHARDS)]
+DATABASE_ROUTERS = ['store.routers.UserShardRouter']
+# `manage.py reshard_users` moves this many users per batch; their requests get a 503 for
+# USER_MOVE_GRACE_SECONDS plus the copy time while in-flight requests finish.
+USER_RESHARD_BATCH_SIZE = int(os.getenv('USER_RESHARD_BATCH_SIZE', '500'))
+USER_MOVE_GRACE_SECONDS = float(os.getenv('USER_MOVE_GRACE_SECONDS', '2'))
+
+# --- Caching ---
+# Use a shared backend (e.g. django.core.cache.backends.redis.RedisCache) in production so
+# every worker process sees the same entries; the local-memory default is per process.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+if CACHES['default']['BACKEND'].endswith('LocMemCache'):
+    # The 300-entry default is far too small once product cards are cached individually.
+    CACHES['default']['OPTIONS'] = {'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', '20000'))}
+
 # --- Password Validation ---
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -111,14 +159,169 @@ LOGIN_URL = 'login_page'
 
 # --- DRF and JWT Settings ---
 REST_FRAMEWORK = {
-    'DEFAULT_AUTHENTICATION_CLASSES': ('rest_framework_simplejwt.authentication.JWTAuthentication',),
+    'DEFAULT_AUTHENTICATION_CLASSES': ('store.authentication.CachedJWTAuthentication',),
+    'DEFAULT_THROTTLE_CLASSES': ('store.throttling.TokenBucketThrottle',),
+    'DEFAULT_RENDERER_CLASSES': (
+        'store.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    # Reverse proxies in front of the app. Anonymous clients are throttled per IP, so with the default
+    # 0 X-Forwarded-For is ignored (a client could rotate it); behind N proxies, set NUM_PROXIES=N.
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', '0')),
 }
+# Unpaginated API lists longer than this many rows are streamed (store.renderers.StreamingListMixin).
+API_STREAM_CHUNK_SIZE = int(os.getenv('API_STREAM_CHUNK_SIZE', '500'))
 
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
+    # Embeds a digest of the password hash in each token so a password change revokes it.
+    'CHECK_REVOKE_TOKEN': True,
 }
+# How long store.authentication.CachedJWTAuthentication may serve a user without a DB query; also
+# the longest a User write that bypasses signals and invalidate_cached_user() goes unnoticed.
+AUTH_USER_CACHE_TIMEOUT = int(os.getenv('AUTH_USER_CACHE_TIMEOUT', '60'))
+
+# --- Catalog ---
+# Upper edges of the price facet buckets; the last bucket is open-ended.
+PRODUCT_PRICE_BUCKETS = [int(edge) for edge in os.getenv('PRODUCT_PRICE_BUCKETS', '25,100,500').split(',')]
+FACET_CACHE_TIMEOUT = int(os.getenv('FACET_CACHE_TIMEOUT', '300'))
+# Rendered product cards are keyed on id + date_updated, so they can live long.
+FRAGMENT_CACHE_TIMEOUT = int(os.getenv('FRAGMENT_CACHE_TIMEOUT', '86400'))
+# Full-page cache for anonymous catalog pages (store.page_cache). A non-zero stale window keeps
+# serving an expired or invalidated page while one request re-renders it.
+PAGE_CACHE_TIMEOUT = int(os.getenv('PAGE_CACHE_TIMEOUT', '120'))
+PAGE_CACHE_STALE_SECONDS = int(os.getenv('PAGE_CACHE_STALE_SECONDS', '0'))
+# Product autocomplete (store.autocomplete): each worker keeps its own prefix index, built by its first
+# search (or at startup with WORKER_WARMUP) and caught up from a shared change log; AUTOCOMPLETE_COMPACT_AFTER changed products are folded
+# into a fresh index, and a worker more than AUTOCOMPLETE_MAX_CATCHUP changes behind rebuilds.
+AUTOCOMPLETE_LIMIT = int(os.getenv('AUTOCOMPLETE_LIMIT', '10'))
+AUTOCOMPLETE_COMPACT_AFTER = int(os.getenv('AUTOCOMPLETE_COMPACT_AFTER', '5000'))
+AUTOCOMPLETE_MAX_CATCHUP = int(os.getenv('AUTOCOMPLETE_MAX_CATCHUP', '1000'))
+AUTOCOMPLETE_CHANGE_LOG_TIMEOUT = int(os.getenv('AUTOCOMPLETE_CHANGE_LOG_TIMEOUT', '86400'))
+
+# --- Analytics ---
+# Orders younger than this are left for the next rollup run so in-flight checkouts are never half-counted.
+SALES_ROLLUP_SETTLE_SECONDS = int(os.getenv('SALES_ROLLUP_SETTLE_SECONDS', '60'))
+
+# Popularity scores are units sold, exponentially decayed by order age (half-life in days).
+POPULARITY_WINDOW_DAYS = int(os.getenv('POPULARITY_WINDOW_DAYS', '90'))
+POPULARITY_HALF_LIFE_DAYS = float(os.getenv('POPULARITY_HALF_LIFE_DAYS', '30'))
+TRENDING_HALF_LIFE_DAYS = float(os.getenv('TRENDING_HALF_LIFE_DAYS', '3'))
+TOP_PRODUCTS_LIMIT = int(os.getenv('TOP_PRODUCTS_LIMIT', '20'))
+TOP_PRODUCTS_CACHE_TIMEOUT = int(os.getenv('TOP_PRODUCTS_CACHE_TIMEOUT', '3600'))
+
+# --- Recommendations ---
+# `manage.py refresh_recommendations` stores the top RECOMMENDATIONS_TOP_K "frequently bought together"
+# products per product; orders with more distinct products than RECOMMENDATIONS_MAX_ORDER_ITEMS are ignored.
+RECOMMENDATIONS_TOP_K = int(os.getenv('RECOMMENDATIONS_TOP_K', '10'))
+RECOMMENDATIONS_CHUNK_SIZE = int(os.getenv('RECOMMENDATIONS_CHUNK_SIZE', '5000'))
+RECOMMENDATIONS_MAX_ORDER_ITEMS = int(os.getenv('RECOMMENDATIONS_MAX_ORDER_ITEMS', '50'))
+RELATED_PRODUCTS_LIMIT = int(os.getenv('RELATED_PRODUCTS_LIMIT', '4'))
+
+# --- Carts ---
+# `manage.py purge_carts` deletes carts idle this long (items included), and empty carts after the grace period.
+CART_IDLE_DAYS = int(os.getenv('CART_IDLE_DAYS', '30'))
+CART_EMPTY_GRACE_HOURS = int(os.getenv('CART_EMPTY_GRACE_HOURS', '24'))
+CART_PURGE_CHUNK_SIZE = int(os.getenv('CART_PURGE_CHUNK_SIZE', '500'))
+# Anonymous visitors keep their cart in a signed cookie (store.carts) until they log in or register.
+GUEST_CART_MAX_AGE = int(os.getenv('GUEST_CART_MAX_AGE', str(14 * 24 * 3600)))
+GUEST_CART_MAX_ITEMS = int(os.getenv('GUEST_CART_MAX_ITEMS', '50'))
+
+# --- Order Archive ---
+# `manage.py archive_orders` moves completed orders older than this into the archive tables
+# (never sooner than POPULARITY_WINDOW_DAYS, which the popularity scores still read).
+ORDER_ARCHIVE_AFTER_DAYS = int(os.getenv('ORDER_ARCHIVE_AFTER_DAYS', '365'))
+ORDER_ARCHIVE_BATCH_SIZE = int(os.getenv('ORDER_ARCHIVE_BATCH_SIZE', '500'))
+ORDER_HISTORY_PAGE_SIZE = int(os.getenv('ORDER_HISTORY_PAGE_SIZE', '10'))
+
+# --- Checkout ---
+# With CHECKOUT_BATCHING, each worker process queues validated checkouts and commits them from one
+# background thread (store.checkout) in batches of up to CHECKOUT_BATCH_SIZE, cut at most
+# CHECKOUT_BATCH_WAIT_MS after the first checkout arrives: one transaction and a handful of
+# set-based statements per batch instead of per order. Worth it under peak checkout load.
+CHECKOUT_BATCHING = os.getenv('CHECKOUT_BATCHING', 'False') == 'True'
+CHECKOUT_BATCH_SIZE = int(os.getenv('CHECKOUT_BATCH_SIZE', '50'))
+CHECKOUT_BATCH_WAIT_MS = float(os.getenv('CHECKOUT_BATCH_WAIT_MS', '2'))
+# How long past the batch window a request waits for its batch before committing on its own.
+CHECKOUT_BATCH_TIMEOUT_SECONDS = float(os.getenv('CHECKOUT_BATCH_TIMEOUT_SECONDS', '10'))
+
+# --- Flash Sales ---
+# Products with is_flash_sale take their stock at checkout from a counter in the default cache
+# (store.flash_sale) instead of locking their row; use a cache shared by all workers (Redis,
+# Memcached). The sales are recorded as pending decrements that `manage.py flush_flash_stock`
+# folds into Product.stock in batches. After a restock the product's checkouts are paused for
+# FLASH_SALE_PAUSE_SECONDS while its counter is reloaded from the database.
+FLASH_SALE_PAUSE_SECONDS = int(os.getenv('FLASH_SALE_PAUSE_SECONDS', '5'))
+FLASH_STOCK_FLUSH_BATCH_SIZE = int(os.getenv('FLASH_STOCK_FLUSH_BATCH_SIZE', '1000'))
+
+# --- Throttling ---
+# Token-bucket limits per route group, applied per user (or per IP when anonymous) by
+# store.throttling.TokenBucketThrottle (API) and store.middleware.ThrottleMiddleware (web pages).
+# '<capacity>/<period>': a full bucket allows a burst of `capacity`, refilled evenly over `period`.
+# A group mapped to None is never throttled; unlisted URL names fall into 'default'.
+THROTTLE_RATES = {
+    'auth': os.getenv('THROTTLE_RATE_AUTH', '20/min'),
+    'autocomplete': os.getenv('THROTTLE_RATE_AUTOCOMPLETE', '1200/min'),
+    'catalog': os.getenv('THROTTLE_RATE_CATALOG', '300/min'),
+    'checkout': None,
+    'default': os.getenv('THROTTLE_RATE_DEFAULT', '600/min'),
+    'webhooks': None,
+}
+THROTTLE_ROUTE_GROUPS = {
+    'token_obtain_pair': 'auth',
+    'token_refresh': 'auth',
+    'api-register': 'auth',
+    'login_page': 'auth',
+    'register_page': 'auth',
+    'api-product-list': 'catalog',
+    'api-product-detail': 'catalog',
+    'api-product-facets': 'catalog',
+    'api-product-top': 'catalog',
+    'api-product-related': 'catalog',
+    'api-product-autocomplete': 'autocomplete',
+    'product_list': 'catalog',
+    'product_detail': 'catalog',
+    'order-create': 'checkout',
+    'checkout_page': 'checkout',
+    'create_order_from_cart': 'checkout',
+    'api-create-payment-intent': 'checkout',
+    'api-confirm-order-payment': 'checkout',
+    'api-stripe-webhook': 'webhooks',
+}
+
+# --- Worker Startup ---
+# With WORKER_WARMUP, wsgi.py / asgi.py build the autocomplete index, import the views and compile
+# every URL pattern and template at boot (store.warmup), so a freshly started worker answers its
+# first requests at full speed. It costs a full catalog scan per boot (about 8s per 1M products).
+WORKER_WARMUP = os.getenv('WORKER_WARMUP', 'False') == 'True'
+
+# --- Query Inspection ---
+# store.middleware.QueryInspectionMiddleware fingerprints every query of a request. A query shape
+# run QUERY_REPEAT_THRESHOLD times in one request (an N+1, typically from a template variable or a
+# serializer field) is logged to 'store.queries' with the store/ frame, serializer field and
+# template line it came from, or raises RepeatedQueryError with QUERY_REPEAT_ACTION='raise'.
+# On by default only with DEBUG. Queries slower than SLOW_QUERY_MS are logged with the same
+# attribution in every environment. 0 turns either check off.
+QUERY_REPEAT_THRESHOLD = int(os.getenv('QUERY_REPEAT_THRESHOLD', '5' if DEBUG else '0'))
+QUERY_REPEAT_ACTION = os.getenv('QUERY_REPEAT_ACTION', 'warn')
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', '500'))
+
+# --- Monitoring ---
+# Prometheus metrics are served at /metrics (store.metrics). With several worker processes,
+# point METRICS_DIR at a directory they share: each worker keeps its counters in its own
+# memory-mapped file there and a scrape sums them all, folding the files of exited workers into
+# its own. The directory must not be shared across hosts or containers (pids are checked
+# locally); empty it when the server (re)starts. When METRICS_TOKEN is set, scrapes must send
+# `Authorization: Bearer <token>`; without it only logged-in staff may scrape.
+METRICS_DIR = os.getenv('METRICS_DIR')
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
 
 # --- Third-Party Service Keys ---
 STRIPE_PUBLISHABLE_KEY = os.getenv('STRIPE_PUBLISHABLE_KEY')
 STRIPE_SECRET_KEY = os.getenv('STRIPE_SECRET_KEY')
+# Signing secret of the webhook endpoint (/api/payment/webhook/). Received events are queued in the
+# StripeEvent inbox and applied in batches by `manage.py process_stripe_events`.
+STRIPE_WEBHOOK_SECRET = os.getenv('STRIPE_WEBHOOK_SECRET')
+STRIPE_WEBHOOK_TOLERANCE = int(os.getenv('STRIPE_WEBHOOK_TOLERANCE', '300'))
+STRIPE_EVENT_BATCH_SIZE = int(os.getenv('STRIPE_EVENT_BATCH_SIZE', '200'))
@@ -9,6 +9,8 @@ from django.conf import settings
 from django.conf.urls.static import static
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
+from store.views import metrics_view
+
 # =============================================================================
 # --- URL Patterns ---
 # =============================================================================
@@ -22,6 +24,9 @@ urlpatterns = [
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
 
+    # --- Prometheus Metrics ---
+    path('metrics', metrics_view, name='metrics'),
+
     # --- Web Page Endpoints ---
     path('', include('store.urls')),
 ]
@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ecommerce_store.settings')
 
 application = get_wsgi_application()
+
+# With WORKER_WARMUP, build this worker's product autocomplete index and compile the URL
+# patterns and templates before it serves its first request.
+from store.warmup import warm_up_worker  # noqa: E402
+
+warm_up_worker()
@@ -1,7 +1,16 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
+from django.core.exceptions import PermissionDenied
+from django.db.models import Max, Min
+from django.template.response import TemplateResponse
+from django.urls import path
 
-from store.models import User, Category, Product, Cart, OrderItem, Order, CartItem
+from store.analytics import sales_report
+from store.bulk import bulk_update_products
+from store.forms import ProductBulkUpdateForm
+from store.models import (
+    User, Category, Product, Cart, OrderItem, Order, CartItem, DailySales, ArchivedOrder, ArchivedOrderItem
+)
 
 
 @admin.register(User)
@@ -25,11 +34,34 @@ class CategoryAdmin(admin.ModelAdmin):
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
     prepopulated_fields = {'slug': ('name',)}
-    list_display = ('name', 'category', 'price', 'stock', 'is_available', 'date_updated')
-    list_filter = ('is_available', 'category', 'date_updated')
+    list_display = ('name', 'category', 'price', 'stock', 'is_available', 'is_flash_sale', 'date_updated')
+    list_filter = ('is_available', 'is_flash_sale', 'category', 'date_updated')
     list_editable = ('price', 'stock', 'is_available')
     search_fields = ('name', 'description')
     ordering = ('-date_updated',)
+    change_list_template = 'admin/store/product/change_list.html'
+
+    def get_urls(self):
+        return [
+            path('bulk-update/', self.admin_site.admin_view(self.bulk_update_view), name='store_product_bulk_update'),
+        ] + super().get_urls()
+
+    def bulk_update_view(self, request):
+        """Uploads a CSV/JSON price and stock file and shows the per-row result report."""
+        if not self.has_change_permission(request):
+            raise PermissionDenied
+        report = None
+        form = ProductBulkUpdateForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            report = bulk_update_products(form.cleaned_data['file'], dry_run=form.cleaned_data['dry_run'])
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': "Bulk update prices and stock",
+            'form': form,
+            'report': report,
+        }
+        return TemplateResponse(request, 'admin/store/product/bulk_update.html', context)
 
 
 @admin.register(Cart)
@@ -66,3 +98,54 @@ class OrderItemAdmin(admin.ModelAdmin):
     list_display = ('order', 'product', 'quantity', 'price_at_purchase', 'get_cost')
     list_filter = ('order__user', 'product')
     search_fields = ('product__name', 'order__id', 'order__user__username')
+
+
+class ArchivedOrderItemInline(admin.TabularInline):
+    model = ArchivedOrderItem
+    fields = ('product', 'quantity', 'price_at_purchase', 'get_cost')
+    readonly_fields = fields
+    can_delete = False
+    extra = 0
+
+
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(admin.ModelAdmin):
+    """Read-only view of orders moved out of the hot tables by `manage.py archive_orders`."""
+    list_display = ('id', 'user', 'total_amount', 'date_ordered', 'date_archived', 'transaction_id')
+    date_hierarchy = 'date_ordered'
+    search_fields = ('id', 'user__username', 'transaction_id')
+    inlines = [ArchivedOrderItemInline]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(DailySales)
+class SalesDashboardAdmin(admin.ModelAdmin):
+    """Sales dashboard built purely from the rollup tables; never touches Order/OrderItem."""
+    change_list_template = 'admin/store/dailysales/sales_dashboard.html'
+    list_display = ('day', 'units', 'revenue', 'order_count')
+    date_hierarchy = 'day'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def changelist_view(self, request, extra_context=None):
+        response = super().changelist_view(request, extra_context=extra_context)
+        try:
+            queryset = response.context_data['cl'].queryset
+        except (AttributeError, KeyError):
+            return response  # e.g. a redirect for invalid lookup parameters
+
+        bounds = queryset.aggregate(start=Min('day'), end=Max('day'))
+        response.context_data.update({
+            'top_categories': sales_report('category', limit=10, **bounds),
+            'top_products': sales_report('product', limit=10, **bounds),
+        })
+        return response
@@ -0,0 +1,217 @@
+# store/analytics.py
+
+# --- Django & Python Imports ---
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+# --- Local Application Imports ---
+from .models import (
+    Order, OrderItem, Product, ArchivedOrder, ArchivedOrderItem,
+    DailySales, DailyProductSales, DailyCategorySales, SalesRollupState,
+)
+from .sharding import SHARD_ID_BLOCK, id_blocks, in_id_block, shard_aliases
+
+LINE_TOTAL = ExpressionWrapper(F('quantity') * F('price_at_purchase'),
+                               output_field=DecimalField(max_digits=14, decimal_places=2))
+
+
+# =============================================================================
+# --- Incremental Rollup Refresh ---
+# =============================================================================
+
+def refresh_sales_rollups(batch_size=1000, settle_seconds=None):
+    """
+    Folds every completed order placed since the stored high-water mark into the daily rollup
+    tables. The mark moves past unpaid orders too: one paid later is folded in by
+    fold_in_late_completions() when it is completed.
+
+    Orders are consumed in (date_ordered, id) order, one batch per transaction, and the
+    high-water mark is advanced in the same transaction so a crash never double-counts.
+    There is one mark per id block (one per shard an order can have been placed on); a
+    block's orders are read from every user shard, since users and their orders move.
+    Orders newer than `settle_seconds` are left for the next run, because their items
+    may still be in the process of being written.
+    Returns the number of orders processed.
+    """
+    if settle_seconds is None:
+        settle_seconds = settings.SALES_ROLLUP_SETTLE_SECONDS
+    cutoff = timezone.now() - timedelta(seconds=settle_seconds)
+    processed = 0
+
+    for block in id_blocks():
+        while True:
+            with transaction.atomic():
+                SalesRollupState.load(block)
+                # Also held by move_users() while it copies orders between shards.
+                state = SalesRollupState.objects.select_for_update().get(id_block=block)
+                pending = {}
+                for shard in shard_aliases():
+                    orders = Order.objects.using(shard).filter(in_id_block(block), date_ordered__lte=cutoff)
+                    if state.last_date_ordered is not None:
+                        orders = orders.filter(
+                            Q(date_ordered__gt=state.last_date_ordered) |
+                            Q(date_ordered=state.last_date_ordered, id__gt=state.last_order_id)
+                        )
+                    for order_id, date_ordered, is_completed in (
+                            orders.order_by('date_ordered', 'id')
+                            .values_list('id', 'date_ordered', 'is_completed')[:batch_size]):
+                        pending[order_id] = (date_ordered, shard, is_completed)
+                batch = sorted(pending, key=lambda order_id: (pending[order_id][0], order_id))[:batch_size]
+                if not batch:
+                    break
+
+                for shard in shard_aliases():
+                    order_ids = [order_id for order_id in batch if pending[order_id][1:] == (shard, True)]
+                    if order_ids:
+                        _apply_batch(order_ids, using=shard)
+                state.last_order_id, state.last_date_ordered = batch[-1], pending[batch[-1]][0]
+                state.save(update_fields=['last_order_id', 'last_date_ordered', 'updated_at'])
+
+            processed += len(batch)
+    return processed
+
+
+def fold_in_late_completions(orders, using):
+    """
+    Rolls up `orders` (on database `using`), just marked completed, that refresh_sales_rollups()
+    already passed while they were unpaid; the others are counted when it reaches them. Call it
+    in the transaction that completes them (on the catalog database too): the high-water marks
+    stay locked until it commits, so a concurrent refresh cannot miss or double-count them.
+    """
+    if not orders:
+        return
+    marks = {block: (last_date_ordered, last_order_id) for block, last_date_ordered, last_order_id in
+             SalesRollupState.objects.select_for_update()
+             .filter(id_block__in={order.pk // SHARD_ID_BLOCK for order in orders}, last_date_ordered__isnull=False)
+             .order_by('id_block').values_list('id_block', 'last_date_ordered', 'last_order_id')}
+    passed = [order.pk for order in orders if order.pk // SHARD_ID_BLOCK in marks
+              and (order.date_ordered, order.pk) <= marks[order.pk // SHARD_ID_BLOCK]]
+    if passed:
+        _apply_batch(passed, using=using)
+
+
+def rebuild_sales_rollups(batch_size=1000, settle_seconds=None):
+    """
+    Discards all rollup rows and the high-water mark, then rebuilds from the full order history:
+    archived orders first (they are no longer in the hot tables), then the hot orders.
+    """
+    archived = 0
+    with transaction.atomic():
+        DailySales.objects.all().delete()
+        DailyProductSales.objects.all().delete()
+        DailyCategorySales.objects.all().delete()
+        SalesRollupState.objects.all().delete()
+        last_id = 0
+        while True:
+            batch = list(ArchivedOrder.objects.filter(id__gt=last_id).order_by('id')
+                         .values_list('id', flat=True)[:batch_size])
+            if not batch:
+                break
+            _apply_batch(batch, item_model=ArchivedOrderItem)
+            archived += len(batch)
+            last_id = batch[-1]
+    return archived + refresh_sales_rollups(batch_size=batch_size, settle_seconds=settle_seconds)
+
+
+def _apply_batch(order_ids, item_model=OrderItem, using='default'):
+    """Aggregates the items of the given orders (on database `using`) and adds the totals onto the rollup rows."""
+    items = (item_model.objects.using(using).filter(order_id__in=order_ids)
+             .annotate(day=TruncDate('order__date_ordered'))
+             .order_by())
+
+    totals = dict(units=Sum('quantity'), revenue=Sum(LINE_TOTAL), order_count=Count('order_id', distinct=True))
+    day_rows = items.values('day').annotate(**totals)
+    product_rows = items.values('day', 'product_id').annotate(**totals)
+
+    _merge_rollup(DailySales, list(day_rows))
+    _merge_rollup(DailyProductSales, list(product_rows), key_field='product_id')
+    _merge_rollup(DailyCategorySales, _category_rows(items), key_field='category_id')
+
+
+def _category_rows(items):
+    """
+    Per (day, category) totals of `items`. Categories are looked up on the catalog database
+    instead of joined, since the items may be on a user shard.
+    """
+    lines = list(items.values_list('day', 'order_id', 'product_id')
+                 .annotate(units=Sum('quantity'), revenue=Sum(LINE_TOTAL)))
+    category_ids = dict(Product.objects.filter(pk__in={line[2] for line in lines} - {None})
+                        .values_list('pk', 'category_id'))
+    totals = {}
+    for day, order_id, product_id, units, revenue in lines:
+        row = totals.setdefault((day, category_ids.get(product_id)),
+                                {'units': 0, 'revenue': Decimal('0.00'), 'orders': set()})
+        row['units'] += units
+        row['revenue'] += revenue
+        row['orders'].add(order_id)
+    return [{'day': day, 'category_id': category_id, 'units': row['units'], 'revenue': row['revenue'],
+             'order_count': len(row['orders'])} for (day, category_id), row in totals.items()]
+
+
+def _merge_rollup(model, rows, key_field=None):
+    """Adds aggregated `rows` onto existing (day[, key]) rollup rows, creating any that are missing."""
+    if not rows:
+        return
+
+    def row_key(row):
+        return row['day'], row[key_field] if key_field else None
+
+    existing_rows = model.objects.select_for_update().filter(day__in={row['day'] for row in rows})
+    if key_field:
+        keys = {row[key_field] for row in rows}
+        key_filter = Q(**{f'{key_field}__in': keys - {None}})
+        if None in keys:
+            key_filter |= Q(**{f'{key_field}__isnull': True})
+        existing_rows = existing_rows.filter(key_filter)
+    existing = {(obj.day, getattr(obj, key_field) if key_field else None): obj for obj in existing_rows}
+
+    to_create, to_update = [], {}
+    for row in rows:
+        obj = existing.get(row_key(row))
+        if obj is None:
+            obj = model(day=row['day'], **({key_field: row[key_field]} if key_field else {}))
+            existing[row_key(row)] = obj
+            to_create.append(obj)
+        elif obj.pk is not None:
+            to_update[obj.pk] = obj
+        obj.units += row['units'] or 0
+        obj.revenue += row['revenue'] or Decimal('0.00')
+        obj.order_count += row['order_count']
+
+    model.objects.bulk_create(to_create)
+    model.objects.bulk_update(list(to_update.values()), ['units', 'revenue', 'order_count'])
+
+
+# =============================================================================
+# --- Reporting (reads rollups only) ---
+# =============================================================================
+
+REPORT_GROUPINGS = {
+    'day': (DailySales, ['day']),
+    'category': (DailyCategorySales, ['category_id', 'category__name']),
+    'product': (DailyProductSales, ['product_id', 'product__name']),
+}
+
+
+def sales_report(group_by='day', start=None, end=None, limit=None):
+    """
+    Returns revenue, units and order counts grouped by day, category or product,
+    computed from the rollup tables only. `start` and `end` are inclusive dates.
+    """
+    model, fields = REPORT_GROUPINGS[group_by]
+    rows = model.objects.all()
+    if start:
+        rows = rows.filter(day__gte=start)
+    if end:
+        rows = rows.filter(day__lte=end)
+
+    rows = rows.values(*fields).annotate(
+        units=Sum('units'), revenue=Sum('revenue'), order_count=Sum('order_count')
+    ).order_by('-day' if group_by == 'day' else '-revenue')
+    return list(rows[:limit] if limit else rows)
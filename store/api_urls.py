@@ -33,7 +33,13 @@ urlpatterns = [
 
     # --- Products ---
     path('products/', views.ProductListCreate.as_view(), name='api-product-list'),
+    path('products/bulk-update/', views.ProductBulkUpdateView.as_view(), name='api-product-bulk-update'),
+    path('products/inventory-feed/', views.InventoryFeedView.as_view(), name='api-inventory-feed'),
+    path('products/autocomplete/', views.ProductAutocompleteView.as_view(), name='api-product-autocomplete'),
+    path('products/facets/', views.ProductFacetsView.as_view(), name='api-product-facets'),
+    path('products/top/', views.TopProductsView.as_view(), name='api-product-top'),
     path('products/<int:pk>/', views.ProductDetail.as_view(), name='api-product-detail'),
+    path('products/<int:pk>/related/', views.RelatedProductsView.as_view(), name='api-product-related'),
 
     # --- Cart ---
     path('cart/', views.CartDetailView.as_view(), name='api-cart-detail'),
@@ -44,6 +50,10 @@ urlpatterns = [
     # --- Payment (Mock Stripe) ---
     path('payment/create-intent/', views.CreatePaymentIntentView.as_view(), name='api-create-payment-intent'),
     path('payment/confirm-order/', views.ConfirmOrderPaymentView.as_view(), name='api-confirm-order-payment'),
+    path('payment/webhook/', views.StripeWebhookView.as_view(), name='api-stripe-webhook'),
+
+    # --- Analytics (Staff) ---
+    path('analytics/sales/', views.SalesReportView.as_view(), name='api-sales-report'),
 
     # --- Include Router URLs ---
     # This automatically generates URLs for the registered ViewSets.
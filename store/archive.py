@@ -0,0 +1,141 @@
+# store/archive.py
+
+# --- Django & Python Imports ---
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+# --- Local Application Imports ---
+from .models import Order, OrderItem, ArchivedOrder, ArchivedOrderItem, SalesRollupState, User
+from .sharding import MOVING, in_id_block, join_catalog, shard_and_catalog_atomic, shard_aliases, user_db
+
+ORDER_FIELDS = [field.attname for field in Order._meta.concrete_fields]
+ORDER_ITEM_FIELDS = [field.attname for field in OrderItem._meta.concrete_fields]
+
+
+# =============================================================================
+# --- Archiving ---
+# =============================================================================
+
+def archive_orders(older_than_days=None, batch_size=None, now=None):
+    """
+    Moves completed orders older than `older_than_days` (default ORDER_ARCHIVE_AFTER_DAYS), with
+    their items, from the hot Order/OrderItem tables into ArchivedOrder/ArchivedOrderItem.
+
+    Each batch is copied and deleted in its own short transaction; rows another transaction
+    holds are skipped (SKIP LOCKED where supported) and picked up by a later run. Only orders
+    already folded into the sales rollups are moved, and never within POPULARITY_WINDOW_DAYS,
+    since both of those read the hot tables. Returns the number of orders archived.
+    """
+    days = max(older_than_days or settings.ORDER_ARCHIVE_AFTER_DAYS, settings.POPULARITY_WINDOW_DAYS)
+    cutoff = (now or timezone.now()) - timedelta(days=days)
+    batch_size = batch_size or settings.ORDER_ARCHIVE_BATCH_SIZE
+    archived = 0
+
+    for shard in shard_aliases():
+        while True:
+            batch = _archive_batch(shard, cutoff, batch_size)
+            if not batch:
+                break
+            archived += batch
+    return archived
+
+
+def _archive_batch(shard, cutoff, batch_size):
+    """
+    Archives one batch of `shard`'s orders and returns its size. The copy on the catalog database
+    commits before the delete on the shard; if the delete is lost, the next run copies the same
+    rows again and the duplicates are ignored.
+    """
+    with shard_and_catalog_atomic(shard):
+        # Locked so no user's orders are moved between shards mid-batch (see move_users).
+        rolled_up = Q()
+        for id_block, rolled_up_until in (SalesRollupState.objects.select_for_update()
+                                          .filter(last_date_ordered__isnull=False)
+                                          .values_list('id_block', 'last_date_ordered')):
+            rolled_up |= in_id_block(id_block) & Q(date_ordered__lt=min(cutoff, rolled_up_until))
+        if not rolled_up:
+            return 0
+        # A move still holds the source copies of its users' orders until after it releases the lock.
+        moving = list(User.objects.filter(shard__contains=MOVING).values_list('pk', flat=True)) \
+            if len(shard_aliases()) > 1 else []
+        order_ids = list(
+            Order.objects.using(shard).select_for_update(skip_locked=True)
+            .filter(rolled_up, is_completed=True).exclude(user_id__in=moving)
+            .order_by('date_ordered', 'id')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not order_ids:
+            return 0
+
+        orders = Order.objects.using(shard).filter(id__in=order_ids)
+        ArchivedOrder.objects.bulk_create(
+            [ArchivedOrder(**row) for row in orders.values(*ORDER_FIELDS)], ignore_conflicts=True
+        )
+        ArchivedOrderItem.objects.bulk_create(
+            [ArchivedOrderItem(**row) for row in OrderItem.objects.using(shard).filter(order_id__in=order_ids)
+             .values(*ORDER_ITEM_FIELDS)], ignore_conflicts=True
+        )
+        orders.delete()  # cascades to the items
+    return len(order_ids)
+
+
+# =============================================================================
+# --- Reading Across Hot & Archived Orders ---
+# =============================================================================
+
+class OrderHistory:
+    """
+    A user's orders, newest first: hot orders, then archived ones.
+
+    Supports count(), len(), iteration and slicing like a queryset, so paginators (Django's
+    Paginator, DRF's LimitOffsetPagination) can page through it. Archived rows are only
+    fetched once a slice reaches past the last hot order.
+    """
+
+    def __init__(self, user):
+        self.hot = (join_catalog(Order.objects.using(user_db(user)).filter(user=user), 'user')
+                    .prefetch_related('items__product').order_by('-date_ordered', '-id'))
+        self.archived = (ArchivedOrder.objects.filter(user=user).select_related('user')
+                         .prefetch_related('items__product').order_by('-date_ordered', '-id'))
+
+    @cached_property
+    def hot_count(self):
+        return self.hot.count()
+
+    def count(self):
+        return self.hot_count + self.archived.count()
+
+    def __len__(self):
+        return self.count()
+
+    def __iter__(self):
+        yield from self.hot
+        yield from self.archived
+
+    def iterator(self, chunk_size=None):
+        """Like __iter__, but fetching rows (and their prefetches) `chunk_size` at a time."""
+        yield from self.hot.iterator(chunk_size=chunk_size)
+        yield from self.archived.iterator(chunk_size=chunk_size)
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop = index.start or 0, index.stop
+        orders = []
+        if start < self.hot_count:
+            orders += self.hot[start:stop]
+        if stop is None or stop > self.hot_count:
+            archived_stop = None if stop is None else stop - self.hot_count
+            orders += self.archived[max(start - self.hot_count, 0):archived_stop]
+        return orders
+
+
+def get_user_order(user, pk):
+    """Returns the user's order `pk` from the hot table, falling back to the archive, or None."""
+    return (Order.objects.using(user_db(user)).filter(user=user, pk=pk).first()
+            or ArchivedOrder.objects.filter(user=user, pk=pk).first())
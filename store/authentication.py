@@ -0,0 +1,94 @@
+# store/authentication.py
+
+# --- Django & Python Imports ---
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+
+# --- Third-Party Imports ---
+from rest_framework import permissions
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+# --- Local Application Imports ---
+from .metrics import CACHE_REQUESTS
+
+USER_CACHE_KEY = 'auth:user:{user_id}:v{version}'
+USER_VERSION_KEY = 'auth:user-version:{user_id}'
+
+
+def invalidate_cached_user(user_id):
+    """
+    Bumps the user's cache version so the next authenticated request reloads it from the
+    database. Unlike a delete, this also orphans an entry that a request which read the user
+    before the change is about to write.
+    """
+    key = USER_VERSION_KEY.format(user_id=user_id)
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:  # evicted in between
+        cache.set(key, 1, None)
+
+
+# =============================================================================
+# --- JWT Authentication Classes ---
+# =============================================================================
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that resolves the user from a short-lived cache entry instead of
+    querying the User table on every request.
+
+    The revocation checks still run on every request against the cached user: the account
+    must be active and the token's revoke claim (a digest of the password hash, see
+    SIMPLE_JWT['CHECK_REVOKE_TOKEN']) must match. Every User save or delete bumps the
+    user's cache version (store.signals), so password changes, deactivation and credit
+    updates are seen by the very next request. Writes that send no signals (queryset
+    update(), raw SQL) must call invalidate_cached_user(); otherwise they are seen once the
+    entry expires, within AUTH_USER_CACHE_TIMEOUT seconds.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        version = cache.get(USER_VERSION_KEY.format(user_id=user_id), 0)
+        key = USER_CACHE_KEY.format(user_id=user_id, version=version)
+        user = cache.get(key)
+        CACHE_REQUESTS.labels('auth_user', 'miss' if user is None else 'hit').inc()
+        if user is None:
+            user = super().get_user(validated_token)
+            cache.set(key, user, settings.AUTH_USER_CACHE_TIMEOUT)
+            return user
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN and \
+                validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+            raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+        return user
+
+
+class ClaimsJWTAuthentication(CachedJWTAuthentication):
+    """
+    For read-only requests, authenticates with a claims-only TokenUser built from the token
+    itself (no cache or database lookup at all); unsafe methods resolve the full user.
+    Only use it on endpoints whose read access is open to anonymous users anyway, since a
+    claims-only user is not re-checked for revocation.
+    """
+
+    def authenticate(self, request):
+        self.claims_only = request.method in permissions.SAFE_METHODS
+        return super().authenticate(request)
+
+    def get_user(self, validated_token):
+        if self.claims_only:
+            if api_settings.USER_ID_CLAIM not in validated_token:
+                raise InvalidToken(_("Token contained no recognizable user identification"))
+            return api_settings.TOKEN_USER_CLASS(validated_token)
+        return super().get_user(validated_token)
@@ -0,0 +1,217 @@
+# store/autocomplete.py
+
+# --- Django & Python Imports ---
+import heapq
+import threading
+import unicodedata
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connections
+
+# --- Local Application Imports ---
+from .models import Product
+
+AUTOCOMPLETE_VERSION_KEY = 'store:autocomplete:version'
+AUTOCOMPLETE_CHANGE_KEY = 'store:autocomplete:change:{version}'
+
+
+def normalize(text):
+    """Case-folds, strips accents and collapses hyphens and whitespace, so 'Café-Table' matches 'cafe t'."""
+    text = text.casefold()
+    if not text.isascii():
+        text = ''.join(char for char in unicodedata.normalize('NFKD', text) if not unicodedata.combining(char))
+    return ' '.join(text.replace('-', ' ').split())
+
+
+def product_entries(rows):
+    """Yields (key, product_id, name) index entries for (pk, name, slug) rows: one per distinct key."""
+    for product_id, name, slug in rows:
+        display = ' '.join(name.split())
+        for key in {normalize(name), normalize(slug)}:
+            if key:
+                yield key, product_id, display
+
+
+# =============================================================================
+# --- Packed Prefix Index ---
+# =============================================================================
+
+class PrefixIndex:
+    """
+    Immutable (key, product_id, name) entries sorted by key, packed into one string plus two
+    arrays instead of millions of small objects. Prefix lookups bisect on the keys.
+    """
+
+    def __init__(self, entries=()):
+        parts, self._offsets, self._ids = [], array('I', [0]), array('q')
+        position = 0
+        for key, product_id, name in sorted(entries):
+            part = f'{key}\t{name}\n'
+            parts.append(part)
+            position += len(part)
+            self._offsets.append(position)
+            self._ids.append(product_id)
+        self._text = ''.join(parts)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __iter__(self):
+        return (self._entry(index) for index in range(len(self)))
+
+    def _key(self, index):
+        start = self._offsets[index]
+        return self._text[start:self._text.index('\t', start)]
+
+    def _entry(self, index):
+        key, name = self._text[self._offsets[index]:self._offsets[index + 1] - 1].split('\t', 1)
+        return key, self._ids[index], name
+
+    def scan(self, prefix):
+        """Yields the entries whose key starts with `prefix`, in key order."""
+        index = bisect_left(range(len(self)), prefix, key=self._key)
+        while index < len(self):
+            entry = self._entry(index)
+            if not entry[0].startswith(prefix):
+                return
+            yield entry
+            index += 1
+
+
+# =============================================================================
+# --- Process-Local Product Autocomplete ---
+# =============================================================================
+
+class ProductAutocomplete:
+    """
+    Prefix index over the names and slugs of available products, held in each worker process.
+
+    Product changes are recorded in a shared change log (see record_product_changes). Before
+    each search the index compares its version with the shared counter and catches up by
+    re-reading only the changed products; they are kept in a small overlay on top of the packed
+    base index and folded into a new base once AUTOCOMPLETE_COMPACT_AFTER products have changed.
+    A worker that has fallen too far behind, or finds the log incomplete, rebuilds from the database.
+    """
+
+    def __init__(self):
+        self.version = None
+        self._state = (PrefixIndex(), PrefixIndex(), frozenset())  # base, overlay, masked base ids
+        self._lock = threading.Lock()
+
+    def search(self, query, limit):
+        """Returns up to `limit` `{id, name}` dicts for products whose name or slug starts with `query`."""
+        self.sync()
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        base, overlay, masked = self._state
+        entries = heapq.merge((entry for entry in base.scan(prefix) if entry[1] not in masked),
+                              overlay.scan(prefix))
+        results, seen = [], set()
+        for _, product_id, name in entries:
+            if product_id not in seen:
+                seen.add(product_id)
+                results.append({'id': product_id, 'name': name})
+                if len(results) >= limit:
+                    break
+        return results
+
+    def sync(self):
+        """Catches up with the shared version. A thread finding another one mid-update serves the current index."""
+        shared = cache.get(AUTOCOMPLETE_VERSION_KEY)
+        if self.version is not None and shared == self.version:
+            return
+        if not self._lock.acquire(blocking=self.version is None):
+            return
+        try:
+            if self.version is None or shared is None or shared < self.version \
+                    or shared - self.version > settings.AUTOCOMPLETE_MAX_CATCHUP or not self._catch_up(shared):
+                self.rebuild()
+        finally:
+            self._lock.release()
+
+    def rebuild(self):
+        """Loads every available product. The version is read first, so changes made meanwhile are re-applied."""
+        version = cache.get(AUTOCOMPLETE_VERSION_KEY)
+        if version is None:
+            cache.add(AUTOCOMPLETE_VERSION_KEY, 0, timeout=None)
+            version = cache.get(AUTOCOMPLETE_VERSION_KEY, 0)
+        rows = Product.objects.filter(is_available=True).values_list('pk', 'name', 'slug').order_by()
+        self.load(rows.iterator(chunk_size=10_000), version)
+
+    def load(self, rows, version):
+        """Replaces the index with (pk, name, slug) `rows`, taken at shared `version`."""
+        self._state = (PrefixIndex(product_entries(rows)), PrefixIndex(), frozenset())
+        self.version = version
+
+    def _catch_up(self, shared):
+        """Applies the logged changes up to `shared`; returns False when the log has gaps (evicted entries)."""
+        versions = range(self.version + 1, shared + 1)
+        keys = [AUTOCOMPLETE_CHANGE_KEY.format(version=version) for version in versions]
+        logged = cache.get_many(keys)
+        changed, reached = set(), self.version
+        for version, key in zip(versions, keys):
+            if key not in logged:
+                # Only the newest entries may still be in flight (counter bumped, entry not yet written).
+                if any(later in logged for later in keys[version - self.version:]):
+                    return False
+                break
+            changed.update(logged[key])
+            reached = version
+        if len(changed) > settings.AUTOCOMPLETE_COMPACT_AFTER:
+            return False
+        if changed:
+            self._apply(changed)
+        self.version = reached
+        return True
+
+    def _apply(self, product_ids):
+        rows = Product.objects.filter(pk__in=product_ids, is_available=True).values_list('pk', 'name', 'slug')
+        base, overlay, masked = self._state
+        masked = masked | product_ids
+        entries = [entry for entry in overlay if entry[1] not in product_ids]
+        entries += product_entries(rows)
+        if len(masked) > settings.AUTOCOMPLETE_COMPACT_AFTER:
+            self._state = (PrefixIndex([*(entry for entry in base if entry[1] not in masked), *entries]),
+                           PrefixIndex(), frozenset())
+        else:
+            self._state = (base, PrefixIndex(entries), frozenset(masked))
+
+
+product_autocomplete = ProductAutocomplete()
+
+
+def record_product_changes(product_ids):
+    """Logs changed products for every worker's index and bumps the shared version. Call after commit."""
+    try:
+        version = cache.incr(AUTOCOMPLETE_VERSION_KEY)
+    except ValueError:
+        version = 1
+        cache.set(AUTOCOMPLETE_VERSION_KEY, version, timeout=None)
+    cache.set(AUTOCOMPLETE_CHANGE_KEY.format(version=version), list(product_ids),
+              settings.AUTOCOMPLETE_CHANGE_LOG_TIMEOUT)
+
+
+def invalidate_autocomplete():
+    """For bulk changes made without signals: moves the shared version far enough ahead that every worker rebuilds."""
+    try:
+        cache.incr(AUTOCOMPLETE_VERSION_KEY, settings.AUTOCOMPLETE_MAX_CATCHUP + 1)
+    except ValueError:
+        pass  # no shared version yet: workers rebuild on their next search anyway
+
+
+def warm_autocomplete():
+    """
+    Builds this process's index ahead of the first request; left to the first search if the database
+    is unavailable. The connections opened for it are closed again, so a preloading master
+    (gunicorn --preload) does not hand its database sockets to the workers it forks.
+    """
+    try:
+        product_autocomplete.sync()
+    except DatabaseError:
+        pass
+    finally:
+        connections.close_all()
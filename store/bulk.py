@@ -0,0 +1,149 @@
+# store/bulk.py
+
+# --- Django & Python Imports ---
+import csv
+import io
+import json
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+
+# --- Third-Party Imports ---
+from rest_framework import serializers
+
+# --- Local Application Imports ---
+from .autocomplete import record_product_changes
+from .facets import invalidate_facets
+from .flash_sale import reset_flash_stock
+from .models import Product
+from .page_cache import invalidate_product_pages
+from .serializers import ProductBulkUpdateRowSerializer
+
+UPDATABLE_FIELDS = ('price', 'stock', 'is_available')
+
+
+# =============================================================================
+# --- Input Parsing ---
+# =============================================================================
+
+def read_csv_rows(stream):
+    """
+    Reads `id,slug,price,stock,is_available` CSV rows (any subset of columns, header required)
+    from a text or binary stream. Empty cells are treated as "leave unchanged".
+    """
+    if isinstance(stream.read(0), bytes):
+        stream = io.TextIOWrapper(stream, encoding='utf-8-sig')
+    return [
+        {name.strip(): value.strip() for name, value in row.items() if name and value and value.strip()}
+        for row in csv.DictReader(stream)
+    ]
+
+
+def read_upload_rows(upload):
+    """
+    Reads the rows of an uploaded file: a JSON list for a `.json` name or JSON content type, CSV
+    (see read_csv_rows) otherwise. Raises ValueError with a message fit for the uploader.
+    """
+    if upload.name.lower().endswith('.json') or getattr(upload, 'content_type', None) == 'application/json':
+        try:
+            rows = json.load(upload)
+        except ValueError:
+            raise ValueError("The file is not valid JSON.")
+    else:
+        try:
+            rows = read_csv_rows(upload)
+        except (UnicodeDecodeError, csv.Error):
+            raise ValueError("The file is not a valid UTF-8 CSV file.")
+    if not isinstance(rows, list):
+        raise ValueError("Expected a list of rows.")
+    return rows
+
+
+# =============================================================================
+# --- Bulk Update ---
+# =============================================================================
+
+def bulk_update_products(rows, dry_run=False, chunk_size=1000):
+    """
+    Applies `{id|slug, price?, stock?, is_available?}` rows to products and returns a report.
+
+    Rows are validated in Python, products are loaded (and locked) by id and slug in chunked
+    `IN` queries, and the changes are written with chunked `bulk_update`s inside a single
+    transaction. Rows are grouped by the set of fields they change so that, for example, a
+    price-only row never writes back a stale stock value. Invalid rows are reported and skipped;
+    valid rows still apply. `Product.save` is bypassed, so `date_updated` is set explicitly and
+    the catalog caches are invalidated here.
+    """
+    row_serializer = ProductBulkUpdateRowSerializer()
+    results, valid = [], []
+    for index, row in enumerate(rows, start=1):
+        result = {'row': index, 'id': row.get('id') if isinstance(row, dict) else None,
+                  'slug': row.get('slug') if isinstance(row, dict) else None}
+        try:
+            valid.append((result, row_serializer.run_validation(row)))
+        except serializers.ValidationError as exc:
+            result.update(status='error', errors=exc.detail)
+        results.append(result)
+
+    with transaction.atomic():
+        # Locked in pk order, as checkout and the inventory feed do, so they cannot deadlock.
+        ids = sorted({data['id'] for _, data in valid if 'id' in data})
+        slugs = list({data['slug'] for _, data in valid if 'id' not in data})
+        by_id, by_slug = {}, {}
+        for lookup, values in (('pk__in', ids), ('slug__in', slugs)):
+            for start in range(0, len(values), chunk_size):
+                products = (Product.objects.select_for_update()
+                            .filter(**{lookup: values[start:start + chunk_size]}).order_by('pk'))
+                for product in products.only('pk', 'slug', 'is_flash_sale', *UPDATABLE_FIELDS):
+                    by_id[product.pk] = by_slug[product.slug] = product
+
+        now = timezone.now()
+        changed_groups, seen = defaultdict(list), set()
+        for result, data in valid:
+            product = by_id.get(data['id']) if 'id' in data else by_slug.get(data['slug'])
+            if product is None:
+                result.update(status='error', errors={'product': ["No product with this id or slug."]})
+                continue
+            if product.pk in seen:
+                result.update(status='error', errors={'product': ["Product appears in an earlier row."]})
+                continue
+            seen.add(product.pk)
+            result.update(id=product.pk, slug=product.slug)
+
+            changed = tuple(field for field in UPDATABLE_FIELDS
+                            if field in data and getattr(product, field) != data[field])
+            if not changed:
+                result['status'] = 'unchanged'
+                continue
+            for field in changed:
+                setattr(product, field, data[field])
+            product.date_updated = now
+            changed_groups[changed].append(product)
+            result.update(status='updated', changed=list(changed))
+
+        updated_ids = [product.pk for group in changed_groups.values() for product in group]
+        if not dry_run:
+            for fields, group in changed_groups.items():
+                Product.objects.bulk_update(group, [*fields, 'date_updated'], batch_size=chunk_size)
+            if updated_ids:
+                transaction.on_commit(lambda: (invalidate_facets(), invalidate_product_pages(updated_ids)))
+            availability_ids = [product.pk for fields, group in changed_groups.items()
+                                if 'is_available' in fields for product in group]
+            if availability_ids:
+                transaction.on_commit(lambda: record_product_changes(availability_ids))
+            restocked_hot_ids = [product.pk for fields, group in changed_groups.items()
+                                 if 'stock' in fields for product in group if product.is_flash_sale]
+            if restocked_hot_ids:
+                transaction.on_commit(lambda: reset_flash_stock(restocked_hot_ids))
+
+    summary = defaultdict(int)
+    for result in results:
+        summary[result['status']] += 1
+    return {
+        'dry_run': dry_run,
+        'updated': summary['updated'],
+        'unchanged': summary['unchanged'],
+        'errors': summary['error'],
+        'results': results,
+    }
@@ -0,0 +1,223 @@
+# store/carts.py
+
+# --- Django & Python Imports ---
+import json
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.db import connections, transaction
+from django.db.models import Exists, OuterRef, Prefetch, Q, Subquery, Sum
+from django.utils import timezone
+
+# --- Local Application Imports ---
+from .metrics import CART_MUTATIONS, STOCK_CONFLICTS
+from .models import Cart, CartItem, Product
+from .sharding import CATALOG_DB, join_catalog, shard_aliases, user_db
+
+GUEST_CART_COOKIE = 'guest_cart'
+GUEST_CART_SALT = 'store.carts.guest_cart'
+
+
+# =============================================================================
+# --- Read-Only Cart Access ---
+# =============================================================================
+
+class VirtualCart:
+    """
+    Stand-in for a user who has no Cart row yet. It renders and serializes like an empty cart
+    without touching the database; the real row is created on the first add.
+    """
+    id = pk = None
+    created_at = updated_at = None
+
+    def __init__(self, user):
+        self.user = user
+        self.user_id = user.pk
+        self.items = CartItem.objects.none()
+
+    def get_total_items(self):
+        return 0
+
+    def get_total_price(self):
+        return 0
+
+
+def get_cart(user):
+    """
+    Returns the user's cart for reading, with its items and their products prefetched (one more
+    query, two on a shard other than the catalog's), or a VirtualCart when none exists. Never writes.
+    """
+    db = user_db(user)
+    items = Prefetch('items', queryset=join_catalog(CartItem.objects.using(db), 'product'))
+    return Cart.objects.using(db).filter(user=user).prefetch_related(items).first() or VirtualCart(user)
+
+
+def get_cart_item_count(user):
+    """Total quantity in the user's cart, in one query and without needing the Cart row."""
+    return (CartItem.objects.using(user_db(user)).filter(cart__user=user)
+            .aggregate(total=Sum('quantity'))['total'] or 0)
+
+
+# =============================================================================
+# --- Guest Carts (signed cookie) ---
+# =============================================================================
+
+def read_guest_cart(request):
+    """Returns the anonymous visitor's cart as {product_id: quantity}; tampered cookies read as empty."""
+    try:
+        raw = request.get_signed_cookie(GUEST_CART_COOKIE, salt=GUEST_CART_SALT)
+        return {int(product_id): int(quantity) for product_id, quantity in json.loads(raw).items()}
+    except (KeyError, signing.BadSignature, ValueError, TypeError, AttributeError):
+        return {}
+
+
+def write_guest_cart(response, contents):
+    """Stores {product_id: quantity} in the signed guest-cart cookie, or deletes it when empty."""
+    contents = {product_id: quantity for product_id, quantity in contents.items() if quantity > 0}
+    if not contents:
+        response.delete_cookie(GUEST_CART_COOKIE)
+        return
+    response.set_signed_cookie(GUEST_CART_COOKIE, json.dumps(contents), salt=GUEST_CART_SALT,
+                               max_age=settings.GUEST_CART_MAX_AGE, httponly=True, samesite='Lax')
+
+
+class GuestCartItems(list):
+    """List of GuestCartItem that, like a related manager, also answers `.all()` in templates."""
+
+    def all(self):
+        return self
+
+
+class GuestCartItem:
+    def __init__(self, product, quantity):
+        self.product = product
+        self.quantity = quantity
+
+    def get_total_price(self):
+        return self.quantity * self.product.price
+
+
+class GuestCart:
+    """An anonymous visitor's cookie cart, shaped like a Cart for the cart templates."""
+    is_guest = True
+
+    def __init__(self, contents):
+        products = Product.objects.filter(is_available=True).in_bulk(list(contents)) if contents else {}
+        self.items = GuestCartItems(GuestCartItem(products[product_id], quantity)
+                                    for product_id, quantity in contents.items() if product_id in products)
+
+    def get_total_items(self):
+        return sum(item.quantity for item in self.items)
+
+    def get_total_price(self):
+        return sum(item.get_total_price() for item in self.items)
+
+
+def merge_guest_cart(request, user):
+    """
+    Moves the visitor's guest cart into `user`'s Cart after login or registration.
+
+    Stock, availability and the quantities already in the user's cart are read in one query
+    (two when the cart is on another shard than the catalog); the merged quantities (capped at
+    stock) are then written with one bulk upsert (see _upsert_cart_items). Returns the names of products that could not
+    be added in full.
+    """
+    contents = read_guest_cart(request)
+    if not contents:
+        return []
+
+    db = user_db(user)
+    cart, _ = Cart.objects.using(db).get_or_create(user=user)
+    products = Product.objects.filter(pk__in=list(contents), is_available=True).only('pk', 'name', 'stock')
+    if db == CATALOG_DB:
+        in_cart = CartItem.objects.filter(cart=cart, product=OuterRef('pk')).values('quantity')
+        products = products.annotate(in_cart=Subquery(in_cart))
+    else:
+        quantities = dict(CartItem.objects.using(db).filter(cart=cart, product_id__in=list(contents))
+                          .values_list('product_id', 'quantity'))
+        products = list(products)
+        for product in products:
+            product.in_cart = quantities.get(product.pk)
+
+    merged, shortfalls = [], []
+    for product in products:
+        wanted = (product.in_cart or 0) + contents[product.pk]
+        if wanted > product.stock:
+            shortfalls.append(product.name)
+        quantity = min(wanted, product.stock)
+        if quantity > (product.in_cart or 0):
+            merged.append(CartItem(cart=cart, product=product, quantity=quantity))
+
+    with transaction.atomic(using=db):
+        Cart.objects.using(db).filter(pk=cart.pk).update(updated_at=timezone.now())
+        _upsert_cart_items(db, cart, merged)
+    CART_MUTATIONS.labels('user', 'merge').inc()
+    if shortfalls:
+        STOCK_CONFLICTS.labels('cart_merge').inc(len(shortfalls))
+    return shortfalls
+
+
+def _upsert_cart_items(db, cart, items):
+    """
+    Writes `items` of `cart`, overwriting the quantity of products already in it: one upsert where
+    the database supports ON CONFLICT (cart, product), otherwise (MySQL) the existing rows are
+    locked and updated and the rest inserted.
+    """
+    if connections[db].features.supports_update_conflicts_with_target:
+        CartItem.objects.using(db).bulk_create(items, update_conflicts=True,
+                                               unique_fields=['cart', 'product'], update_fields=['quantity'])
+        return
+    existing = dict(CartItem.objects.using(db).select_for_update()
+                    .filter(cart=cart, product_id__in=[item.product_id for item in items])
+                    .values_list('product_id', 'pk'))
+    for item in items:
+        item.pk = existing.get(item.product_id)
+    CartItem.objects.using(db).bulk_update([item for item in items if item.pk], ['quantity'])
+    CartItem.objects.using(db).bulk_create([item for item in items if not item.pk])
+
+
+# =============================================================================
+# --- Stale Cart Purge ---
+# =============================================================================
+
+def stale_carts(now=None, idle_days=None, empty_grace_hours=None, using=CATALOG_DB):
+    """Carts on `using` idle for `idle_days` (CART_IDLE_DAYS), or empty and idle for `empty_grace_hours`."""
+    now = now or timezone.now()
+    idle_cutoff = now - timedelta(days=idle_days or settings.CART_IDLE_DAYS)
+    empty_cutoff = now - timedelta(hours=empty_grace_hours or settings.CART_EMPTY_GRACE_HOURS)
+    has_items = Exists(CartItem.objects.filter(cart=OuterRef('pk')))
+    return Cart.objects.using(using).filter(Q(updated_at__lt=idle_cutoff) | (Q(updated_at__lt=empty_cutoff) & ~has_items))
+
+
+def purge_stale_carts(now=None, idle_days=None, empty_grace_hours=None, chunk_size=None, max_chunks=None):
+    """
+    Deletes stale carts (see stale_carts) and their items from every user shard, oldest activity first.
+
+    Each chunk of at most `chunk_size` carts is locked, deleted and committed in its own short
+    transaction. Carts another transaction holds are skipped (SKIP LOCKED where supported), and
+    any cart activity bumps `Cart.updated_at`, so live carts drop out of the selection.
+    Users get a fresh cart on their next visit. Returns counts and the elapsed seconds.
+    """
+    chunk_size = chunk_size or settings.CART_PURGE_CHUNK_SIZE
+    report = {'carts': 0, 'items': 0, 'chunks': 0}
+    started = time.monotonic()
+
+    for shard in shard_aliases():
+        queryset = stale_carts(now, idle_days, empty_grace_hours, using=shard)
+        while max_chunks is None or report['chunks'] < max_chunks:
+            with transaction.atomic(using=shard):
+                cart_ids = list(queryset.select_for_update(skip_locked=True)
+                                .order_by('updated_at', 'id')
+                                .values_list('id', flat=True)[:chunk_size])
+                if not cart_ids:
+                    break
+                items_deleted, _ = CartItem.objects.using(shard).filter(cart_id__in=cart_ids).delete()
+                _, deleted = Cart.objects.using(shard).filter(pk__in=cart_ids).delete()
+            report['carts'] += deleted.get(Cart._meta.label, 0)
+            report['items'] += items_deleted
+            report['chunks'] += 1
+
+    report['seconds'] = time.monotonic() - started
+    return report
@@ -0,0 +1,253 @@
+# store/checkout.py
+
+# --- Django & Python Imports ---
+import os
+import queue
+import threading
+import time
+from collections import Counter, namedtuple
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.db import close_old_connections, connections, models, transaction
+from django.db.models import Case, F, Value, When
+
+# --- Local Application Imports ---
+from .models import CartItem, Order, OrderItem, PendingStockDecrement, Product
+from .sharding import CATALOG_DB, shard_and_catalog_atomic, user_db
+
+# One cart line as it was validated: the price charged is the one the customer saw.
+CheckoutLine = namedtuple('CheckoutLine', 'product_id name price quantity is_flash_sale')
+# A validated checkout waiting to be committed. `fields` holds the Order's address fields and
+# `db` the user's shard.
+PendingCheckout = namedtuple('PendingCheckout', 'user_id cart_item_ids lines fields db')
+
+
+class CheckoutRejected(Exception):
+    """A checkout asked for more units of a product than were left when it was committed."""
+
+
+class CheckoutTimedOut(CheckoutRejected):
+    """A batched checkout was still being committed when its request gave up waiting; it may yet go through."""
+
+
+def build_checkout(user, cart_items, fields):
+    """A PendingCheckout for `cart_items` (with their products loaded)."""
+    return PendingCheckout(
+        user_id=user.pk,
+        cart_item_ids=[cart_item.pk for cart_item in cart_items],
+        lines=[CheckoutLine(cart_item.product_id, cart_item.product.name, cart_item.product.price,
+                            cart_item.quantity, cart_item.product.is_flash_sale) for cart_item in cart_items],
+        fields=fields,
+        db=user_db(user),
+    )
+
+
+# =============================================================================
+# --- Committing Checkouts ---
+# =============================================================================
+
+def commit_checkouts(checkouts):
+    """
+    Commits a list of checkouts in one transaction and returns, for each, its Order or the
+    CheckoutRejected that refused it. Checkouts for users on other shards than the catalog
+    database are committed in one transaction per shard, each nested around the catalog one.
+
+    The regular products involved are locked in one query (in id order, so concurrent batches
+    cannot deadlock) and their stock is handed out in list order. The accepted checkouts are then
+    written set-based whatever their number: one INSERT each for orders (one per order where the
+    database cannot return bulk-inserted ids), order items and flash-sale decrements, one UPDATE
+    for stock and one DELETE for the cart items. Flash-sale lines were already taken from their
+    counters (store.flash_sale) and only queue a decrement.
+    """
+    results = [None] * len(checkouts)
+    by_shard = {}
+    for index, checkout in enumerate(checkouts):
+        by_shard.setdefault(checkout.db, []).append(index)
+    for db, indexes in by_shard.items():
+        for index, result in zip(indexes, _commit_on_shard(db, [checkouts[index] for index in indexes])):
+            results[index] = result
+    return results
+
+
+def _commit_on_shard(db, checkouts):
+    """
+    commit_checkouts() for checkouts whose users are on shard `db`. Stock is committed on the catalog
+    database just before the orders are on the shard; should the shard commit fail after that, the
+    units stay taken (oversold never, undersold at worst).
+    """
+    results = [None] * len(checkouts)
+    with shard_and_catalog_atomic(db):
+        regular_ids = sorted({line.product_id for checkout in checkouts for line in checkout.lines
+                              if not line.is_flash_sale})
+        stock = dict(Product.objects.select_for_update().filter(pk__in=regular_ids)
+                     .order_by('pk').values_list('pk', 'stock'))
+
+        accepted = []
+        for index, checkout in enumerate(checkouts):
+            regular = [line for line in checkout.lines if not line.is_flash_sale]
+            short = next((line for line in regular if stock.get(line.product_id, 0) < line.quantity), None)
+            if short is not None:
+                results[index] = CheckoutRejected(
+                    f"Insufficient stock for {short.name}. "
+                    f"Available: {stock.get(short.product_id, 0)}, Requested: {short.quantity}"
+                )
+                continue
+            for line in regular:
+                stock[line.product_id] -= line.quantity
+            accepted.append(index)
+        if not accepted:
+            return results
+
+        orders = [
+            Order(user_id=checkouts[index].user_id,
+                  total_amount=sum(line.price * line.quantity for line in checkouts[index].lines),
+                  **checkouts[index].fields)
+            for index in accepted
+        ]
+        if connections[db].features.can_return_rows_from_bulk_insert:
+            Order.objects.using(db).bulk_create(orders)
+        else:
+            # MySQL does not hand back the ids of bulk-inserted rows, and the items need them.
+            for order in orders:
+                order.save(using=db, force_insert=True)
+        order_items, pending_decrements, sold = [], [], Counter()
+        for index, order in zip(accepted, orders):
+            results[index] = order
+            for line in checkouts[index].lines:
+                order_items.append(OrderItem(order=order, product_id=line.product_id, quantity=line.quantity,
+                                             price_at_purchase=line.price))
+                if line.is_flash_sale:
+                    # Folded into Product.stock later by flush_flash_stock()
+                    pending_decrements.append(PendingStockDecrement(product_id=line.product_id,
+                                                                    quantity=line.quantity))
+                else:
+                    sold[line.product_id] += line.quantity
+        OrderItem.objects.using(db).bulk_create(order_items)
+        PendingStockDecrement.objects.bulk_create(pending_decrements)
+        if sold:
+            Product.objects.filter(pk__in=list(sold)).update(stock=Case(
+                *[When(pk=product_id, then=F('stock') - Value(quantity)) for product_id, quantity in sold.items()],
+                default=F('stock'), output_field=models.IntegerField(),
+            ))
+        cart_item_ids = [pk for index in accepted for pk in checkouts[index].cart_item_ids]
+        CartItem.objects.using(db).filter(pk__in=cart_item_ids).delete()
+    return results
+
+
+def place_checkout(checkout):
+    """
+    Commits one checkout and returns its Order, raising CheckoutRejected. With CHECKOUT_BATCHING
+    the checkout joins the next batch of this process's CheckoutBatcher; otherwise, or inside an
+    open transaction (whose rows the batcher's connection could not see), it is committed here.
+
+    A batched checkout waits at most CHECKOUT_BATCH_WAIT_MS plus CHECKOUT_BATCH_TIMEOUT_SECONDS.
+    If its batch has not started by then (the batcher is stuck), it is withdrawn and committed
+    here; if its batch is still committing, CheckoutTimedOut is raised.
+    """
+    if settings.CHECKOUT_BATCHING and not any(transaction.get_connection(using).in_atomic_block
+                                              for using in {CATALOG_DB, checkout.db}):
+        future = get_checkout_batcher().submit(checkout)
+        try:
+            return future.result(timeout=settings.CHECKOUT_BATCH_WAIT_MS / 1000
+                                 + settings.CHECKOUT_BATCH_TIMEOUT_SECONDS)
+        except TimeoutError:
+            if not future.cancel():
+                raise CheckoutTimedOut("Your order is taking longer than usual to confirm. "
+                                       "Please check your orders before trying again.")
+    result, = commit_checkouts([checkout])
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+
+# =============================================================================
+# --- Micro-Batching ---
+# =============================================================================
+
+class MicroBatcher:
+    """
+    Hands items submitted from many threads to `handler` in batches, from one background thread.
+
+    A batch is cut at `max_size` items or `max_wait` seconds after its first item arrived,
+    whichever comes first; items arriving while a batch is being handled form the next one.
+    `handler(items)` returns one result per item, and each submitter's Future resolves to its
+    own result, or raises it when it is an exception. Items whose Future was cancelled before
+    their batch started are left out of it.
+    """
+
+    def __init__(self, handler, max_size, max_wait, name='micro-batcher'):
+        self.handler, self.max_size, self.max_wait, self.name = handler, max_size, max_wait, name
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, item):
+        future = Future()
+        self._queue.put((item, future))
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                    self._thread.start()
+        return future
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_size:
+                try:
+                    batch.append(self._queue.get(timeout=max(deadline - time.monotonic(), 0)))
+                except queue.Empty:
+                    break
+            self._dispatch(batch)
+
+    def _dispatch(self, batch):
+        batch = [(item, future) for item, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        try:
+            results = self.handler([item for item, _ in batch])
+        except Exception as exc:
+            results = [exc] * len(batch)
+        for (_, future), result in zip(batch, results):
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
+def _commit_batch(checkouts):
+    close_old_connections()  # honours CONN_MAX_AGE and drops broken connections between batches
+    try:
+        return commit_checkouts(checkouts)
+    except Exception as exc:
+        if len(checkouts) == 1:
+            return [exc]
+        # One failing checkout must not fail the rest of its batch: commit each on its own.
+        return [_commit_batch([checkout])[0] for checkout in checkouts]
+
+
+_batcher = None
+_batcher_lock = threading.Lock()
+
+
+def get_checkout_batcher():
+    """This process's checkout batcher, sized by CHECKOUT_BATCH_SIZE and CHECKOUT_BATCH_WAIT_MS."""
+    global _batcher
+    if _batcher is None:
+        with _batcher_lock:
+            if _batcher is None:
+                _batcher = MicroBatcher(_commit_batch, settings.CHECKOUT_BATCH_SIZE,
+                                        settings.CHECKOUT_BATCH_WAIT_MS / 1000, name='checkout-batcher')
+    return _batcher
+
+
+def _forget_batcher():
+    global _batcher, _batcher_lock
+    _batcher, _batcher_lock = None, threading.Lock()
+
+
+# A worker forked from a preloaded master does not inherit the master's batcher thread.
+os.register_at_fork(after_in_child=_forget_batcher)
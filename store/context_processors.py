@@ -1,9 +1,9 @@
-from store.models import Cart
+from store.carts import get_cart_item_count, read_guest_cart
 
 
 def cart_item_count_processor(request):
-    count = 0
     if request.user.is_authenticated:
-        cart, created = Cart.objects.get_or_create(user=request.user)
-        count = cart.get_total_items()
+        count = get_cart_item_count(request.user)
+    else:
+        count = sum(read_guest_cart(request).values())
     return {'cart_item_count': count}
@@ -0,0 +1,123 @@
+# store/facets.py
+
+# --- Django & Python Imports ---
+import hashlib
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+# --- Local Application Imports ---
+from .metrics import CACHE_REQUESTS
+from .models import Product
+
+FACET_VERSION_KEY = 'store:facets:version'
+FACET_CACHE_KEY = 'store:facets:{version}:{digest}'
+
+
+# =============================================================================
+# --- Filtering ---
+# =============================================================================
+
+def _filter_q(filters, exclude=None):
+    """Builds the Q object for validated product `filters`, leaving out the `exclude` facet."""
+    q = Q()
+    if filters.get('category') is not None and exclude != 'category':
+        q &= Q(category_id=filters['category'])
+    if exclude != 'price':
+        if filters.get('min_price') is not None:
+            q &= Q(price__gte=filters['min_price'])
+        if filters.get('max_price') is not None:
+            q &= Q(price__lt=filters['max_price'])
+    if filters.get('in_stock') is not None and exclude != 'in_stock':
+        q &= Q(stock__gt=0) if filters['in_stock'] else Q(stock=0)
+    return q
+
+
+def filter_products(queryset, filters):
+    """Applies validated `filters` (see ProductFilterSerializer) to a product queryset."""
+    return queryset.filter(_filter_q(filters))
+
+
+def price_buckets():
+    """Returns the (min, max) price ranges configured by PRODUCT_PRICE_BUCKETS; max is exclusive."""
+    edges = [Decimal('0')] + [Decimal(str(edge)) for edge in settings.PRODUCT_PRICE_BUCKETS] + [None]
+    return list(zip(edges[:-1], edges[1:]))
+
+
+# =============================================================================
+# --- Facet Counts ---
+# =============================================================================
+
+def _count(condition):
+    # An empty Q would compile to an empty FILTER clause, so count unconditionally instead.
+    return Count('pk', filter=condition) if condition else Count('pk')
+
+
+def get_product_facets(filters):
+    """
+    Returns the matching product count plus per-category, per-price-bucket and stock facet counts.
+
+    Everything is computed by one query grouped by category, using conditional counts. Each facet
+    is counted with every filter except its own, so selecting a category still shows how many
+    products the other categories hold. Results are cached until a Product or Category changes
+    (see store.signals); stock-only bulk updates are picked up when the entry times out.
+    """
+    key = FACET_CACHE_KEY.format(version=_facet_version(), digest=_filters_digest(filters))
+    facets = cache.get(key)
+    CACHE_REQUESTS.labels('facets', 'miss' if facets is None else 'hit').inc()
+    if facets is not None:
+        return facets
+
+    buckets = price_buckets()
+    aggregates = {
+        'matching': _count(_filter_q(filters)),
+        'category_count': _count(_filter_q(filters, exclude='category')),
+        'in_stock': _count(_filter_q(filters, exclude='in_stock') & Q(stock__gt=0)),
+        'out_of_stock': _count(_filter_q(filters, exclude='in_stock') & Q(stock=0)),
+    }
+    for index, (low, high) in enumerate(buckets):
+        bucket_q = Q(price__gte=low) & (Q(price__lt=high) if high is not None else Q())
+        aggregates[f'price_{index}'] = _count(_filter_q(filters, exclude='price') & bucket_q)
+
+    # The grouped rows (one per category) are sorted in Python rather than by the database.
+    rows = sorted(Product.objects.filter(is_available=True)
+                  .values('category_id', 'category__name')
+                  .annotate(**aggregates)
+                  .order_by(), key=lambda row: row['category__name'])
+
+    facets = {
+        'count': sum(row['matching'] for row in rows),
+        'categories': [
+            {'id': row['category_id'], 'name': row['category__name'], 'count': row['category_count']}
+            for row in rows if row['category_count'] or row['category_id'] == filters.get('category')
+        ],
+        'price_ranges': [
+            {'min_price': low, 'max_price': high, 'count': sum(row[f'price_{index}'] for row in rows)}
+            for index, (low, high) in enumerate(buckets)
+        ],
+        'stock': {
+            'in_stock': sum(row['in_stock'] for row in rows),
+            'out_of_stock': sum(row['out_of_stock'] for row in rows),
+        },
+    }
+    cache.set(key, facets, settings.FACET_CACHE_TIMEOUT)
+    return facets
+
+
+def _filters_digest(filters):
+    normalized = sorted((name, str(value)) for name, value in filters.items() if value is not None)
+    return hashlib.md5(repr(normalized).encode()).hexdigest()
+
+
+def _facet_version():
+    return cache.get_or_set(FACET_VERSION_KEY, 1, timeout=None)
+
+
+def invalidate_facets():
+    """Bumps the facet cache version so every cached facet result is ignored from now on."""
+    try:
+        cache.incr(FACET_VERSION_KEY)
+    except ValueError:
+        cache.set(FACET_VERSION_KEY, 1, timeout=None)
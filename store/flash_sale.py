@@ -0,0 +1,174 @@
+# store/flash_sale.py
+
+# --- Django & Python Imports ---
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models, transaction
+from django.db.models import Case, F, Sum, Value, When
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+# --- Local Application Imports ---
+from .facets import invalidate_facets
+from .models import PendingStockDecrement, Product
+from .page_cache import invalidate_product_pages
+
+FLASH_STOCK_KEY = 'store:flash:stock:{product_id}'
+FLASH_PAUSE_KEY = 'store:flash:paused:{product_id}'
+# Counters hold COUNTER_BASE + units left, so a decrement past zero is still visible as a value
+# below the base (memcached clamps decrements at zero rather than going negative).
+COUNTER_BASE = 1 << 40
+
+
+class FlashSaleUnavailable(Exception):
+    """A hot product cannot supply the quantity asked for; `available` is None while it is paused."""
+
+    def __init__(self, product_id, available):
+        self.product_id, self.available = product_id, available
+        if available is None:
+            message = "This flash-sale item is being restocked. Please try again in a few seconds."
+        else:
+            message = f"Only {max(available, 0)} of this flash-sale item left."
+        super().__init__(message)
+
+
+# =============================================================================
+# --- Taking Stock at Checkout ---
+# =============================================================================
+
+def available_flash_stock(product_id):
+    """Units of a product that can still be sold, from the database: its stock less pending decrements."""
+    row = (Product.objects.filter(pk=product_id)
+           .annotate(pending=Coalesce(Sum('pending_decrements__quantity'), 0))
+           .values_list('stock', 'pending').first())
+    return row[0] - row[1] if row else 0
+
+
+def reserve_flash_stock(quantities):
+    """
+    Takes {product_id: quantity} of hot products from their shared-cache counters, all or nothing.
+
+    Each product costs one atomic cache decrement, and no database row is locked: a checkout
+    that would oversell is turned away here, before anything is written. The database is only
+    read to (re)load a counter that is missing. Raises FlashSaleUnavailable, having handed back
+    whatever was taken. The caller records the sale as PendingStockDecrement rows and must call
+    release_flash_stock() if its transaction fails.
+    """
+    taken = {}
+    try:
+        for product_id, quantity in quantities.items():
+            left = _take(product_id, quantity)
+            if left < 0:
+                release_flash_stock({product_id: quantity})
+                raise FlashSaleUnavailable(product_id, left + quantity)
+            taken[product_id] = quantity
+    except FlashSaleUnavailable:
+        release_flash_stock(taken)
+        raise
+    return taken
+
+
+def _take(product_id, quantity):
+    key = FLASH_STOCK_KEY.format(product_id=product_id)
+    try:
+        return cache.decr(key, quantity) - COUNTER_BASE
+    except ValueError:  # not loaded yet, evicted, or dropped by reset_flash_stock
+        if cache.get(FLASH_PAUSE_KEY.format(product_id=product_id)) is not None:
+            raise FlashSaleUnavailable(product_id, None)
+        cache.add(key, COUNTER_BASE + available_flash_stock(product_id), timeout=None)
+        try:
+            return cache.decr(key, quantity) - COUNTER_BASE
+        except ValueError:  # reset_flash_stock dropped it again in between
+            raise FlashSaleUnavailable(product_id, None)
+
+
+def release_flash_stock(taken):
+    """Hands back what reserve_flash_stock() took, for a checkout that did not go through."""
+    for product_id, quantity in taken.items():
+        try:
+            cache.incr(FLASH_STOCK_KEY.format(product_id=product_id), quantity)
+        except ValueError:
+            pass  # the counter was reset meanwhile and will be reloaded from the database
+
+
+# =============================================================================
+# --- Resetting Counters ---
+# =============================================================================
+
+def reset_flash_stock(product_ids):
+    """
+    Drops the counters of `product_ids` so they are reloaded from the database, after their stock
+    changed outside checkout (restock, manual edit) or the counters became untrustworthy. The
+    products are paused for FLASH_SALE_PAUSE_SECONDS first, turning their checkouts away, so that
+    checkouts already past the counter commit before the reload reads the database.
+    """
+    product_ids = list(product_ids)
+    if product_ids:
+        cache.set_many({FLASH_PAUSE_KEY.format(product_id=product_id): 1 for product_id in product_ids},
+                       timeout=settings.FLASH_SALE_PAUSE_SECONDS)
+        cache.delete_many([FLASH_STOCK_KEY.format(product_id=product_id) for product_id in product_ids])
+
+
+def reconcile_flash_stock(product_ids=None):
+    """
+    Crash recovery. A worker that dies between taking stock and committing its order leaves its
+    units missing from the counter, and a cache restored from an old snapshot can hold too many.
+    Resets the counters of every hot product (or of `product_ids`) and returns
+    {product_id: (counter, database)} for those whose counter disagreed with the database or
+    was missing (counter None). Checkouts in flight can account for a small difference.
+    """
+    products = Product.objects.filter(is_flash_sale=True)
+    if product_ids is not None:
+        products = products.filter(pk__in=product_ids)
+    rows = dict(products.annotate(pending=Coalesce(Sum('pending_decrements__quantity'), 0))
+                .values_list('pk', F('stock') - F('pending')))
+    counters = cache.get_many([FLASH_STOCK_KEY.format(product_id=product_id) for product_id in rows])
+    drift = {}
+    for product_id, available in rows.items():
+        counter = counters.get(FLASH_STOCK_KEY.format(product_id=product_id))
+        counter = None if counter is None else counter - COUNTER_BASE
+        if counter != available:
+            drift[product_id] = (counter, available)
+    reset_flash_stock(rows)
+    return drift
+
+
+# =============================================================================
+# --- Write-Behind Flush ---
+# =============================================================================
+
+def flush_flash_stock(batch_size=None):
+    """
+    Folds pending flash-sale decrements into Product.stock. Each batch of up to `batch_size`
+    (FLASH_STOCK_FLUSH_BATCH_SIZE) rows is one transaction: a single UPDATE subtracting every
+    product's total, then the rows are deleted. Rows locked by a concurrent flusher are skipped
+    (SKIP LOCKED where supported). Counters are unaffected: units move from "pending" to "sold"
+    in the database, so what is left to sell stays the same.
+    Returns {'decrements', 'products', 'batches'}.
+    """
+    batch_size = batch_size or settings.FLASH_STOCK_FLUSH_BATCH_SIZE
+    report = {'decrements': 0, 'products': 0, 'batches': 0}
+    while True:
+        with transaction.atomic():
+            rows = list(PendingStockDecrement.objects.select_for_update(skip_locked=True)
+                        .order_by('pk').values_list('pk', 'product_id', 'quantity')[:batch_size])
+            if not rows:
+                return report
+            totals = Counter()
+            for _, product_id, quantity in rows:
+                totals[product_id] += quantity
+            Product.objects.filter(pk__in=list(totals)).update(
+                stock=Case(*[When(pk=product_id, then=Greatest(F('stock') - quantity, Value(0)))
+                             for product_id, quantity in totals.items()],
+                           default=F('stock'), output_field=models.IntegerField()),
+                date_updated=timezone.now(),
+            )
+            PendingStockDecrement.objects.filter(pk__in=[pk for pk, _, _ in rows]).delete()
+            product_ids = list(totals)
+            # update() sends no signals, so the catalog caches are dropped here.
+            transaction.on_commit(lambda: (invalidate_facets(), invalidate_product_pages(product_ids)))
+        report['decrements'] += len(rows)
+        report['products'] += len(totals)
+        report['batches'] += 1
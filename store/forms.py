@@ -1,6 +1,7 @@
 from django import forms
 from django.contrib.auth.forms import AuthenticationForm, UserCreationForm
 
+from store.bulk import read_upload_rows
 from store.models import Order, User
 
 
@@ -43,3 +44,14 @@ class OrderAddressForm(forms.ModelForm):
             'postal_code': forms.TextInput(attrs={'class': 'form-control mb-2', 'placeholder': 'Postal Code'}),
             'country': forms.TextInput(attrs={'class': 'form-control mb-2', 'placeholder': 'Country'}),
         }
+
+
+class ProductBulkUpdateForm(forms.Form):
+    file = forms.FileField(help_text="CSV with a header row (id or slug, price, stock, is_available) or a JSON list.")
+    dry_run = forms.BooleanField(required=False, help_text="Validate and report without saving.")
+
+    def clean_file(self):
+        try:
+            return read_upload_rows(self.cleaned_data['file'])
+        except ValueError as exc:
+            raise forms.ValidationError(str(exc))
@@ -0,0 +1,144 @@
+# store/inventory.py
+
+# --- Django & Python Imports ---
+import json
+from collections import defaultdict, namedtuple
+
+from django.db import models, transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+# --- Local Application Imports ---
+from .facets import invalidate_facets
+from .flash_sale import reset_flash_stock
+from .models import Product
+from .page_cache import invalidate_product_pages
+
+FEED_BATCH_SIZE = 500
+MAX_ERROR_SAMPLES = 20
+
+StockChange = namedtuple('StockChange', 'line product_id seq delta stock')
+
+
+# =============================================================================
+# --- Feed Parsing ---
+# =============================================================================
+
+def parse_feed_line(line_number, line):
+    """
+    Parses one NDJSON feed line: `{"id": 12, "seq": 1042, "delta": -3}` for a relative change
+    or `{"id": 12, "seq": 1043, "stock": 40}` for an absolute count. Raises ValueError.
+    """
+    record = json.loads(line)
+    if not isinstance(record, dict):
+        raise ValueError("Expected a JSON object.")
+    product_id, seq = record.get('id'), record.get('seq')
+    if not _is_int(product_id) or not _is_int(seq) or seq <= 0:
+        raise ValueError("An integer 'id' and a positive integer 'seq' are required.")
+    if ('delta' in record) == ('stock' in record):
+        raise ValueError("Exactly one of 'delta' or 'stock' is required.")
+    delta, stock = record.get('delta'), record.get('stock')
+    if 'delta' in record and not _is_int(delta):
+        raise ValueError("'delta' must be an integer.")
+    if 'stock' in record and (not _is_int(stock) or stock < 0):
+        raise ValueError("'stock' must be a non-negative integer.")
+    return StockChange(line_number, product_id, seq, delta, stock)
+
+
+def _is_int(value):
+    return type(value) is int
+
+
+# =============================================================================
+# --- Applying the Feed ---
+# =============================================================================
+
+def apply_inventory_feed(lines, batch_size=FEED_BATCH_SIZE):
+    """
+    Applies a stream of NDJSON stock changes and returns an applied/rejected report.
+
+    `lines` is consumed lazily and at most `batch_size` parsed changes are held at once, so
+    memory use does not grow with the feed. Each batch is one transaction: the products'
+    last applied sequence numbers are read (and locked) in one query, stale or duplicate
+    changes are dropped, and what is left is written with a single UPDATE setting each
+    product's `stock = F('stock') + delta` (or its latest absolute count), clamped at zero.
+    """
+    report = {'applied': 0, 'rejected': 0, 'stale': 0, 'invalid': 0, 'unknown_product': 0, 'errors': []}
+    batch = []
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            batch.append(parse_feed_line(line_number, line))
+        except ValueError as exc:  # includes JSON and UTF-8 decoding errors
+            _reject(report, 'invalid', line_number, str(exc))
+        if len(batch) >= batch_size:
+            _apply_batch(batch, report)
+            batch = []
+    if batch:
+        _apply_batch(batch, report)
+    report['rejected'] = report['stale'] + report['invalid'] + report['unknown_product']
+    return report
+
+
+def _apply_batch(changes, report):
+    changes_by_product = defaultdict(list)
+    for change in changes:
+        changes_by_product[change.product_id].append(change)
+
+    with transaction.atomic():
+        # Locked in pk order, like checkout does, so the two cannot deadlock.
+        rows = list(Product.objects.select_for_update()
+                    .filter(pk__in=list(changes_by_product)).order_by('pk')
+                    .values_list('pk', 'stock_sequence', 'is_flash_sale'))
+        sequences = {product_id: sequence for product_id, sequence, _ in rows}
+        hot_ids = {product_id for product_id, _, is_flash_sale in rows if is_flash_sale}
+        updated_ids, stock_whens, sequence_whens = [], [], []
+        for product_id, product_changes in changes_by_product.items():
+            if product_id not in sequences:
+                for change in product_changes:
+                    _reject(report, 'unknown_product', change.line, f"No product with id {product_id}.")
+                continue
+
+            last_seq = sequences[product_id]
+            absolute, delta = None, 0
+            for change in sorted(product_changes, key=lambda c: c.seq):
+                if change.seq <= last_seq:
+                    _reject(report, 'stale', change.line, f"Sequence {change.seq} is not after {last_seq}.")
+                    continue
+                last_seq = change.seq
+                if change.stock is not None:
+                    absolute, delta = change.stock, 0
+                else:
+                    delta += change.delta
+                report['applied'] += 1
+
+            if last_seq == sequences[product_id]:
+                continue
+            if absolute is not None:
+                new_stock = Value(max(absolute + delta, 0))
+            else:
+                new_stock = Greatest(F('stock') + delta, Value(0))
+            updated_ids.append(product_id)
+            stock_whens.append(When(pk=product_id, then=new_stock))
+            sequence_whens.append(When(pk=product_id, then=Value(last_seq)))
+
+        if updated_ids:
+            Product.objects.filter(pk__in=updated_ids).update(
+                stock=Case(*stock_whens, default=F('stock'), output_field=models.IntegerField()),
+                stock_sequence=Case(*sequence_whens, default=F('stock_sequence'),
+                                    output_field=models.BigIntegerField()),
+                date_updated=timezone.now(),
+            )
+            # update() sends no signals, so the catalog caches are dropped here.
+            transaction.on_commit(lambda: (invalidate_facets(), invalidate_product_pages(updated_ids)))
+            restocked_hot_ids = [product_id for product_id in updated_ids if product_id in hot_ids]
+            if restocked_hot_ids:
+                transaction.on_commit(lambda: reset_flash_stock(restocked_hot_ids))
+
+
+def _reject(report, reason, line_number, detail):
+    report[reason] += 1
+    if len(report['errors']) < MAX_ERROR_SAMPLES:
+        report['errors'].append({'line': line_number, 'reason': reason, 'detail': detail})
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from store.archive import archive_orders
+
+
+class Command(BaseCommand):
+    help = "Moves old completed orders into the archive tables in small batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int, default=None,
+                            help="Archive orders older than this; defaults to ORDER_ARCHIVE_AFTER_DAYS.")
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help="Orders moved per transaction; defaults to ORDER_ARCHIVE_BATCH_SIZE.")
+
+    def handle(self, *args, **options):
+        archived = archive_orders(older_than_days=options['older_than_days'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Archived {archived} order(s)."))
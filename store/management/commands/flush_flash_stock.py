@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from store.flash_sale import flush_flash_stock
+
+
+class Command(BaseCommand):
+    help = "Folds pending flash-sale stock decrements into Product.stock in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help="Decrements folded per transaction; defaults to FLASH_STOCK_FLUSH_BATCH_SIZE.")
+        parser.add_argument('--every', type=float, default=None, metavar='SECONDS',
+                            help="Keep running as a worker, flushing every SECONDS when nothing is pending.")
+
+    def handle(self, *args, **options):
+        while True:
+            report = flush_flash_stock(batch_size=options['batch_size'])
+            if report['decrements'] or not options['every']:
+                self.stdout.write(self.style.SUCCESS(
+                    f"Flushed {report['decrements']} decrement(s) into {report['products']} product(s) "
+                    f"in {report['batches']} batch(es)."
+                ))
+            if not options['every']:
+                return
+            time.sleep(options['every'])
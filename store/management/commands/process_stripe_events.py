@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from store.payments import process_stripe_events
+
+
+class Command(BaseCommand):
+    help = "Applies queued Stripe webhook events (the StripeEvent inbox) to orders in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help="Events applied per transaction; defaults to STRIPE_EVENT_BATCH_SIZE.")
+        parser.add_argument('--every', type=float, default=None, metavar='SECONDS',
+                            help="Keep running as a worker, polling the inbox every SECONDS when it is empty.")
+
+    def handle(self, *args, **options):
+        while True:
+            report = process_stripe_events(batch_size=options['batch_size'])
+            if report['events'] or not options['every']:
+                self.stdout.write(self.style.SUCCESS(
+                    f"Processed {report['events']} event(s) in {report['batches']} batch(es): "
+                    f"{report['orders_completed']} order(s) completed, {report['errors']} error(s)."
+                ))
+            if not options['every']:
+                return
+            time.sleep(options['every'])
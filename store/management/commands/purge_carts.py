@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from store.carts import purge_stale_carts
+
+
+class Command(BaseCommand):
+    help = "Deletes long-idle and empty carts (and their items) in small batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--idle-days', type=int, default=None,
+                            help="Delete carts idle this long; defaults to CART_IDLE_DAYS.")
+        parser.add_argument('--empty-grace-hours', type=int, default=None,
+                            help="Delete empty carts idle this long; defaults to CART_EMPTY_GRACE_HOURS.")
+        parser.add_argument('--chunk-size', type=int, default=None,
+                            help="Carts deleted per transaction; defaults to CART_PURGE_CHUNK_SIZE.")
+        parser.add_argument('--every', type=int, default=None, metavar='SECONDS',
+                            help="Keep running as a worker, purging again every SECONDS.")
+
+    def handle(self, *args, **options):
+        while True:
+            report = purge_stale_carts(idle_days=options['idle_days'],
+                                       empty_grace_hours=options['empty_grace_hours'],
+                                       chunk_size=options['chunk_size'])
+            rate = (report['carts'] + report['items']) / report['seconds'] if report['seconds'] else 0
+            self.stdout.write(self.style.SUCCESS(
+                f"Purged {report['carts']} cart(s) and {report['items']} item(s) in {report['chunks']} chunk(s), "
+                f"{report['seconds']:.2f}s ({rate:.0f} rows/s)."
+            ))
+            if not options['every']:
+                return
+            time.sleep(options['every'])
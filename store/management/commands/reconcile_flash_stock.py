@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from store.flash_sale import reconcile_flash_stock
+
+
+class Command(BaseCommand):
+    help = "Reloads flash-sale stock counters from the database and reports those that had drifted."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--product', type=int, action='append', default=None, metavar='ID',
+                            help="Only this product (repeatable); defaults to every flash-sale product.")
+
+    def handle(self, *args, **options):
+        drift = reconcile_flash_stock(options['product'])
+        for product_id, (counter, available) in sorted(drift.items()):
+            counter = 'missing' if counter is None else counter
+            self.stdout.write(f"Product {product_id}: counter {counter}, database {available}")
+        self.stdout.write(self.style.SUCCESS(f"Reset flash-sale counters; {len(drift)} had drifted."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from store.popularity import refresh_product_popularity
+
+
+class Command(BaseCommand):
+    help = "Recomputes the decayed best-seller and trending scores for all products."
+
+    def handle(self, *args, **options):
+        scored = refresh_product_popularity()
+        self.stdout.write(self.style.SUCCESS(f"Scored {scored} product(s) with recent sales."))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from store.recommendations import refresh_recommendations
+
+
+class Command(BaseCommand):
+    help = "Recomputes the \"frequently bought together\" products from the order history."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1,
+                            help="Processes counting order-id ranges in parallel.")
+        parser.add_argument('--top-k', type=int, default=None,
+                            help="Related products kept per product; defaults to RECOMMENDATIONS_TOP_K.")
+        parser.add_argument('--chunk-size', type=int, default=None,
+                            help="Order ids read per query; defaults to RECOMMENDATIONS_CHUNK_SIZE.")
+
+    def handle(self, *args, **options):
+        products = refresh_recommendations(top_k=options['top_k'], chunk_size=options['chunk_size'],
+                                           workers=options['workers'])
+        self.stdout.write(self.style.SUCCESS(f"Stored recommendations for {products} product(s)."))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from store.analytics import refresh_sales_rollups, rebuild_sales_rollups
+
+
+class Command(BaseCommand):
+    help = "Incrementally folds newly placed orders into the daily sales rollup tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Number of orders aggregated per transaction.")
+        parser.add_argument('--settle-seconds', type=int, default=None,
+                            help="Skip orders younger than this; defaults to SALES_ROLLUP_SETTLE_SECONDS.")
+        parser.add_argument('--rebuild', action='store_true',
+                            help="Discard the rollups and high-water mark and rebuild from all orders.")
+
+    def handle(self, *args, **options):
+        refresh = rebuild_sales_rollups if options['rebuild'] else refresh_sales_rollups
+        processed = refresh(batch_size=options['batch_size'], settle_seconds=options['settle_seconds'])
+        self.stdout.write(self.style.SUCCESS(f"Rolled up {processed} order(s)."))
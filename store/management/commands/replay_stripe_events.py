@@ -0,0 +1,93 @@
+import copy
+import json
+import random
+import statistics
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from store.models import Order
+from store.payments import sign_stripe_payload
+
+FIXTURE_DIR = Path(__file__).resolve().parents[2] / 'fixtures' / 'stripe'
+
+
+class Command(BaseCommand):
+    help = ("Load-tests the Stripe webhook endpoint: replays signed events built from the fixtures in "
+            "store/fixtures/stripe/ (with a share of duplicate deliveries) and reports latency.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://localhost:8000/api/payment/webhook/')
+        parser.add_argument('--count', type=int, default=1000, help="Distinct events to send.")
+        parser.add_argument('--concurrency', type=int, default=20, help="Parallel connections.")
+        parser.add_argument('--duplicates', type=float, default=0.1,
+                            help="Fraction of events delivered a second time, as Stripe retries do.")
+        parser.add_argument('--fixture', action='append', default=None,
+                            help="Event fixture to replay (repeatable); defaults to every fixture.")
+        parser.add_argument('--secret', default=None, help="Signing secret; defaults to STRIPE_WEBHOOK_SECRET.")
+
+    def handle(self, *args, **options):
+        secret = options['secret'] or settings.STRIPE_WEBHOOK_SECRET
+        if not secret:
+            raise CommandError("Pass --secret or set STRIPE_WEBHOOK_SECRET.")
+        paths = [Path(path) for path in options['fixture'] or sorted(FIXTURE_DIR.glob('*.json'))]
+        templates = [json.loads(path.read_text()) for path in paths]
+
+        # Successful payments point at real pending orders when there are some, so processing them completes orders.
+        orders = list(Order.objects.filter(is_completed=False).order_by('-id')
+                      .values_list('pk', 'total_amount')[:options['count']])
+        payloads = [json.dumps(self._build_event(templates[n % len(templates)], orders[n % len(orders)] if orders else None))
+                    for n in range(options['count'])]
+        payloads += random.sample(payloads, int(len(payloads) * options['duplicates']))
+        random.shuffle(payloads)
+
+        sessions = threading.local()
+
+        def send(payload):
+            if not hasattr(sessions, 'session'):
+                sessions.session = requests.Session()
+            headers = {'Content-Type': 'application/json', 'Stripe-Signature': sign_stripe_payload(payload, secret)}
+            start = time.perf_counter()
+            try:
+                status_code = sessions.session.post(options['url'], data=payload.encode(), headers=headers,
+                                                    timeout=30).status_code
+            except requests.RequestException as e:
+                status_code = type(e).__name__
+            return status_code, (time.perf_counter() - start) * 1000
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(options['concurrency']) as pool:
+            results = list(pool.map(send, payloads))
+        elapsed = time.perf_counter() - started
+
+        statuses = Counter(status_code for status_code, _ in results)
+        latencies = sorted(latency for _, latency in results)
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        self.stdout.write(self.style.SUCCESS(
+            f"Sent {len(payloads)} request(s) ({options['count']} distinct events) in {elapsed:.2f}s "
+            f"({len(payloads) / elapsed:.0f} req/s); statuses {dict(statuses)}; "
+            f"latency p50={statistics.median(latencies):.1f}ms p99={p99:.1f}ms max={latencies[-1]:.1f}ms."
+        ))
+
+    @staticmethod
+    def _build_event(template, order):
+        event = copy.deepcopy(template)
+        event['id'] = f"evt_replay_{uuid.uuid4().hex}"
+        event['created'] = int(time.time())
+        obj = event['data']['object']
+        if obj.get('object') == 'payment_intent':
+            obj['id'] = f"pi_replay_{uuid.uuid4().hex}"
+        if order is not None:
+            order_id, total_amount = order
+            obj.setdefault('metadata', {})['order_id'] = str(order_id)
+            obj['amount'] = int(total_amount * 100)
+            if obj.get('status') == 'succeeded' and 'amount_received' in obj:
+                obj['amount_received'] = obj['amount']
+        return event
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from store.sharding import reshard_users
+
+
+class Command(BaseCommand):
+    help = ("Moves users' carts and orders to their home shard under the current USER_SHARDS "
+            "(or to --to), resuming any interrupted moves.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', default=None, metavar='ID',
+                            help="Only this user (repeatable); defaults to every user.")
+        parser.add_argument('--to', default=None, metavar='ALIAS',
+                            help="Move the --user users to this shard instead of their home shard.")
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help="Users per batch (default: USER_RESHARD_BATCH_SIZE).")
+        parser.add_argument('--grace', type=float, default=None,
+                            help="Seconds to let in-flight requests finish (default: USER_MOVE_GRACE_SECONDS).")
+
+    def handle(self, *args, **options):
+        if options['to'] and not options['user']:
+            raise CommandError("--to needs at least one --user.")
+        try:
+            report = reshard_users(options['user'], options['to'], options['batch_size'], options['grace'],
+                                   log=self.stdout.write)
+        except ValueError as exc:
+            raise CommandError(exc)
+        self.stdout.write(self.style.SUCCESS(
+            f"Moved {report['users']} user(s), {report['rows']} row(s), in {report['batches']} batch(es)."
+        ))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from store.seeding import seed_data
+
+
+class Command(BaseCommand):
+    help = ("Bulk-inserts realistic synthetic users, categories, products and orders for benchmarking. "
+            "The same --seed always produces the same data.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=0)
+        parser.add_argument('--products', type=int, default=0)
+        parser.add_argument('--orders', type=int, default=0,
+                            help="Orders (with items) spread over the past year; uses the seeded or existing products.")
+        parser.add_argument('--categories', type=int, default=None,
+                            help="Leaf categories; defaults to one per 500 products (at least one per subcategory).")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--workers', type=int, default=1,
+                            help="Processes inserting chunks in parallel (PostgreSQL only).")
+        parser.add_argument('--chunk-size', type=int, default=5000, help="Rows per bulk insert.")
+        parser.add_argument('--password', default='password', help="Password of every seeded user.")
+
+    def handle(self, *args, **options):
+        timings = seed_data(users=options['users'], products=options['products'], orders=options['orders'],
+                            categories=options['categories'], seed=options['seed'], workers=options['workers'],
+                            chunk_size=options['chunk_size'], password=options['password'], log=self.stdout.write)
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded in {sum(timings.values()):.1f}s. Run refresh_sales_rollups, refresh_popularity and "
+            f"refresh_recommendations to build the derived tables."
+        ))
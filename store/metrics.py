@@ -0,0 +1,354 @@
+# store/metrics.py
+
+# --- Django & Python Imports ---
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRICS_FILE_SUFFIX = '.metrics'
+FOLDING_FILE_SUFFIX = '.folding'
+INITIAL_FILE_SIZE = 64 * 1024
+
+_HEADER = struct.Struct('<I4x')  # bytes in use, entries start 8-byte aligned
+_KEY_LENGTH = struct.Struct('<I')
+_VALUE = struct.Struct('<d')
+
+
+# =============================================================================
+# --- Value Stores ---
+# =============================================================================
+
+class MemoryValues:
+    """Values held in this process only: used when METRICS_DIR is unset (single-process servers, tests)."""
+
+    def __init__(self):
+        self._values = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc_many(self, increments):
+        with self._lock:
+            for key, amount in increments:
+                self._values[key] += amount
+
+    def collect(self):
+        with self._lock:
+            return dict(self._values)
+
+
+class MmapValues:
+    """
+    Values in a file owned by this process and mapped into memory. Each sample is appended once
+    as (key length, key, padding, float64) and then updated in place, so an increment is a dict
+    lookup plus an 8-byte write. The header holding the bytes in use is written after the entry,
+    so processes reading the file (see read_values) never see a half-written one.
+    """
+
+    def __init__(self, path):
+        self._file = open(path, 'a+b')
+        if os.fstat(self._file.fileno()).st_size < INITIAL_FILE_SIZE:
+            self._file.truncate(INITIAL_FILE_SIZE)
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        # A file left by an earlier process with the same pid is continued, so its counts are kept.
+        self._used = max(_HEADER.unpack_from(self._map)[0], _HEADER.size)
+        self._offsets = {key: offset for key, offset, _ in _entries(self._map, self._used)}
+        self._lock = threading.Lock()
+
+    def inc_many(self, increments):
+        with self._lock:
+            for key, amount in increments:
+                offset = self._offsets.get(key)
+                if offset is None:
+                    offset = self._append(key)
+                _VALUE.pack_into(self._map, offset, _VALUE.unpack_from(self._map, offset)[0] + amount)
+
+    def _append(self, key):
+        encoded = key.encode()
+        padded = len(encoded) + (-(_KEY_LENGTH.size + len(encoded)) % 8)
+        size = _KEY_LENGTH.size + padded + _VALUE.size
+        while self._used + size > len(self._map):
+            self._file.truncate(len(self._map) * 2)
+            self._map.close()
+            self._map = mmap.mmap(self._file.fileno(), 0)
+        _KEY_LENGTH.pack_into(self._map, self._used, len(encoded))
+        self._map[self._used + _KEY_LENGTH.size:self._used + _KEY_LENGTH.size + len(encoded)] = encoded
+        offset = self._used + _KEY_LENGTH.size + padded
+        _VALUE.pack_into(self._map, offset, 0.0)
+        self._used += size
+        _HEADER.pack_into(self._map, 0, self._used)
+        self._offsets[key] = offset
+        return offset
+
+
+def _entries(data, used):
+    offset = _HEADER.size
+    while offset < used:
+        length = _KEY_LENGTH.unpack_from(data, offset)[0]
+        key = bytes(data[offset + _KEY_LENGTH.size:offset + _KEY_LENGTH.size + length]).decode()
+        value_offset = offset + _KEY_LENGTH.size + length + (-(_KEY_LENGTH.size + length) % 8)
+        yield key, value_offset, _VALUE.unpack_from(data, value_offset)[0]
+        offset = value_offset + _VALUE.size
+
+
+def read_values(data):
+    """Returns {key: value} for the contents of a metrics file (bytes or a mapping of one)."""
+    if len(data) < _HEADER.size:
+        return {}
+    return {key: value for key, _, value in _entries(data, _HEADER.unpack_from(data)[0])}
+
+
+_values = None
+_values_lock = threading.Lock()
+
+
+def get_values():
+    """This process's value store, opened on first use: a file in METRICS_DIR, or memory when it is unset."""
+    global _values
+    if _values is None:
+        with _values_lock:
+            if _values is None:
+                if settings.METRICS_DIR:
+                    os.makedirs(settings.METRICS_DIR, exist_ok=True)
+                    _values = MmapValues(Path(settings.METRICS_DIR) / f'{os.getpid()}{METRICS_FILE_SUFFIX}')
+                else:
+                    _values = MemoryValues()
+    return _values
+
+
+def _forget_values():
+    global _values, _values_lock
+    _values, _values_lock = None, threading.Lock()
+
+
+# Server workers forked from a preloaded master must not write into the master's file.
+os.register_at_fork(after_in_child=_forget_values)
+
+
+def _pid_is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:  # alive, but run by another user
+        return True
+    return True
+
+
+def fold_dead_files(values):
+    """
+    Adds the files of processes that have exited into `values` (this process's store) and
+    deletes them, so METRICS_DIR holds one file per live worker while the counters never go
+    down. A file is renamed before it is read, so concurrent scrapes cannot fold it twice.
+    """
+    for path in Path(settings.METRICS_DIR).glob(f'*{METRICS_FILE_SUFFIX}'):
+        if not path.stem.isdigit() or int(path.stem) == os.getpid() or _pid_is_alive(int(path.stem)):
+            continue
+        folding = path.with_name(f'{path.stem}-{os.getpid()}{FOLDING_FILE_SUFFIX}')
+        try:
+            path.rename(folding)
+        except FileNotFoundError:  # another scrape got there first
+            continue
+        values.inc_many(read_values(folding.read_bytes()).items())
+        folding.unlink()
+
+
+def collect_values():
+    """Sums every process's values: all files in METRICS_DIR, or this process's memory when it is unset."""
+    values = get_values()
+    if not settings.METRICS_DIR:
+        return values.collect()
+    fold_dead_files(values)
+    totals = defaultdict(float)
+    for path in Path(settings.METRICS_DIR).glob(f'*{METRICS_FILE_SUFFIX}'):
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            continue
+        for key, value in read_values(data).items():
+            totals[key] += value
+    return totals
+
+
+# =============================================================================
+# --- Metric Types ---
+# =============================================================================
+
+REGISTRY = {}
+
+
+def _sample_key(name, suffix, label_values):
+    return json.dumps([name, suffix, label_values])
+
+
+class Metric:
+    """
+    A named metric with fixed label names. `labels(*values)` returns the child for one label
+    combination; children are cached, so hot paths pay a dict lookup per event.
+    """
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name, self.documentation, self.labelnames = name, documentation, tuple(labelnames)
+        self._children = {}
+        REGISTRY[name] = self
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} takes labels {self.labelnames}, got {values}.")
+            child = self._children.setdefault(values, self._make_child([str(value) for value in values]))
+        return child
+
+    def _make_child(self, label_values):
+        raise NotImplementedError
+
+    def expose(self, samples):
+        """Yields exposition lines for the aggregated `samples`: (suffix, label values, value) tuples."""
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def _make_child(self, label_values):
+        return CounterChild(_sample_key(self.name, '', label_values))
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def expose(self, samples):
+        for _, label_values, value in sorted(samples):
+            yield f'{self.name}{_format_labels(self.labelnames, label_values)} {_format_value(value)}'
+
+
+class CounterChild:
+    __slots__ = ('_increment',)
+
+    def __init__(self, key):
+        self._increment = ((key, 1),)
+
+    def inc(self, amount=1):
+        get_values().inc_many(self._increment if amount == 1 else ((self._increment[0][0], amount),))
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _make_child(self, label_values):
+        bucket_keys = [_sample_key(self.name, '_bucket', [*label_values, _format_value(bound)])
+                       for bound in (*self.buckets, float('inf'))]
+        return HistogramChild(self.buckets, bucket_keys, _sample_key(self.name, '_sum', label_values),
+                              _sample_key(self.name, '_count', label_values))
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def expose(self, samples):
+        # Buckets are stored per interval and made cumulative here, so observe() writes one bucket.
+        series = defaultdict(lambda: {'_bucket': defaultdict(float), '_sum': 0.0, '_count': 0.0})
+        for suffix, label_values, value in samples:
+            if suffix == '_bucket':
+                series[tuple(label_values[:-1])]['_bucket'][label_values[-1]] += value
+            else:
+                series[tuple(label_values)][suffix] += value
+        bucket_names = [*self.labelnames, 'le']
+        for label_values, totals in sorted(series.items()):
+            cumulative = 0.0
+            for bound in (*self.buckets, float('inf')):
+                cumulative += totals['_bucket'].get(_format_value(bound), 0.0)
+                yield (f'{self.name}_bucket{_format_labels(bucket_names, [*label_values, _format_value(bound)])} '
+                       f'{_format_value(cumulative)}')
+            labels = _format_labels(self.labelnames, label_values)
+            yield f'{self.name}_sum{labels} {_format_value(totals["_sum"])}'
+            yield f'{self.name}_count{labels} {_format_value(totals["_count"])}'
+
+
+class HistogramChild:
+    __slots__ = ('_bounds', '_bucket_keys', '_sum_key', '_count_key')
+
+    def __init__(self, bounds, bucket_keys, sum_key, count_key):
+        self._bounds, self._bucket_keys, self._sum_key, self._count_key = bounds, bucket_keys, sum_key, count_key
+
+    def observe(self, value):
+        get_values().inc_many(((self._bucket_keys[bisect_left(self._bounds, value)], 1),
+                               (self._sum_key, value), (self._count_key, 1)))
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return str(int(value)) if value == int(value) else repr(value)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    escaped = (value.replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"') for value in values)
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(names, escaped)) + '}'
+
+
+def render_metrics():
+    """The registered metrics, summed over all worker processes, in the Prometheus text format."""
+    samples = defaultdict(list)
+    for key, value in collect_values().items():
+        name, suffix, label_values = json.loads(key)
+        samples[name].append((suffix, label_values, value))
+    lines = []
+    for name, metric in sorted(REGISTRY.items()):
+        lines.append(f'# HELP {name} {metric.documentation}')
+        lines.append(f'# TYPE {name} {metric.kind}')
+        lines.extend(metric.expose(samples.get(name, ())))
+    return '\n'.join(lines) + '\n'
+
+
+# =============================================================================
+# --- Store Metrics ---
+# =============================================================================
+
+REQUEST_DURATION = Histogram('store_http_request_duration_seconds',
+                             "Time to produce a response (first chunk for streamed ones), by route.",
+                             ['route', 'method'])
+REQUESTS = Counter('store_http_requests_total', "Responses by route and status code.",
+                   ['route', 'method', 'status'])
+CHECKOUTS = Counter('store_checkouts_total', "Checkout attempts by outcome: success or the failure reason.",
+                    ['outcome'])
+STOCK_CONFLICTS = Counter('store_stock_conflicts_total',
+                          "Requests for more units than are in stock, by where they were refused.", ['source'])
+CART_MUTATIONS = Counter('store_cart_mutations_total', "Cart changes by cart kind (user or guest) and action.",
+                         ['cart', 'action'])
+STRIPE_REQUEST_DURATION = Histogram('store_stripe_request_duration_seconds',
+                                    "Latency of calls to the Stripe API, by operation and outcome.",
+                                    ['operation', 'outcome'])
+CACHE_REQUESTS = Counter('store_cache_requests_total', "Cache lookups by cache and result (hit, stale or miss).",
+                         ['cache', 'result'])
+
+HTTP_METHODS = frozenset(['GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'])
+
+
+def observe_request(route, method, status_code, seconds):
+    """Records one handled request; unknown methods are folded into 'OTHER' to bound the label values."""
+    method = method if method in HTTP_METHODS else 'OTHER'
+    REQUEST_DURATION.labels(route, method).observe(seconds)
+    REQUESTS.labels(route, method, status_code).inc()
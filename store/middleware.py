@@ -0,0 +1,112 @@
+# store/middleware.py
+
+# --- Django & Python Imports ---
+import math
+import time
+
+from django.conf import settings
+from django.http import HttpResponse
+
+# --- Third-Party Imports ---
+from rest_framework.views import APIView
+
+# --- Local Application Imports ---
+from .metrics import observe_request
+from .querylog import inspect_queries
+from .sharding import UserDataMoving
+from .throttling import throttle_request
+
+
+# =============================================================================
+# --- Throttling Middleware ---
+# =============================================================================
+
+class ThrottleMiddleware:
+    """
+    Applies the shared-cache token buckets (store.throttling) to the template views.
+    DRF views are skipped here because TokenBucketThrottle limits them after authentication.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'cls', None)
+        if isinstance(view_class, type) and issubclass(view_class, APIView):
+            return None
+
+        allowed, retry_after = throttle_request(request)
+        if allowed:
+            return None
+        response = HttpResponse("Too many requests. Please slow down and try again shortly.", status=429,
+                                content_type='text/plain')
+        response['Retry-After'] = str(math.ceil(retry_after))
+        return response
+
+
+# =============================================================================
+# --- User Sharding Middleware ---
+# =============================================================================
+
+class UserDataMovingMiddleware:
+    """
+    Answers template views that touch a user's cart or orders while reshard_users() is moving
+    them with a 503 and Retry-After, as DRF does for the API (UserDataMoving is an APIException).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_exception(self, request, exception):
+        if not isinstance(exception, UserDataMoving):
+            return None
+        response = HttpResponse(str(exception.detail), status=exception.status_code, content_type='text/plain')
+        response['Retry-After'] = str(math.ceil(settings.USER_MOVE_GRACE_SECONDS) + 1)
+        return response
+
+
+# =============================================================================
+# --- Metrics Middleware ---
+# =============================================================================
+
+class MetricsMiddleware:
+    """
+    Records every request's latency and status code under its URL name (store.metrics).
+    Listed first in MIDDLEWARE so the timing covers the whole middleware stack.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        response = self.get_response(request)
+        match = request.resolver_match
+        route = (match.url_name or match.view_name) if match else 'unmatched'
+        observe_request(route, request.method, response.status_code, time.perf_counter() - start)
+        return response
+
+
+# =============================================================================
+# --- Query Inspection Middleware ---
+# =============================================================================
+
+class QueryInspectionMiddleware:
+    """
+    Runs each request under store.querylog.inspect_queries: repeated query shapes (N+1s) and
+    slow queries are logged with the code that issued them. Queries made while a streamed
+    response is being consumed fall outside the request and are not inspected.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with inspect_queries(f'{request.method} {request.path}'):
+            return self.get_response(request)
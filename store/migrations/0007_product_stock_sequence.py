@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-19 02:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0006_product_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='stock_sequence',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.1 on 2026-10-19 03:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0012_stripe_event_inbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='is_flash_sale',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='PendingStockDecrement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pending_decrements', to='store.product')),
+            ],
+        ),
+    ]
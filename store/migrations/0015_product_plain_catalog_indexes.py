@@ -0,0 +1,43 @@
+# Generated by Django 5.2.1 on 2026-10-19 04:12
+
+from django.db import migrations, models
+
+# MySQL skips the partial catalog indexes on Product; these are their plain equivalents there.
+# Other backends use the partial ones and would only pay for keeping these up to date.
+MYSQL_CATALOG_INDEXES = [
+    models.Index(fields=['is_available', '-date_added'], name='product_avail_added_idx'),
+    models.Index(fields=['is_available', '-popularity_score', '-date_added'], name='product_avail_popular_idx'),
+    models.Index(fields=['is_available', '-trending_score', '-date_added'], name='product_avail_trending_idx'),
+    models.Index(fields=['is_available', 'price'], name='product_avail_price_idx'),
+    models.Index(fields=['category', 'is_available', '-date_added'], name='product_cat_avail_added_idx'),
+    models.Index(fields=['category', 'is_available', '-popularity_score', '-date_added'],
+                 name='product_cat_avail_popular_idx'),
+    models.Index(fields=['category', 'is_available', '-trending_score', '-date_added'],
+                 name='product_cat_avail_trending_idx'),
+    models.Index(fields=['category', 'is_available', 'price'], name='product_cat_avail_price_idx'),
+]
+
+
+def add_mysql_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == 'mysql':
+        Product = apps.get_model('store', 'Product')
+        for index in MYSQL_CATALOG_INDEXES:
+            schema_editor.add_index(Product, index)
+
+
+def remove_mysql_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == 'mysql':
+        Product = apps.get_model('store', 'Product')
+        for index in MYSQL_CATALOG_INDEXES:
+            schema_editor.remove_index(Product, index)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0014_user_shards'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_mysql_indexes, remove_mysql_indexes),
+    ]
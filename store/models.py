@@ -3,6 +3,7 @@
 # --- Django & Python Imports ---
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.utils import timezone
 from django.utils.text import slugify
 from django.conf import settings
 from decimal import Decimal
@@ -25,6 +26,8 @@ class User(AbstractUser):
     country = models.CharField(max_length=100, blank=True, null=True)
     profile_picture = models.ImageField(upload_to='profile_pics/', blank=True, null=True)
     credits = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('100.00'))
+    # Database alias holding this user's carts and orders (store.sharding); blank means 'default'.
+    shard = models.CharField(max_length=100, blank=True, default='', editable=False)
 
     def __str__(self):
         return self.username
@@ -77,9 +80,40 @@ class Product(models.Model):
     is_available = models.BooleanField(default=True)
     date_added = models.DateTimeField(auto_now_add=True)
     date_updated = models.DateTimeField(auto_now=True)
+    # Decayed sales scores, recomputed periodically by `manage.py refresh_popularity`.
+    popularity_score = models.FloatField(default=0, editable=False)
+    trending_score = models.FloatField(default=0, editable=False)
+    # Sequence number of the last warehouse feed change applied to `stock` (see store.inventory).
+    stock_sequence = models.BigIntegerField(default=0, editable=False)
+    # Hot products sold through the flash-sale path (store.flash_sale): checkouts take stock from a
+    # shared-cache counter and the decrements reach `stock` in batches, via PendingStockDecrement.
+    is_flash_sale = models.BooleanField(default=False)
 
     class Meta:
         ordering = ['-date_added']
+        # Catalog queries only ever list available products, so their indexes are partial: smaller,
+        # and usable on SQLite too, where `is_available=True` compiles to a bare boolean test.
+        # MySQL has no partial indexes (Django skips them); migration 0015 gives it plain composite
+        # ones led by `is_available` instead, on MySQL only.
+        indexes = [
+            models.Index(fields=['-date_added'], condition=models.Q(is_available=True),
+                         name='product_available_added_idx'),
+            models.Index(fields=['-popularity_score', '-date_added'], condition=models.Q(is_available=True),
+                         name='product_popularity_idx'),
+            models.Index(fields=['-trending_score', '-date_added'], condition=models.Q(is_available=True),
+                         name='product_trending_idx'),
+            # Browsing one category, in each of the PRODUCT_ORDERINGS.
+            models.Index(fields=['category', '-date_added'], condition=models.Q(is_available=True),
+                         name='product_category_added_idx'),
+            models.Index(fields=['category', '-popularity_score', '-date_added'],
+                         condition=models.Q(is_available=True), name='product_category_popular_idx'),
+            models.Index(fields=['category', '-trending_score', '-date_added'],
+                         condition=models.Q(is_available=True), name='product_category_trending_idx'),
+            # Catalog filters (store.facets): category + price range, or price range alone.
+            models.Index(fields=['category', 'price'], condition=models.Q(is_available=True),
+                         name='product_category_price_idx'),
+            models.Index(fields=['price'], condition=models.Q(is_available=True), name='product_price_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -98,16 +132,35 @@ class Product(models.Model):
         super().save(*args, **kwargs)
 
 
+# Named sort orders accepted by the product list API (`?ordering=`) and web page (`?sort=`).
+PRODUCT_ORDERINGS = {
+    'newest': ('-date_added',),
+    'popular': ('-popularity_score', '-date_added'),
+    'trending': ('-trending_score', '-date_added'),
+    'price': ('price',),
+    '-price': ('-price',),
+}
+
+
 # =============================================================================
 # --- Cart Models ---
 # =============================================================================
 
 class Cart(models.Model):
     """Represents a user's shopping cart."""
-    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='cart')
+    # Carts and orders may live on a user shard, away from the users and products they point at,
+    # so these references carry no database constraint (store.sharding).
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='cart',
+                                db_constraint=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Also bumped whenever one of its items is saved; `manage.py purge_carts` treats it as last activity.
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='cart_updated_idx'),
+        ]
+
     def __str__(self):
         return f"Cart for {self.user.username}"
 
@@ -123,17 +176,25 @@ class Cart(models.Model):
 class CartItem(models.Model):
     """Represents a single item (a product and its quantity) within a cart."""
     cart = models.ForeignKey(Cart, related_name='items', on_delete=models.CASCADE)
-    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, db_constraint=False)
     quantity = models.PositiveIntegerField(default=1)
     date_added = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         unique_together = ('cart', 'product')
         ordering = ['-date_added']
+        indexes = [
+            models.Index(fields=['cart', '-date_added'], name='cartitem_cart_added_idx'),
+        ]
 
     def __str__(self):
         return f"{self.quantity} x {self.product.name} in cart for {self.cart.user.username}"
 
+    def save(self, *args, **kwargs):
+        """Saves the item and marks its cart as recently active."""
+        super().save(*args, **kwargs)
+        Cart.objects.using(self._state.db).filter(pk=self.cart_id).update(updated_at=timezone.now())
+
     def get_total_price(self):
         """Calculates the subtotal for this cart item."""
         return self.quantity * self.product.price
@@ -146,7 +207,7 @@ class CartItem(models.Model):
 class Order(models.Model):
     """Represents a completed customer order."""
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True,
-                             related_name='orders')
+                             related_name='orders', db_constraint=False)
     address = models.CharField(max_length=255, blank=True, null=True)
     city = models.CharField(max_length=100, blank=True, null=True)
     postal_code = models.CharField(max_length=20, blank=True, null=True)
@@ -158,6 +219,13 @@ class Order(models.Model):
 
     class Meta:
         ordering = ['-date_ordered']
+        indexes = [
+            # Supports the incremental (date_ordered, id) high-water-mark scan in store.analytics.
+            models.Index(fields=['date_ordered', 'id'], name='order_date_id_idx'),
+            # A user's order history, and the admin's completed/pending filter.
+            models.Index(fields=['user', '-date_ordered'], name='order_user_date_idx'),
+            models.Index(fields=['is_completed', '-date_ordered'], name='order_completed_date_idx'),
+        ]
 
     def __str__(self):
         return f"Order #{self.id} by {self.user.username if self.user else 'Guest'}"
@@ -175,7 +243,7 @@ class Order(models.Model):
 class OrderItem(models.Model):
     """Represents a single item within a completed order."""
     order = models.ForeignKey(Order, related_name='items', on_delete=models.CASCADE)
-    product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, blank=True)
+    product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, blank=True, db_constraint=False)
     quantity = models.PositiveIntegerField(default=1)
     price_at_purchase = models.DecimalField(max_digits=10, decimal_places=2)
     date_added = models.DateTimeField(auto_now_add=True)
@@ -187,3 +255,194 @@ class OrderItem(models.Model):
     def get_cost(self):
         """Calculates the total cost for this line item."""
         return self.quantity * self.price_at_purchase
+
+
+class PendingStockDecrement(models.Model):
+    """
+    Stock sold by a flash-sale checkout but not yet subtracted from Product.stock. Inserted in the
+    checkout transaction and folded into `stock` in batches by `manage.py flush_flash_stock`.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='pending_decrements')
+    quantity = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"-{self.quantity} for product #{self.product_id}"
+
+
+# =============================================================================
+# --- Order Archive Models ---
+# =============================================================================
+
+class ArchivedOrder(models.Model):
+    """A completed order moved out of the hot Order table by `manage.py archive_orders` (same id)."""
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True,
+                             related_name='archived_orders')
+    address = models.CharField(max_length=255, blank=True, null=True)
+    city = models.CharField(max_length=100, blank=True, null=True)
+    postal_code = models.CharField(max_length=20, blank=True, null=True)
+    country = models.CharField(max_length=100, blank=True, null=True)
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
+    # Copied from the original order, so neither date is auto-populated here.
+    date_ordered = models.DateTimeField()
+    is_completed = models.BooleanField(default=True)
+    transaction_id = models.CharField(max_length=100, blank=True, null=True)
+    date_archived = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-date_ordered']
+        indexes = [
+            models.Index(fields=['user', '-date_ordered'], name='archivedorder_user_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"Archived order #{self.id} by {self.user.username if self.user else 'Guest'}"
+
+
+class ArchivedOrderItem(models.Model):
+    """A line item of an ArchivedOrder (same id as the original OrderItem)."""
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(ArchivedOrder, related_name='items', on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, blank=True,
+                                related_name='archived_order_items')
+    quantity = models.PositiveIntegerField(default=1)
+    price_at_purchase = models.DecimalField(max_digits=10, decimal_places=2)
+    date_added = models.DateTimeField()
+
+    def __str__(self):
+        product_name = self.product.name if self.product else "[Deleted Product]"
+        return f"{self.quantity} x {product_name} in archived order #{self.order_id}"
+
+    def get_cost(self):
+        """Calculates the total cost for this line item."""
+        return self.quantity * self.price_at_purchase
+
+
+# =============================================================================
+# --- Sales Rollup Models ---
+# =============================================================================
+
+class DailySales(models.Model):
+    """Pre-aggregated store-wide sales per day. Maintained by `manage.py refresh_sales_rollups`."""
+    day = models.DateField(unique=True)
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    order_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = "Daily sales"
+        ordering = ['-day']
+
+    def __str__(self):
+        return f"Sales on {self.day}: {self.revenue}"
+
+
+class DailyProductSales(models.Model):
+    """Pre-aggregated daily sales per product. Maintained by `manage.py refresh_sales_rollups`."""
+    day = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, blank=True,
+                                related_name='daily_sales')
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    order_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = "Daily product sales"
+        ordering = ['-day']
+        unique_together = ('day', 'product')
+
+    def __str__(self):
+        product_name = self.product.name if self.product else "[Deleted Product]"
+        return f"{product_name} on {self.day}: {self.units} units"
+
+
+class DailyCategorySales(models.Model):
+    """Pre-aggregated daily sales per category. Maintained by `manage.py refresh_sales_rollups`."""
+    day = models.DateField()
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True,
+                                 related_name='daily_sales')
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'))
+    order_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = "Daily category sales"
+        ordering = ['-day']
+        unique_together = ('day', 'category')
+
+    def __str__(self):
+        category_name = self.category.name if self.category else "[Deleted Category]"
+        return f"{category_name} on {self.day}: {self.units} units"
+
+
+class SalesRollupState(models.Model):
+    """
+    One row per order id block (store.sharding.SHARD_ID_BLOCK) holding the rollup high-water
+    mark: the (date_ordered, id) of the last order from that block folded into the daily rollup
+    tables. Orders keep their ids when their user moves shards, so each is counted once.
+    """
+    id_block = models.PositiveIntegerField(unique=True, default=0)
+    last_date_ordered = models.DateTimeField(null=True, blank=True)
+    last_order_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Sales rollups up to order #{self.last_order_id}"
+
+    @classmethod
+    def load(cls, id_block=0):
+        state, _ = cls.objects.get_or_create(id_block=id_block)
+        return state
+
+
+# =============================================================================
+# --- Recommendation Models ---
+# =============================================================================
+
+class RelatedProduct(models.Model):
+    """
+    One of a product's top "frequently bought together" products, ranked by the number of
+    orders containing both. Rebuilt by `manage.py refresh_recommendations`.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='related_products')
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='bought_with')
+    rank = models.PositiveSmallIntegerField()
+    order_count = models.PositiveIntegerField()
+
+    class Meta:
+        ordering = ['product', 'rank']
+        constraints = [
+            # Also the index behind the "related products of X, by rank" lookup.
+            models.UniqueConstraint(fields=['product', 'rank'], name='relatedproduct_product_rank_uniq'),
+        ]
+
+    def __str__(self):
+        return f"#{self.rank} with product {self.product_id}: product {self.related_id}"
+
+
+# =============================================================================
+# --- Payment Webhook Models ---
+# =============================================================================
+
+class StripeEvent(models.Model):
+    """
+    Inbox of verified Stripe webhook events, stored raw as received. The unique `event_id`
+    drops Stripe's retries and duplicates; `manage.py process_stripe_events` applies them.
+    """
+    event_id = models.CharField(max_length=255, unique=True)
+    type = models.CharField(max_length=100)
+    payload = models.TextField()
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            # The processor's "oldest unprocessed events" scan.
+            models.Index(fields=['id'], condition=models.Q(processed_at__isnull=True),
+                         name='stripeevent_pending_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.type} ({self.event_id})"
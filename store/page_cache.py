@@ -0,0 +1,129 @@
+# store/page_cache.py
+
+# --- Django & Python Imports ---
+import hashlib
+import re
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.contrib.messages.storage.session import SessionStorage
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.utils.cache import patch_vary_headers
+
+# --- Local Application Imports ---
+from .carts import GUEST_CART_COOKIE
+from .metrics import CACHE_REQUESTS
+
+PAGE_CACHE_KEY = 'page:{name}:{digest}'
+PAGE_VERSION_KEY = 'page-version:{scope}'
+PAGE_LOCK_KEY = 'page-lock:{name}:{digest}'
+PRODUCT_LIST_SCOPE = 'product-list'
+PRODUCT_DETAIL_SCOPE = 'product:{pk}'
+
+# Cached pages never contain a real CSRF token; each visitor's own token is substituted on the way out.
+CSRF_INPUT_RE = re.compile(rb'(<input type="hidden" name="csrfmiddlewaretoken" value=")[^"]*(">)')
+CSRF_PLACEHOLDER = b'__page_cache_csrf_token__'
+
+
+# =============================================================================
+# --- Anonymous Full-Page Cache ---
+# =============================================================================
+
+def anonymous_page_cache(name, scope):
+    """
+    Caches a view's full response for anonymous visitors.
+
+    `scope(request, **view_kwargs)` names the invalidation scope the page belongs to (see
+    invalidate_pages). Requests from authenticated users, or from visitors with pending
+    flash messages, always reach the view. With PAGE_CACHE_STALE_SECONDS set, a page that
+    has expired or been invalidated is still served for that long while a single request
+    (holding a short cache lock) re-renders it, so traffic spikes never stampede the database.
+    Stock changes written with bulk updates (checkout) send no signals and show up once the
+    page expires after PAGE_CACHE_TIMEOUT.
+    """
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or not _is_cacheable_visitor(request):
+                return view_func(request, *args, **kwargs)
+
+            digest = hashlib.md5(request.get_full_path().encode()).hexdigest()
+            key = PAGE_CACHE_KEY.format(name=name, digest=digest)
+            version_key = PAGE_VERSION_KEY.format(scope=scope(request, *args, **kwargs))
+            found = cache.get_many([key, version_key])
+            entry, version = found.get(key), found.get(version_key, 0)
+
+            if entry is not None:
+                fresh = entry['version'] == version and entry['expires'] > time.time()
+                if fresh:
+                    return _build_response(request, entry, 'hit')
+                lock_key = PAGE_LOCK_KEY.format(name=name, digest=digest)
+                if settings.PAGE_CACHE_STALE_SECONDS and not cache.add(lock_key, 1, timeout=30):
+                    return _build_response(request, entry, 'stale')
+
+            CACHE_REQUESTS.labels('page', 'miss').inc()
+            response = view_func(request, *args, **kwargs)
+            if response.status_code == 200 and not response.streaming and not response.cookies:
+                cache.set(key, {
+                    'content': CSRF_INPUT_RE.sub(rb'\1' + CSRF_PLACEHOLDER + rb'\2', response.content),
+                    'content_type': response['Content-Type'],
+                    'version': version,
+                    'expires': time.time() + settings.PAGE_CACHE_TIMEOUT,
+                }, settings.PAGE_CACHE_TIMEOUT + settings.PAGE_CACHE_STALE_SECONDS)
+                if entry is not None:
+                    cache.delete(PAGE_LOCK_KEY.format(name=name, digest=digest))
+            response['X-Page-Cache'] = 'miss'
+            patch_vary_headers(response, ['Cookie'])
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def _is_cacheable_visitor(request):
+    """Anonymous, with no guest cart and no flash messages waiting in the cookie or session storage."""
+    if request.user.is_authenticated or request.COOKIES.get(CookieStorage.cookie_name) \
+            or GUEST_CART_COOKIE in request.COOKIES:
+        return False
+    has_session = settings.SESSION_COOKIE_NAME in request.COOKIES
+    return not (has_session and SessionStorage.session_key in request.session)
+
+
+def _build_response(request, entry, status):
+    CACHE_REQUESTS.labels('page', status).inc()
+    content = entry['content']
+    if CSRF_PLACEHOLDER in content:
+        content = content.replace(CSRF_PLACEHOLDER, get_token(request).encode())
+    response = HttpResponse(content, content_type=entry['content_type'])
+    response['X-Page-Cache'] = status
+    patch_vary_headers(response, ['Cookie'])
+    return response
+
+
+# =============================================================================
+# --- Scopes & Invalidation ---
+# =============================================================================
+
+def product_list_scope(request, *args, **kwargs):
+    return PRODUCT_LIST_SCOPE
+
+
+def product_detail_scope(request, pk, *args, **kwargs):
+    return PRODUCT_DETAIL_SCOPE.format(pk=pk)
+
+
+def invalidate_pages(scopes):
+    """Marks every cached page in `scopes` as outdated with a single cache write."""
+    version = time.time_ns()
+    cache.set_many({PAGE_VERSION_KEY.format(scope=scope): version for scope in scopes}, timeout=None)
+
+
+def invalidate_product_pages(product_ids):
+    """Outdates the product list pages and the detail pages of the given products."""
+    invalidate_pages([PRODUCT_LIST_SCOPE, *(PRODUCT_DETAIL_SCOPE.format(pk=pk) for pk in product_ids)])
@@ -0,0 +1,25 @@
+# store/parsers.py
+
+# --- Django & Python Imports ---
+import io
+
+from django.conf import settings
+
+# --- Third-Party Imports ---
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+# --- Local Application Imports ---
+from .bulk import read_csv_rows
+
+
+class CSVParser(BaseParser):
+    """Parses a `text/csv` request body (with a header row) into a list of row dicts."""
+    media_type = 'text/csv'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get('encoding', settings.DEFAULT_CHARSET)
+        try:
+            return read_csv_rows(io.StringIO(stream.read().decode(encoding)))
+        except UnicodeDecodeError as exc:
+            raise ParseError(f"CSV parse error - {exc}")
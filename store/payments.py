@@ -0,0 +1,153 @@
+# store/payments.py
+
+# --- Django & Python Imports ---
+import hashlib
+import hmac
+import json
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+# --- Local Application Imports ---
+from .analytics import fold_in_late_completions
+from .models import Order, StripeEvent, User
+from .sharding import MOVING, shard_aliases
+
+PAYMENT_SUCCEEDED = 'payment_intent.succeeded'
+
+
+def get_stripe():
+    """
+    The Stripe SDK, configured with STRIPE_SECRET_KEY. Imported on first use rather than at module
+    load: it takes longer to import than Django and the rest of the app together, and most worker
+    processes never call it.
+    """
+    import stripe
+    stripe.api_key = settings.STRIPE_SECRET_KEY
+    return stripe
+
+
+# =============================================================================
+# --- Receiving Webhooks ---
+# =============================================================================
+
+def verify_stripe_event(payload, signature_header):
+    """
+    Checks the `Stripe-Signature` header of a raw webhook body against STRIPE_WEBHOOK_SECRET and
+    returns the parsed event. Raises stripe.SignatureVerificationError, or ValueError for a body
+    that is not a Stripe event.
+    """
+    get_stripe().WebhookSignature.verify_header(payload, signature_header, settings.STRIPE_WEBHOOK_SECRET,
+                                                tolerance=settings.STRIPE_WEBHOOK_TOLERANCE)
+    event = json.loads(payload)
+    if not isinstance(event, dict) or not event.get('id') or not event.get('type'):
+        raise ValueError("Not a Stripe event.")
+    return event
+
+
+def store_stripe_event(event, payload):
+    """Adds a verified event to the inbox with one INSERT; an event id already there is silently dropped."""
+    StripeEvent.objects.bulk_create([StripeEvent(event_id=event['id'], type=event['type'], payload=payload)],
+                                    ignore_conflicts=True)
+
+
+def sign_stripe_payload(payload, secret, timestamp=None):
+    """Builds the `Stripe-Signature` header Stripe would send with `payload` (for tests and the event replayer)."""
+    timestamp = int(time.time() if timestamp is None else timestamp)
+    signature = hmac.new(secret.encode(), f'{timestamp}.{payload}'.encode(), hashlib.sha256).hexdigest()
+    return f't={timestamp},v1={signature}'
+
+
+# =============================================================================
+# --- Processing the Inbox ---
+# =============================================================================
+
+def process_stripe_events(batch_size=None, max_batches=None):
+    """
+    Applies unprocessed inbox events, oldest first, one batch per transaction.
+
+    Events held by another processor are skipped (SKIP LOCKED where supported), so several
+    can run side by side. `payment_intent.succeeded` events complete their order (found via
+    the intent's `order_id` metadata) when the amount received matches the order total; other
+    event types are only marked processed. Problems are recorded on the event's `error`.
+    Events for orders whose user is being moved to another shard are left for the next run.
+    Returns counts of events, completed orders, errors and batches.
+    """
+    batch_size = batch_size or settings.STRIPE_EVENT_BATCH_SIZE
+    report = {'events': 0, 'orders_completed': 0, 'errors': 0, 'batches': 0}
+    last_id = 0
+
+    while max_batches is None or report['batches'] < max_batches:
+        with transaction.atomic():
+            events = list(StripeEvent.objects.select_for_update(skip_locked=True)
+                          .filter(processed_at__isnull=True, id__gt=last_id).order_by('id')[:batch_size])
+            if not events:
+                break
+            last_id = events[-1].id
+            completed, deferred = _apply_events(events)
+            report['orders_completed'] += completed
+            now = timezone.now()
+            for event in events:
+                if event not in deferred:
+                    event.processed_at = now
+            StripeEvent.objects.bulk_update(events, ['processed_at', 'error'])
+        report['events'] += len(events)
+        report['errors'] += sum(1 for event in events if event.error)
+        report['batches'] += 1
+    return report
+
+
+def _apply_events(events):
+    """
+    Completes the orders paid by `events` with one read and one bulk update per user shard, and
+    rolls up those the sales rollups passed while they were unpaid. Returns how many, and the events deferred because their order's user is being moved.
+    """
+    payments = {}
+    for event in events:
+        if event.type != PAYMENT_SUCCEEDED:
+            continue
+        try:
+            intent = json.loads(event.payload)['data']['object']
+            payments[int(intent['metadata']['order_id'])] = (event, intent)
+        except (ValueError, KeyError, TypeError):
+            event.error = "Payment intent has no order_id metadata."
+
+    orders, remaining = {}, list(payments)
+    for shard in shard_aliases():
+        if not remaining:
+            break
+        orders.update(Order.objects.using(shard).order_by()
+                      .only('pk', 'user_id', 'total_amount', 'is_completed', 'transaction_id', 'date_ordered')
+                      .in_bulk(remaining))
+        remaining = [order_id for order_id in remaining if order_id not in orders]
+    moving = set()
+    if orders and len(shard_aliases()) > 1:
+        # Their rows may be copied before this update lands and deleted after: retry once they have moved.
+        moving = set(User.objects.filter(pk__in={order.user_id for order in orders.values()},
+                                         shard__contains=MOVING).values_list('pk', flat=True))
+    paid, newly_completed, deferred = [], [], []
+    for order_id, (event, intent) in payments.items():
+        order = orders.get(order_id)
+        if order is None:
+            event.error = f"Order {order_id} not found."
+            continue
+        if order.user_id in moving:
+            deferred.append(event)
+            continue
+        expected = int(order.total_amount * 100)
+        if intent.get('amount_received') != expected:
+            event.error = f"Amount received ({intent.get('amount_received')}) does not match the order total ({expected})."
+            continue
+        if not order.is_completed or order.transaction_id != intent['id']:
+            if not order.is_completed:
+                newly_completed.append(order)
+            order.is_completed, order.transaction_id = True, intent['id']
+            paid.append(order)
+    for shard in shard_aliases():
+        Order.objects.using(shard).bulk_update([order for order in paid if order._state.db == shard],
+                                               ['is_completed', 'transaction_id'])
+        # Under the caller's catalog transaction, which keeps the rollup marks locked until it commits.
+        fold_in_late_completions([order for order in newly_completed if order._state.db == shard], using=shard)
+    return len(paid), deferred
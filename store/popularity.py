@@ -0,0 +1,92 @@
+# store/popularity.py
+
+# --- Django & Python Imports ---
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+# --- Local Application Imports ---
+from .metrics import CACHE_REQUESTS
+from .models import OrderItem, Product, PRODUCT_ORDERINGS
+from .sharding import shard_aliases
+
+SCORE_FIELDS = {
+    'popular': 'popularity_score',
+    'trending': 'trending_score',
+}
+TOP_PRODUCTS_CACHE_KEY = 'store:top-products:{kind}'
+
+
+# =============================================================================
+# --- Score Refresh ---
+# =============================================================================
+
+def refresh_product_popularity(now=None, batch_size=1000):
+    """
+    Recomputes `popularity_score` and `trending_score` for every product.
+
+    One grouped query per user shard sums units sold per (product, day) over the window; each daily
+    bucket is then weighted by 0.5 ** (age_in_days / half_life) in Python. Products that
+    sold nothing in the window are reset to zero. Returns the number of products scored.
+    """
+    now = now or timezone.now()
+    today = timezone.localdate(now)
+    since = now - timedelta(days=settings.POPULARITY_WINDOW_DAYS)
+
+    scores = defaultdict(lambda: [0.0, 0.0])
+    for shard in shard_aliases():
+        daily_units = (OrderItem.objects.using(shard)
+                       .filter(order__date_ordered__gte=since, product__isnull=False)
+                       .annotate(day=TruncDate('order__date_ordered'))
+                       .values_list('product_id', 'day')
+                       .annotate(units=Sum('quantity'))
+                       .order_by())
+        for product_id, day, units in daily_units.iterator():
+            age = (today - day).days
+            scores[product_id][0] += units * 0.5 ** (age / settings.POPULARITY_HALF_LIFE_DAYS)
+            scores[product_id][1] += units * 0.5 ** (age / settings.TRENDING_HALF_LIFE_DAYS)
+
+    products = [Product(pk=pk, popularity_score=popular, trending_score=trending)
+                for pk, (popular, trending) in scores.items()]
+    with transaction.atomic():
+        Product.objects.filter(Q(popularity_score__gt=0) | Q(trending_score__gt=0)).update(
+            popularity_score=0, trending_score=0)
+        Product.objects.bulk_update(products, ['popularity_score', 'trending_score'], batch_size=batch_size)
+        transaction.on_commit(clear_top_products_cache)
+
+    return len(products)
+
+
+# =============================================================================
+# --- Cached Top-N Lists ---
+# =============================================================================
+
+def get_top_products(kind='popular', limit=None):
+    """
+    Returns up to `limit` (at most TOP_PRODUCTS_LIMIT) available products for `kind`
+    ('popular' or 'trending'). The ranked id list is cached until the next score refresh;
+    products are then fetched by primary key so stock and price are always current.
+    """
+    key = TOP_PRODUCTS_CACHE_KEY.format(kind=kind)
+    product_ids = cache.get(key)
+    CACHE_REQUESTS.labels('top_products', 'miss' if product_ids is None else 'hit').inc()
+    if product_ids is None:
+        product_ids = list(Product.objects.filter(is_available=True, **{f'{SCORE_FIELDS[kind]}__gt': 0})
+                           .order_by(*PRODUCT_ORDERINGS[kind])
+                           .values_list('pk', flat=True)[:settings.TOP_PRODUCTS_LIMIT])
+        cache.set(key, product_ids, settings.TOP_PRODUCTS_CACHE_TIMEOUT)
+    product_ids = product_ids[:limit or settings.TOP_PRODUCTS_LIMIT]
+
+    products = Product.objects.select_related('category').filter(is_available=True).order_by().in_bulk(product_ids)
+    return [products[pk] for pk in product_ids if pk in products]
+
+
+def clear_top_products_cache():
+    """Drops every cached top-N list (called after the scores are refreshed)."""
+    cache.delete_many([TOP_PRODUCTS_CACHE_KEY.format(kind=kind) for kind in SCORE_FIELDS])
@@ -0,0 +1,130 @@
+# store/querylog.py
+
+# --- Django & Python Imports ---
+import logging
+import re
+import sys
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+from django.template.base import Node
+
+# --- Third-Party Imports ---
+from rest_framework.fields import Field
+
+logger = logging.getLogger('store.queries')
+
+STORE_DIR = str(Path(__file__).resolve().parent)
+# Plumbing every request passes through: the query is attributed to the code beneath it.
+SKIPPED_FILES = {str(Path(STORE_DIR) / name) for name in ('querylog.py', 'middleware.py', 'renderers.py')}
+MAX_LOGGED_SQL = 2000
+
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_LIST_RE = re.compile(r'\(\?(?:\s*,\s*\?)*\)')
+
+
+class RepeatedQueryError(Exception):
+    """Raised when QUERY_REPEAT_ACTION is 'raise' and a query shape reaches QUERY_REPEAT_THRESHOLD in one request."""
+
+
+def fingerprint(sql):
+    """The shape of a query: literals and placeholders become ?, value lists collapse to (...)."""
+    sql = _LITERAL_RE.sub('?', sql.replace('%s', '?'))
+    return _LIST_RE.sub('(...)', ' '.join(sql.split()))
+
+
+def query_origin():
+    """
+    Describes where the running query was issued from: the innermost frame in store/ (outside
+    SKIPPED_FILES), plus the serializer field and template line being rendered when there is one, e.g.
+    "store/views.py:412 in cart_detail; template store/cart_detail.html:37".
+    """
+    location = field = template = None
+    frame = sys._getframe(1)
+    while frame is not None and location is None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(STORE_DIR) and filename not in SKIPPED_FILES:
+            location = (f"store/{Path(filename).relative_to(STORE_DIR).as_posix()}:{frame.f_lineno} "
+                        f"in {frame.f_code.co_name}")
+        else:
+            owner = frame.f_locals.get('self')
+            if field is None and isinstance(owner, Field) and owner.parent is not None:
+                field = f"{type(owner.parent).__name__}.{owner.field_name}"
+            elif template is None and isinstance(owner, Node) and getattr(owner, 'origin', None) is not None:
+                template = f"{owner.origin.template_name}:{owner.token.lineno}"
+        frame = frame.f_back
+    parts = [location or 'outside store/']
+    if field:
+        parts.append(f"serializer field {field}")
+    if template:
+        parts.append(f"template {template}")
+    return '; '.join(parts)
+
+
+# =============================================================================
+# --- Query Inspection ---
+# =============================================================================
+
+class QueryInspector:
+    """
+    connection.execute_wrapper() hook for one unit of work (a request). Counts the queries of
+    each shape, reporting shapes run QUERY_REPEAT_THRESHOLD times or more (N+1 patterns), and
+    logs queries slower than SLOW_QUERY_MS; both reports name the code that issued the query.
+    """
+
+    def __init__(self, label, repeat_threshold=None, slow_query_ms=None):
+        self.label = label
+        self.repeat_threshold = settings.QUERY_REPEAT_THRESHOLD if repeat_threshold is None else repeat_threshold
+        self.slow_query_ms = settings.SLOW_QUERY_MS if slow_query_ms is None else slow_query_ms
+        self.counts = Counter()
+        self.origins = {}
+
+    @property
+    def enabled(self):
+        return bool(self.repeat_threshold or self.slow_query_ms)
+
+    def __call__(self, execute, sql, params, many, context):
+        if self.repeat_threshold:
+            shape = fingerprint(sql)
+            self.counts[shape] += 1
+            if self.counts[shape] == self.repeat_threshold:
+                self.origins[shape] = query_origin()
+                if settings.QUERY_REPEAT_ACTION == 'raise':
+                    raise RepeatedQueryError(f"Query repeated {self.repeat_threshold} times in {self.label} "
+                                             f"from {self.origins[shape]}: {shape[:MAX_LOGGED_SQL]}")
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            if self.slow_query_ms and elapsed_ms >= self.slow_query_ms:
+                logger.warning("Slow query (%.0fms) in %s from %s: %s", elapsed_ms, self.label, query_origin(),
+                               sql[:MAX_LOGGED_SQL])
+
+    def repeated(self):
+        """(count, origin, shape) for every shape that reached the threshold, most repeated first."""
+        return sorted(((count, self.origins[shape], shape) for shape, count in self.counts.items()
+                       if shape in self.origins), reverse=True)
+
+    def report(self):
+        for count, origin, shape in self.repeated():
+            logger.warning("Repeated query (%dx) in %s from %s: %s", count, self.label, origin,
+                           shape[:MAX_LOGGED_SQL])
+
+
+@contextmanager
+def inspect_queries(label, **options):
+    """Runs the block with a QueryInspector on every database connection, then logs repeated queries."""
+    inspector = QueryInspector(label, **options)
+    if not inspector.enabled:
+        yield inspector
+        return
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(inspector))
+        yield inspector
+    inspector.report()
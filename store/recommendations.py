@@ -0,0 +1,141 @@
+# store/recommendations.py
+
+# --- Django & Python Imports ---
+import heapq
+import multiprocessing
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations, groupby
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Max, Min
+
+# --- Local Application Imports ---
+from .models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem, Product, RelatedProduct
+from .sharding import CATALOG_DB, SHARD_ID_BLOCK, in_id_block, shard_aliases
+
+# Product pairs are counted under one int key, (smaller_id << PAIR_SHIFT) | larger_id.
+PAIR_SHIFT = 32
+PAIR_MASK = (1 << PAIR_SHIFT) - 1
+
+
+# =============================================================================
+# --- Co-Purchase Counting ---
+# =============================================================================
+
+def count_co_purchases(order_ids, chunk_size=None, max_order_items=None, using=CATALOG_DB):
+    """
+    Counts, over the orders on database `using` (hot ones, plus archived ones on the catalog
+    database) with ids in the `order_ids` range, how many orders contain each pair of products.
+    Items are streamed `chunk_size` order ids at a time; orders with more than `max_order_items`
+    distinct products (bulk purchases) are skipped.
+    Returns a Counter keyed by packed product pairs (see PAIR_SHIFT).
+    """
+    chunk_size = chunk_size or settings.RECOMMENDATIONS_CHUNK_SIZE
+    max_order_items = max_order_items or settings.RECOMMENDATIONS_MAX_ORDER_ITEMS
+    pairs = Counter()
+    for item_model in (OrderItem, ArchivedOrderItem) if using == CATALOG_DB else (OrderItem,):
+        for start in range(order_ids.start, order_ids.stop, chunk_size):
+            rows = (item_model.objects.using(using)
+                    .filter(order_id__gte=start, order_id__lt=min(start + chunk_size, order_ids.stop),
+                            product__isnull=False)
+                    .values_list('order_id', 'product_id').order_by('order_id'))
+            for _, items in groupby(rows.iterator(), key=lambda row: row[0]):
+                products = sorted({product_id for _, product_id in items})
+                if len(products) <= max_order_items:
+                    pairs.update((first << PAIR_SHIFT) | second for first, second in combinations(products, 2))
+    return pairs
+
+
+def _count_range(args):
+    try:
+        return count_co_purchases(*args)
+    finally:
+        connections.close_all()
+
+
+def _id_segments(using):
+    """
+    The (low, high) bounds of the order ids on `using`, one per SHARD_ID_BLOCK they fall in:
+    orders keep their ids when their user is moved, so a shard's ids can sit in far-apart blocks.
+    """
+    models = (Order, ArchivedOrder) if using == CATALOG_DB else (Order,)
+    tops = [model.objects.using(using).aggregate(high=Max('id'))['high'] for model in models]
+    top = max((high for high in tops if high is not None), default=None)
+    segments = []
+    for block in range(0 if top is None else top // SHARD_ID_BLOCK + 1):
+        bounds = [model.objects.using(using).filter(in_id_block(block)).aggregate(low=Min('id'), high=Max('id'))
+                  for model in models]
+        lows = [bound['low'] for bound in bounds if bound['low'] is not None]
+        if lows:
+            segments.append((min(lows), max(bound['high'] for bound in bounds if bound['high'] is not None)))
+    return segments
+
+
+def top_related(pairs, top_k):
+    """Returns {product_id: [(related_id, order_count), ...]}, best first, at most `top_k` each."""
+    heaps = defaultdict(list)
+    for key, count in pairs.items():
+        first, second = key >> PAIR_SHIFT, key & PAIR_MASK
+        for product_id, related_id in ((first, second), (second, first)):
+            heap, entry = heaps[product_id], (count, -related_id)  # ties go to the lower product id
+            if len(heap) < top_k:
+                heapq.heappush(heap, entry)
+            elif entry > heap[0]:
+                heapq.heapreplace(heap, entry)
+    return {product_id: [(-negated_id, count) for count, negated_id in sorted(heap, reverse=True)]
+            for product_id, heap in heaps.items()}
+
+
+# =============================================================================
+# --- Batch Job ---
+# =============================================================================
+
+def refresh_recommendations(top_k=None, chunk_size=None, max_order_items=None, workers=1):
+    """
+    Recomputes the RelatedProduct table from the full order history (hot and archived).
+
+    Each user shard's order ids are split into ranges counted independently, across a pool of
+    `workers` forked processes when more than one is asked for; the partial counts are merged and the
+    `top_k` (RECOMMENDATIONS_TOP_K) products per product are written in one transaction.
+    Cached product pages pick the new recommendations up as they expire.
+    Returns the number of products that have recommendations.
+    """
+    top_k = top_k or settings.RECOMMENDATIONS_TOP_K
+    chunk_size = chunk_size or settings.RECOMMENDATIONS_CHUNK_SIZE
+    segments = [(shard, low, high) for shard in shard_aliases() for low, high in _id_segments(shard)]
+    pairs = Counter()
+    if segments:
+        span = sum(high - low + 1 for _, low, high in segments)
+        step = max(chunk_size, -(-span // (workers * 4)))
+        tasks = [(range(start, min(start + step, high + 1)), chunk_size, max_order_items, shard)
+                 for shard, low, high in segments for start in range(low, high + 1, step)]
+        if workers > 1:
+            connections.close_all()  # forked children must open their own connections
+            with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork')) as pool:
+                for partial in pool.map(_count_range, tasks):
+                    pairs.update(partial)
+        else:
+            for task in tasks:
+                pairs.update(count_co_purchases(*task))
+
+    related = top_related(pairs, top_k)
+    existing = set(Product.objects.values_list('pk', flat=True).iterator()) if related else set()
+    rows = [RelatedProduct(product_id=product_id, related_id=related_id, rank=rank, order_count=count)
+            for product_id, ranked in related.items() if product_id in existing
+            for rank, (related_id, count) in enumerate(ranked, start=1) if related_id in existing]
+    with transaction.atomic():
+        RelatedProduct.objects.all().delete()
+        RelatedProduct.objects.bulk_create(rows, batch_size=1000)
+    return len({row.product_id for row in rows})
+
+
+# =============================================================================
+# --- Reading ---
+# =============================================================================
+
+def get_related_products(product_id, limit=None):
+    """The available products most often bought with `product_id`, best first, in one indexed query."""
+    return (Product.objects.filter(bought_with__product_id=product_id, is_available=True)
+            .select_related('category').order_by('bought_with__rank')[:limit or settings.RELATED_PRODUCTS_LIMIT])
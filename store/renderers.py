@@ -0,0 +1,100 @@
+# store/renderers.py
+
+# --- Django & Python Imports ---
+from decimal import Decimal
+from itertools import chain, islice
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+
+# --- Third-Party Imports ---
+import orjson
+from rest_framework import status
+from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils import encoders
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+_drf_encoder = encoders.JSONEncoder()
+
+
+def _default(obj):
+    """
+    Fallback for types orjson does not encode itself. Decimals follow COERCE_DECIMAL_TO_STRING
+    (as DecimalFields do); datetimes and everything else go through DRF's encoder, so the
+    output matches JSONRenderer's.
+    """
+    if isinstance(obj, Decimal):
+        return str(obj) if api_settings.COERCE_DECIMAL_TO_STRING else float(obj)
+    return _drf_encoder.default(obj)
+
+
+def dumps(data):
+    """Encodes `data` to compact UTF-8 JSON bytes, escaping U+2028/U+2029 like JSONRenderer."""
+    content = orjson.dumps(data, default=_default, option=ORJSON_OPTIONS)
+    if b'\xe2\x80\xa8' in content or b'\xe2\x80\xa9' in content:
+        content = content.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+    return content
+
+
+# =============================================================================
+# --- Renderers ---
+# =============================================================================
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer backed by orjson. Indented output (`; indent=N`) falls back to the stdlib encoder."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        return dumps(data)
+
+
+class StreamingJSONRenderer(FastJSONRenderer):
+    """FastJSONRenderer that can also write a JSON array incrementally (see StreamingListMixin)."""
+
+    def render_stream(self, rows, chunk_size):
+        """Yields `[`, the rows encoded `chunk_size` at a time, and `]`."""
+        yield b'['
+        separator = b''
+        while batch := tuple(islice(rows, chunk_size)):
+            yield separator + dumps(batch)[1:-1]
+            separator = b','
+        yield b']'
+
+
+# =============================================================================
+# --- Streamed List Responses ---
+# =============================================================================
+
+class StreamingListMixin:
+    """
+    list() for generic views whose results can be large. Unpaginated JSON lists longer than
+    API_STREAM_CHUNK_SIZE rows are streamed from a queryset iterator, so only one chunk of
+    instances and rows is held in memory at a time; shorter lists, paginated requests and the
+    browsable API get a normal Response.
+
+    The queryset (or queryset-like object) must support `iterator(chunk_size=...)`.
+    """
+    renderer_classes = [StreamingJSONRenderer, BrowsableAPIRenderer]
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        if not isinstance(request.accepted_renderer, StreamingJSONRenderer):
+            return Response(self.get_serializer(queryset, many=True).data)
+
+        chunk_size = settings.API_STREAM_CHUNK_SIZE
+        serializer = self.get_serializer()
+        rows = (serializer.to_representation(instance) for instance in queryset.iterator(chunk_size=chunk_size))
+        first = list(islice(rows, chunk_size + 1))
+        if len(first) <= chunk_size:
+            return Response(first)
+        # Rows are serialized as the response is sent; an error past this point truncates the body.
+        return StreamingHttpResponse(request.accepted_renderer.render_stream(chain(first, rows), chunk_size),
+                                     status=status.HTTP_200_OK, content_type=request.accepted_renderer.media_type)
@@ -0,0 +1,50 @@
+# store/routers.py
+
+# --- Local Application Imports ---
+from .models import Cart, CartItem, Order, OrderItem, User
+from .sharding import CATALOG_DB, SHARDED_MODELS, SHARDED_MODEL_NAMES, shard_aliases, user_db, user_id_db
+
+
+class UserShardRouter:
+    """
+    Sends carts and orders (store.sharding.SHARDED_MODELS) to the shard of the user who owns them
+    and everything else to the catalog database. Related lookups and saves are routed from the
+    instance they start at (user.orders, cart.items, order.save()); plain querysets have no
+    instance to go by, so code reading a user's carts or orders picks the shard itself with
+    `.using(user_db(user))`.
+    """
+
+    def db_for_read(self, model, **hints):
+        if model not in SHARDED_MODELS:
+            return CATALOG_DB
+        return _instance_db(hints.get('instance'))
+
+    db_for_write = db_for_read
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Carts and orders point at users and products on the catalog database.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if app_label == 'store' and model_name in SHARDED_MODEL_NAMES:
+            return db in shard_aliases()
+        return db == CATALOG_DB
+
+
+def _instance_db(instance):
+    """
+    The shard of a user, or of a cart, order or item (saved, or unsaved with its owner set);
+    None for anything else, which Django resolves to the instance's own database or 'default'.
+    """
+    if isinstance(instance, User):
+        return user_db(instance)
+    if not isinstance(instance, SHARDED_MODELS):
+        return None
+    if instance._state.db:
+        return instance._state.db
+    if isinstance(instance, (Cart, Order)):
+        if type(instance).user.is_cached(instance):
+            return user_db(instance.user)
+        return user_id_db(instance.user_id)
+    parent = CartItem.cart if isinstance(instance, CartItem) else OrderItem.order
+    return getattr(instance, parent.field.name)._state.db if parent.is_cached(instance) else None
@@ -0,0 +1,263 @@
+# store/seeding.py
+
+# --- Django & Python Imports ---
+import multiprocessing
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connection, connections, transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.text import slugify
+
+# --- Local Application Imports ---
+from .autocomplete import invalidate_autocomplete
+from .facets import invalidate_facets
+from .models import Category, Order, OrderItem, Product, User
+from .page_cache import PRODUCT_LIST_SCOPE, invalidate_pages
+
+DEPARTMENTS = {
+    'Electronics': ['Audio', 'Cameras', 'Computers', 'Phones', 'Wearables', 'Networking'],
+    'Home & Kitchen': ['Cookware', 'Furniture', 'Lighting', 'Bedding', 'Storage'],
+    'Books': ['Fiction', 'Science', 'History', 'Comics', 'Cookbooks'],
+    'Sports & Outdoors': ['Camping', 'Cycling', 'Fitness', 'Climbing', 'Water Sports'],
+    'Toys & Games': ['Board Games', 'Puzzles', 'Building Sets', 'Outdoor Play'],
+    'Fashion': ['Shoes', 'Bags', 'Watches', 'Outerwear', 'Accessories'],
+    'Beauty': ['Skincare', 'Haircare', 'Fragrance', 'Makeup'],
+    'Tools & DIY': ['Power Tools', 'Hand Tools', 'Hardware', 'Garden'],
+}
+ADJECTIVES = ['Compact', 'Rugged', 'Wireless', 'Smart', 'Portable', 'Classic', 'Ultra', 'Pro', 'Eco',
+              'Deluxe', 'Mini', 'Heavy-Duty', 'Vintage', 'Modular', 'Silent', 'Foldable']
+NOUNS = ['Router', 'Camera', 'Lamp', 'Keyboard', 'Speaker', 'Table', 'Drone', 'Charger', 'Monitor',
+         'Backpack', 'Kettle', 'Tent', 'Jacket', 'Puzzle', 'Drill', 'Watch', 'Headphones', 'Blender']
+BRANDS = ['Acme', 'Northwind', 'Globex', 'Initech', 'Umbrella', 'Hooli', 'Vandelay', 'Stark', 'Wayne', 'Tyrell']
+FIRST_NAMES = ['Alex', 'Sam', 'Jordan', 'Taylor', 'Morgan', 'Casey', 'Riley', 'Jamie', 'Avery', 'Quinn',
+               'Maria', 'Wei', 'Aisha', 'Lukas', 'Sofia', 'Mateo', 'Yuki', 'Omar', 'Priya', 'Noah']
+LAST_NAMES = ['Smith', 'Garcia', 'Chen', 'Müller', 'Rossi', 'Kowalski', 'Nguyen', 'Silva', 'Khan',
+              'Johnson', 'Dubois', 'Tanaka', 'Okafor', 'Novak', 'Larsen']
+CITIES = [('Berlin', 'Germany'), ('Lisbon', 'Portugal'), ('Austin', 'USA'), ('Toronto', 'Canada'),
+          ('Osaka', 'Japan'), ('Lagos', 'Nigeria'), ('Krakow', 'Poland'), ('Lyon', 'France'), ('Pune', 'India')]
+# Items per order (1, 2, 3, ...) and units per item, roughly as seen in retail baskets.
+ORDER_SIZE_WEIGHTS = [45, 25, 12, 7, 5, 3, 2, 1]
+QUANTITY_WEIGHTS = [80, 13, 5, 2]
+ZIPF_EXPONENT = 1.1  # product popularity; users are skewed more gently (ZIPF_EXPONENT / 2)
+HISTORY_DAYS = 365
+# Rows drawn from one random generator; chunks are whole blocks, so the data never depends on chunking or workers.
+SEED_BLOCK = 1000
+
+# Set in the parent before a fork-based pool starts, so workers inherit it instead of receiving it per task.
+_context = {}
+
+
+# =============================================================================
+# --- Helpers ---
+# =============================================================================
+
+def _zipf_cum_weights(size, exponent):
+    return list(accumulate(1 / rank ** exponent for rank in range(1, size + 1)))
+
+
+def _rows(kind, start, count):
+    """Yields (pk, rng) for a chunk, with a fresh generator seeded by (seed, kind, block) every SEED_BLOCK rows."""
+    first, rng = _context['first'], None
+    for pk in range(start, start + count):
+        if rng is None or (pk - first) % SEED_BLOCK == 0:
+            rng = random.Random(f"{_context['seed']}:{kind}:{(pk - first) // SEED_BLOCK}")
+        yield pk, rng
+
+
+@contextmanager
+def _explicit_timestamps(*models):
+    """Lets bulk_create keep the auto_now / auto_now_add values we set instead of stamping them with now."""
+    fields = [field for model in models for field in model._meta.concrete_fields
+              if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def _next_id(model):
+    return (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+
+
+# =============================================================================
+# --- Chunk Builders (run in the worker processes) ---
+# =============================================================================
+
+def _seed_users(start, count):
+    now = _context['now']
+    users = []
+    for pk, rng in _rows('users', start, count):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        username = f"{slugify(first)}.{slugify(last)}{pk}"
+        city, country = rng.choice(CITIES)
+        users.append(User(
+            pk=pk, username=username, email=f"{username}@example.com", password=_context['password_hash'],
+            first_name=first, last_name=last, city=city, country=country,
+            address=f"{rng.randint(1, 300)} {rng.choice(LAST_NAMES)} Street",
+            postal_code=f"{rng.randint(10000, 99999)}",
+            date_joined=now - timedelta(days=rng.uniform(0, 2 * HISTORY_DAYS)),
+        ))
+    User.objects.bulk_create(users)
+    return count
+
+
+def _seed_products(start, count):
+    now, categories = _context['now'], _context['category_ids']
+    products = []
+    for pk, rng in _rows('products', start, count):
+        category_id = rng.choices(categories, cum_weights=_context['category_weights'])[0]
+        name = f"{rng.choice(BRANDS)} {rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {rng.choice('ABCDEFGHKLMPRSTX')}{rng.randint(1, 999)}"
+        added = now - timedelta(days=rng.uniform(0, HISTORY_DAYS))
+        # Prices are log-normal (many cheap items, a long tail of expensive ones), ending in .99.
+        price = Decimal(max(int(rng.lognormvariate(3.4, 1.0)), 1)) - Decimal('0.01')
+        products.append(Product(
+            pk=pk, category_id=category_id, name=name, slug=f"{slugify(name)}-{pk}",
+            description=f"The {name} is a {rng.choice(ADJECTIVES).lower()} pick for everyday use.",
+            price=price, stock=rng.choice([0, *range(1, 200)]), is_available=rng.random() > 0.03,
+            date_added=added, date_updated=added + timedelta(days=rng.uniform(0, (now - added).days)),
+        ))
+    with _explicit_timestamps(Product):
+        Product.objects.bulk_create(products)
+    return count
+
+
+def _seed_orders(start, count):
+    now, product_ids, user_ids = _context['now'], _context['product_ids'], _context['user_ids']
+    if 'prices' not in _context:
+        _context['prices'] = dict(Product.objects.values_list('pk', 'price').iterator())
+    prices = _context['prices']
+
+    orders, items = [], []
+    for pk, rng in _rows('orders', start, count):
+        user_id = rng.choices(user_ids, cum_weights=_context['user_weights'])[0] if user_ids else None
+        date_ordered = now - timedelta(days=rng.uniform(0, HISTORY_DAYS))
+        size = rng.choices(range(1, len(ORDER_SIZE_WEIGHTS) + 1), weights=ORDER_SIZE_WEIGHTS)[0]
+        basket = dict.fromkeys(rng.choices(product_ids, cum_weights=_context['product_weights'], k=size))
+        total = Decimal('0.00')
+        for product_id in basket:
+            quantity = rng.choices(range(1, len(QUANTITY_WEIGHTS) + 1), weights=QUANTITY_WEIGHTS)[0]
+            total += quantity * prices[product_id]
+            items.append(OrderItem(order_id=pk, product_id=product_id, quantity=quantity,
+                                   price_at_purchase=prices[product_id], date_added=date_ordered))
+        city, country = rng.choice(CITIES)
+        completed = rng.random() < 0.97
+        orders.append(Order(pk=pk, user_id=user_id, address=f"{rng.randint(1, 300)} Market Street", city=city,
+                            postal_code=f"{rng.randint(10000, 99999)}", country=country, total_amount=total,
+                            date_ordered=date_ordered, is_completed=completed,
+                            transaction_id=f"seed_{pk}" if completed else None))
+    with _explicit_timestamps(Order, OrderItem), transaction.atomic():
+        Order.objects.bulk_create(orders)
+        OrderItem.objects.bulk_create(items)
+    return count
+
+
+def _run_chunk(task):
+    builder, start, count = task
+    try:
+        return builder(start, count)
+    finally:
+        if _context.get('forked'):
+            connections.close_all()
+
+
+# =============================================================================
+# --- Seeding ---
+# =============================================================================
+
+def _seed_categories(rng, leaves):
+    """Creates (or reuses, by name) a two-level department / subcategory tree; returns the leaf ids."""
+    departments = {}
+    for name in DEPARTMENTS:
+        departments[name], _ = Category.objects.get_or_create(name=name)
+    leaf_ids, round_number = [], 1
+    while len(leaf_ids) < leaves:
+        for department, subcategories in DEPARTMENTS.items():
+            for subcategory in subcategories:
+                if len(leaf_ids) == leaves:
+                    break
+                name = subcategory if round_number == 1 else f"{subcategory} {round_number}"
+                category, _ = Category.objects.get_or_create(
+                    name=name, defaults={'parent': departments[department], 'description': f"{department}: {name}"})
+                leaf_ids.append(category.pk)
+        round_number += 1
+    rng.shuffle(leaf_ids)
+    return leaf_ids
+
+
+def seed_data(users=0, products=0, orders=0, categories=None, seed=0, workers=1, chunk_size=5000,
+              password='password', log=None):
+    """
+    Bulk-inserts synthetic users, a category tree, products, and orders with items.
+
+    Product popularity and per-user order counts follow Zipf distributions, prices are
+    log-normal and basket sizes skew small. Primary keys are assigned up front (after the
+    current maximum), so chunks can be inserted independently; with `workers` > 1 they run in
+    a forked process pool (PostgreSQL; SQLite allows one writer, so it always runs in-process).
+    Rows draw from generators seeded by (`seed`, block of SEED_BLOCK rows), so a seed always produces
+    the same data whatever the chunk size (rounded to whole blocks) or number of workers. All users share one precomputed password hash. Returns per-stage timings.
+    """
+    log = log or (lambda message: None)
+    if connection.vendor == 'sqlite':
+        workers = 1
+    chunk_size = max(SEED_BLOCK, chunk_size // SEED_BLOCK * SEED_BLOCK)
+    rng = random.Random(seed)
+    _context.clear()
+    _context.update(seed=seed, now=timezone.now(), forked=workers > 1)
+    timings = {}
+
+    def run(stage, builder, model, total):
+        started = time.perf_counter()
+        first = _context['first'] = _next_id(model)
+        tasks = [(builder, start, min(chunk_size, first + total - start))
+                 for start in range(first, first + total, chunk_size)]
+        if workers > 1 and len(tasks) > 1:
+            connections.close_all()  # forked children must open their own connections
+            with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork')) as pool:
+                done = sum(pool.map(_run_chunk, tasks))
+        else:
+            done = sum(map(_run_chunk, tasks))
+        timings[stage] = time.perf_counter() - started
+        log(f"{stage}: {done} in {timings[stage]:.1f}s")
+        return range(first, first + total)
+
+    if users:
+        _context['password_hash'] = make_password(password)
+        user_range = run('users', _seed_users, User, users)
+    if products:
+        leaves = categories or max(len(sum(DEPARTMENTS.values(), [])), products // 500)
+        _context['category_ids'] = _seed_categories(rng, leaves)
+        _context['category_weights'] = _zipf_cum_weights(len(_context['category_ids']), 1.0)
+        product_range = run('products', _seed_products, Product, products)
+    if orders:
+        product_ids = list(product_range) if products else list(Product.objects.values_list('pk', flat=True))
+        user_ids = list(user_range) if users else list(User.objects.values_list('pk', flat=True))
+        if not product_ids:
+            raise ValueError("Seeding orders needs products: pass products or seed them first.")
+        rng.shuffle(product_ids)  # popularity rank -> product, so best sellers are spread over the catalog
+        rng.shuffle(user_ids)
+        _context.update(product_ids=product_ids, product_weights=_zipf_cum_weights(len(product_ids), ZIPF_EXPONENT),
+                        user_ids=user_ids, user_weights=_zipf_cum_weights(len(user_ids), ZIPF_EXPONENT / 2))
+        run('orders', _seed_orders, Order, orders)
+
+    # Explicit primary keys leave PostgreSQL sequences behind; bulk inserts send no signals.
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), [User, Category, Product, Order]):
+            cursor.execute(sql)
+    invalidate_facets()
+    invalidate_pages([PRODUCT_LIST_SCOPE])
+    invalidate_autocomplete()
+    _context.clear()
+    return timings
@@ -1,11 +1,14 @@
 # store/serializers.py
 
 # --- Django & Third-Party Imports ---
-from django.db.models import F
 from rest_framework import serializers
 
 # --- Local Application Imports ---
+from .checkout import CheckoutRejected, CheckoutTimedOut, build_checkout, place_checkout
+from .flash_sale import FlashSaleUnavailable, release_flash_stock, reserve_flash_stock
+from .metrics import CHECKOUTS, STOCK_CONFLICTS
 from .models import User, Category, Product, Cart, CartItem, Order, OrderItem
+from .sharding import join_catalog, user_db
 
 
 # =============================================================================
@@ -80,6 +83,37 @@ class ProductSerializer(serializers.ModelSerializer):
         read_only_fields = ['slug', 'date_added', 'date_updated']
 
 
+class ProductFilterSerializer(serializers.Serializer):
+    """Validates the catalog filter query parameters shared by the product list API and web page."""
+    category = serializers.IntegerField(required=False)
+    min_price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False, min_value=0)
+    max_price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False, min_value=0,
+                                         help_text="Exclusive upper bound.")
+    in_stock = serializers.BooleanField(required=False, allow_null=True, default=None)
+
+    def validate(self, attrs):
+        if attrs.get('min_price') is not None and attrs.get('max_price') is not None \
+                and attrs['min_price'] >= attrs['max_price']:
+            raise serializers.ValidationError({"max_price": "Must be greater than min_price."})
+        return attrs
+
+
+class ProductBulkUpdateRowSerializer(serializers.Serializer):
+    """Validates one row of a staff bulk price/stock update; the product is identified by id or slug."""
+    id = serializers.IntegerField(required=False)
+    slug = serializers.SlugField(required=False)
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False, min_value=0)
+    stock = serializers.IntegerField(required=False, min_value=0)
+    is_available = serializers.BooleanField(required=False)
+
+    def validate(self, attrs):
+        if 'id' not in attrs and 'slug' not in attrs:
+            raise serializers.ValidationError("Each row needs an id or a slug.")
+        if not any(field in attrs for field in ('price', 'stock', 'is_available')):
+            raise serializers.ValidationError("Each row needs at least one of price, stock or is_available.")
+        return attrs
+
+
 # =============================================================================
 # --- Cart Serializers ---
 # =============================================================================
@@ -166,50 +200,48 @@ class OrderCreateSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         user = self.context['request'].user
-        cart = Cart.objects.filter(user=user).first()
+        cart = Cart.objects.using(user_db(user)).filter(user=user).first()
+        cart_items = list(join_catalog(cart.items.all(), 'product')) if cart else []
 
-        if not cart or not cart.items.exists():
+        if not cart_items:
+            CHECKOUTS.labels('empty_cart').inc()
             raise serializers.ValidationError("Your cart is empty. Add items before placing an order.")
 
-        order = Order.objects.create(user=user, **validated_data)
-
-        products_to_update = []
-        order_items_to_create = []
-        total_order_amount = 0
-
-        # Prepare all order items and stock updates
-        for cart_item in cart.items.all():
-            if cart_item.product.stock < cart_item.quantity:
-                order.delete()  # Clean up the partially created order
+        for cart_item in cart_items:
+            if not cart_item.product.is_flash_sale and cart_item.product.stock < cart_item.quantity:
+                CHECKOUTS.labels('insufficient_stock').inc()
+                STOCK_CONFLICTS.labels('checkout').inc()
                 raise serializers.ValidationError(
                     f"Insufficient stock for {cart_item.product.name}. "
                     f"Available: {cart_item.product.stock}, Requested: {cart_item.quantity}"
                 )
 
-            order_items_to_create.append(
-                OrderItem(
-                    order=order,
-                    product=cart_item.product,
-                    quantity=cart_item.quantity,
-                    price_at_purchase=cart_item.product.price
-                )
-            )
-            total_order_amount += cart_item.get_total_price()
-
-            # Prepare product for stock update using an F() expression
-            product = cart_item.product
-            product.stock = F('stock') - cart_item.quantity
-            products_to_update.append(product)
-
-        # Execute database operations
-        OrderItem.objects.bulk_create(order_items_to_create)
-        Product.objects.bulk_update(products_to_update, ['stock'])
-
-        # Finalize order and clear cart
-        order.total_amount = total_order_amount
-        order.save(update_fields=['total_amount'])
-        cart.items.all().delete()
-
+        # Flash-sale products take their stock from a shared-cache counter instead of the row,
+        # so concurrent checkouts of the same product do not queue on its lock.
+        try:
+            taken = reserve_flash_stock({cart_item.product_id: cart_item.quantity
+                                         for cart_item in cart_items if cart_item.product.is_flash_sale})
+        except FlashSaleUnavailable as exc:
+            CHECKOUTS.labels('insufficient_stock').inc()
+            STOCK_CONFLICTS.labels('flash_sale').inc()
+            raise serializers.ValidationError(str(exc))
+
+        # Commits here, or with the next batch of concurrent checkouts under CHECKOUT_BATCHING.
+        try:
+            order = place_checkout(build_checkout(user, cart_items, validated_data))
+        except CheckoutTimedOut as exc:
+            # Its batch may still commit the order, flash-sale units included.
+            CHECKOUTS.labels('timed_out').inc()
+            raise serializers.ValidationError(str(exc))
+        except Exception as exc:
+            release_flash_stock(taken)
+            if isinstance(exc, CheckoutRejected):  # sold out between the check above and the commit
+                CHECKOUTS.labels('insufficient_stock').inc()
+                STOCK_CONFLICTS.labels('checkout').inc()
+                raise serializers.ValidationError(str(exc))
+            raise
+
+        CHECKOUTS.labels('success').inc()
         return order
 
 
@@ -224,7 +256,7 @@ class PaymentIntentCreateSerializer(serializers.Serializer):
     def validate_order_id(self, value):
         user = self.context['request'].user
         try:
-            order = Order.objects.get(pk=value, user=user, is_completed=False)
+            order = Order.objects.using(user_db(user)).get(pk=value, user=user, is_completed=False)
         except Order.DoesNotExist:
             raise serializers.ValidationError("Invalid or already completed order does not belong to the current user.")
 
@@ -232,3 +264,20 @@ class PaymentIntentCreateSerializer(serializers.Serializer):
             raise serializers.ValidationError("Order amount must be positive to process payment.")
 
         return value
+
+
+# =============================================================================
+# --- Analytics Serializers ---
+# =============================================================================
+
+class SalesReportQuerySerializer(serializers.Serializer):
+    """Validates the query parameters of the staff sales report endpoint."""
+    group_by = serializers.ChoiceField(choices=['day', 'category', 'product'], default='day')
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    limit = serializers.IntegerField(required=False, min_value=1, max_value=1000)
+
+    def validate(self, attrs):
+        if attrs.get('start') and attrs.get('end') and attrs['start'] > attrs['end']:
+            raise serializers.ValidationError({"start": "Start date must not be after end date."})
+        return attrs
@@ -0,0 +1,235 @@
+# store/sharding.py
+
+# --- Django & Python Imports ---
+import time
+from contextlib import contextmanager, nullcontext
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Max, Q
+
+# --- Third-Party Imports ---
+from rest_framework.exceptions import APIException
+
+# --- Local Application Imports ---
+from .authentication import invalidate_cached_user
+from .models import Cart, CartItem, Order, OrderItem, SalesRollupState, User
+
+# The catalog, users and everything not owned by a single user live here; it is also shard 0.
+CATALOG_DB = 'default'
+# Models whose rows belong to one user and live on that user's shard.
+SHARDED_MODELS = (Cart, CartItem, Order, OrderItem)
+SHARDED_MODEL_NAMES = {model._meta.model_name for model in SHARDED_MODELS}
+# Shard N issues ids from N * SHARD_ID_BLOCK, so ids are unique across shards and survive moves.
+SHARD_ID_BLOCK = 10 ** 12
+# While a user's rows are being moved, User.shard reads '<source>><target>' (source blank for shard 0).
+MOVING = '>'
+
+
+class UserDataMoving(APIException):
+    status_code = 503
+    default_detail = "Your cart and orders are being moved. Please try again in a few seconds."
+    default_code = 'user_data_moving'
+
+
+def shard_aliases():
+    """Database aliases holding user data, shard 0 (the catalog database) first."""
+    return settings.USER_SHARD_ALIASES
+
+
+def jump_hash(key, buckets):
+    """Jump consistent hash: growing `buckets` by one only remaps about 1/buckets of the keys."""
+    bucket, jump = -1, 0
+    while jump < buckets:
+        bucket = jump
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        jump = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return bucket
+
+
+def home_shard(user_id):
+    """The shard a user's carts and orders belong on under the current USER_SHARDS."""
+    aliases = shard_aliases()
+    return aliases[jump_hash(user_id, len(aliases))]
+
+
+def user_db(user):
+    """
+    The database alias holding `user`'s carts and orders. Raises UserDataMoving while
+    reshard_users() is moving them. Users never placed (User.shard blank) are on shard 0.
+    """
+    return _shard_db(getattr(user, 'shard', ''))  # claims-only TokenUsers never reach user data
+
+
+def user_id_db(user_id):
+    """user_db() for a user id; one query on the catalog database unless there is a single shard."""
+    if len(shard_aliases()) == 1:
+        return CATALOG_DB
+    return _shard_db(User.objects.filter(pk=user_id).values_list('shard', flat=True).first() or '')
+
+
+def _shard_db(shard):
+    if MOVING in shard:
+        raise UserDataMoving()
+    return shard or CATALOG_DB
+
+
+def join_catalog(queryset, *fields):
+    """
+    select_related(*fields) when the queryset runs on the catalog database; otherwise the
+    catalog rows cannot be joined and are fetched with prefetch_related (one more query).
+    """
+    if queryset.db == CATALOG_DB:
+        return queryset.select_related(*fields)
+    return queryset.prefetch_related(*fields)
+
+
+@contextmanager
+def shard_and_catalog_atomic(db):
+    """
+    A transaction on shard `db` with, unless `db` is the catalog database, one on the catalog
+    database inside it: the catalog one commits first.
+    """
+    with transaction.atomic(using=db), (transaction.atomic() if db != CATALOG_DB else nullcontext()):
+        yield
+
+
+def place_new_user(user):
+    """Records a newly created user's home shard; users homed on shard 0 are left blank."""
+    shard = home_shard(user.pk)
+    if shard != CATALOG_DB:
+        User.objects.filter(pk=user.pk).update(shard=shard)
+        user.shard = shard
+
+
+# =============================================================================
+# --- Shard Id Ranges ---
+# =============================================================================
+
+def reserve_id_range(using):
+    """
+    Starts the id sequences of the sharded tables on shard N (its position in USER_SHARD_ALIASES)
+    at N * SHARD_ID_BLOCK, unless they are already past it. Run after migrations.
+    """
+    if using not in shard_aliases() or not shard_aliases().index(using):
+        return
+    start = shard_aliases().index(using) * SHARD_ID_BLOCK
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        for model in SHARDED_MODELS:
+            table = model._meta.db_table
+            if connection.vendor == 'sqlite':
+                cursor.execute("UPDATE sqlite_sequence SET seq = %s WHERE name = %s AND seq < %s",
+                               [start - 1, table, start - 1])
+                cursor.execute("INSERT INTO sqlite_sequence (name, seq) SELECT %s, %s "
+                               "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = %s)",
+                               [table, start - 1, table])
+            elif connection.vendor == 'postgresql':
+                cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [table])
+                sequence = cursor.fetchone()[0]
+                cursor.execute(f"SELECT last_value FROM {sequence}")
+                if cursor.fetchone()[0] < start:
+                    cursor.execute("SELECT setval(%s, %s, false)", [sequence, start])
+            elif connection.vendor == 'mysql':
+                cursor.execute("SELECT AUTO_INCREMENT FROM information_schema.TABLES "
+                               "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s", [table])
+                if (cursor.fetchone()[0] or 0) < start:
+                    cursor.execute(f"ALTER TABLE {connection.ops.quote_name(table)} AUTO_INCREMENT = {start}")
+
+
+def id_blocks(model=Order):
+    """The id blocks `model`'s rows have been issued from, on any shard: block N came from shard N."""
+    tops = [model.objects.using(shard).aggregate(top=Max('id'))['top'] for shard in shard_aliases()]
+    top = max((high for high in tops if high is not None), default=None)
+    return range(0 if top is None else top // SHARD_ID_BLOCK + 1)
+
+
+def in_id_block(block):
+    """Filter for the rows whose id was issued from `block`."""
+    return Q(id__gte=block * SHARD_ID_BLOCK, id__lt=(block + 1) * SHARD_ID_BLOCK)
+
+
+# =============================================================================
+# --- Resharding ---
+# =============================================================================
+
+def reshard_users(user_ids=None, target=None, batch_size=None, grace_seconds=None, log=None):
+    """
+    Moves users whose carts and orders are not on their home shard (or, for `user_ids`, on
+    `target`) there, `batch_size` (USER_RESHARD_BATCH_SIZE) users at a time. Run it after
+    changing USER_SHARDS. Moves interrupted by a crash are resumed. Returns counts of users
+    moved, rows copied and batches.
+    """
+    if target is not None and target not in shard_aliases():
+        raise ValueError(f"{target!r} is not one of USER_SHARD_ALIASES.")
+    batch_size = batch_size or settings.USER_RESHARD_BATCH_SIZE
+    log = log or (lambda message: None)
+    users = User.objects.order_by('pk')
+    if user_ids is not None:
+        users = users.filter(pk__in=user_ids)
+    report = {'users': 0, 'rows': 0, 'batches': 0}
+    last_pk = 0
+    while True:
+        batch = list(users.filter(pk__gt=last_pk).values_list('pk', 'shard')[:batch_size])
+        if not batch:
+            return report
+        last_pk = batch[-1][0]
+        moves = {}
+        for pk, shard in batch:
+            source, _, resumed_target = shard.partition(MOVING)
+            source, destination = source or CATALOG_DB, resumed_target or target or home_shard(pk)
+            if destination != source or resumed_target:
+                moves.setdefault((source, destination), []).append(pk)
+        for (source, destination), pks in moves.items():
+            rows = move_users(pks, source, destination, grace_seconds)
+            log(f"{len(pks)} user(s) {source} -> {destination}: {rows} row(s)")
+            report['users'] += len(pks)
+            report['rows'] += rows
+            report['batches'] += 1
+
+
+def move_users(user_ids, source, destination, grace_seconds=None):
+    """
+    Moves the carts and orders of `user_ids` from `source` to `destination`, keeping their ids.
+
+    The users are first marked as moving, so their requests get a 503 (UserDataMoving), and
+    requests already past that check get USER_MOVE_GRACE_SECONDS to finish. Rows are then copied
+    in one transaction on `destination`, deleted in one on `source`, and the users are switched
+    over. Rerunning after a crash at any step completes the move: users whose rows are no longer
+    on `source` were copied already and are only switched. Returns the number of rows copied.
+    """
+    from .seeding import _explicit_timestamps  # seeding imports the cart helpers, which import this module
+
+    grace_seconds = settings.USER_MOVE_GRACE_SECONDS if grace_seconds is None else grace_seconds
+    _set_shard(user_ids, f"{'' if source == CATALOG_DB else source}{MOVING}{destination}")
+    time.sleep(grace_seconds)
+
+    with transaction.atomic():
+        # Sales rollups and archiving hold these while they read orders, so they see every order
+        # on at least one shard and never archive one that is being copied.
+        list(SalesRollupState.objects.select_for_update())
+        carts = list(Cart.objects.using(source).filter(user_id__in=user_ids).values())
+        orders = list(Order.objects.using(source).filter(user_id__in=user_ids).values())
+        cart_items = list(CartItem.objects.using(source).filter(cart_id__in=[row['id'] for row in carts]).values())
+        order_items = list(OrderItem.objects.using(source).filter(order_id__in=[row['id'] for row in orders])
+                           .values())
+        copied_user_ids = {row['user_id'] for row in carts + orders}
+        if copied_user_ids:
+            with transaction.atomic(using=destination), _explicit_timestamps(*SHARDED_MODELS):
+                # Left over from an interrupted move (items cascade): the source rows are the complete copy.
+                Cart.objects.using(destination).filter(user_id__in=copied_user_ids).delete()
+                Order.objects.using(destination).filter(user_id__in=copied_user_ids).delete()
+                for model, rows in ((Cart, carts), (CartItem, cart_items), (Order, orders), (OrderItem, order_items)):
+                    model.objects.using(destination).bulk_create([model(**row) for row in rows])
+    # Only after the copy has committed, wherever `destination` is.
+    with transaction.atomic(using=source):
+        Cart.objects.using(source).filter(user_id__in=copied_user_ids).delete()
+        Order.objects.using(source).filter(user_id__in=copied_user_ids).delete()
+    _set_shard(user_ids, '' if destination == CATALOG_DB else destination)
+    return len(carts) + len(cart_items) + len(orders) + len(order_items)
+
+
+def _set_shard(user_ids, shard):
+    User.objects.filter(pk__in=user_ids).update(shard=shard)
+    for user_id in user_ids:  # update() sends no signals
+        invalidate_cached_user(user_id)
@@ -0,0 +1,83 @@
+# store/signals.py
+
+# --- Django & Python Imports ---
+from django.db import transaction
+from django.db.models.signals import post_delete, post_migrate, post_save
+from django.dispatch import receiver
+
+# --- Local Application Imports ---
+from .authentication import invalidate_cached_user
+from .autocomplete import record_product_changes
+from .facets import invalidate_facets
+from .flash_sale import reset_flash_stock
+from .models import Cart, CartItem, Category, Order, OrderItem, Product, User
+from .page_cache import invalidate_product_pages
+from .sharding import CATALOG_DB, place_new_user, reserve_id_range, shard_aliases
+
+
+# =============================================================================
+# --- Catalog Cache Invalidation ---
+# =============================================================================
+
+@receiver([post_save, post_delete], sender=Product)
+def invalidate_product_caches(sender, instance, **kwargs):
+    """Drops cached catalog data derived from a product, including its own detail page."""
+    invalidate_facets()
+    invalidate_product_pages([instance.pk])
+    # Logged after commit so other workers never re-read the product before the change is visible.
+    product_ids = [instance.pk]  # taken now: delete() clears instance.pk before the commit
+    transaction.on_commit(lambda: record_product_changes(product_ids))
+    if instance.is_flash_sale and not kwargs.get('created'):
+        # A saved stock (or a product just switched to flash-sale mode) reloads its counter.
+        transaction.on_commit(lambda: reset_flash_stock(product_ids))
+
+
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_category_caches(sender, instance, **kwargs):
+    """Drops cached catalog data derived from a category, including its products' detail pages."""
+    invalidate_facets()
+    invalidate_product_pages(Product.objects.filter(category_id=instance.pk).values_list('pk', flat=True))
+
+
+# =============================================================================
+# --- Authentication Cache Invalidation ---
+# =============================================================================
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_user_cache(sender, instance, **kwargs):
+    """Any change to a user (password, is_active, credits, ...) drops its cached API identity."""
+    invalidate_cached_user(instance.pk)
+
+
+# =============================================================================
+# --- User Sharding ---
+# =============================================================================
+
+@receiver(post_save, sender=User)
+def place_user_on_shard(sender, instance, created, raw=False, **kwargs):
+    """A new user's carts and orders go to its home shard; the user row stays on 'default'."""
+    if created and not raw:
+        place_new_user(instance)
+
+
+@receiver(post_migrate)
+def reserve_shard_id_range(sender, using, **kwargs):
+    """Keeps cart and order ids unique across shards (see reserve_id_range)."""
+    if sender.name == 'store':
+        reserve_id_range(using)
+
+
+@receiver(post_delete, sender=Product)
+def delete_product_from_shards(sender, instance, **kwargs):
+    """Deleting a product only cascades on 'default'; the other shards are cleaned up here."""
+    for alias in shard_aliases()[1:]:
+        CartItem.objects.using(alias).filter(product_id=instance.pk).delete()
+        OrderItem.objects.using(alias).filter(product_id=instance.pk).update(product=None)
+
+
+@receiver(post_delete, sender=User)
+def delete_user_from_shard(sender, instance, **kwargs):
+    """Deleting a user only cascades on 'default'; its carts and orders elsewhere are handled here."""
+    if instance.shard and instance.shard in shard_aliases() and instance.shard != CATALOG_DB:
+        Cart.objects.using(instance.shard).filter(user_id=instance.pk).delete()
+        Order.objects.using(instance.shard).filter(user_id=instance.pk).update(user=None)
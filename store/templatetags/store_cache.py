@@ -0,0 +1,43 @@
+# store/templatetags/store_cache.py
+
+# --- Django & Python Imports ---
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
+
+register = template.Library()
+
+PRODUCT_CARD_TEMPLATE = 'store/includes/product_card.html'
+# Bump when the card markup changes so stale fragments are not served after a deploy.
+PRODUCT_CARD_VERSION = 1
+
+
+def product_card_key(product):
+    """Cache key of a rendered product card; any save (date_updated) or stock-state change misses."""
+    in_stock = int(product.stock > 0)
+    return f'fragment:product-card:v{PRODUCT_CARD_VERSION}:{product.pk}:{product.date_updated.timestamp()}:{in_stock}'
+
+
+@register.simple_tag
+def cached_product_cards(products):
+    """
+    Returns [(product, card_html)] for `products`, fetching every card in one cache round trip
+    and rendering (then storing) only the ones that are missing.
+    """
+    products = list(products)
+    keys = [product_card_key(product) for product in products]
+    cached = cache.get_many(keys)
+
+    card_template = get_template(PRODUCT_CARD_TEMPLATE)
+    cards, rendered = [], {}
+    for product, key in zip(products, keys):
+        html = cached.get(key)
+        if html is None:
+            html = rendered[key] = card_template.render({'product': product})
+        cards.append((product, mark_safe(html)))
+
+    if rendered:
+        cache.set_many(rendered, settings.FRAGMENT_CACHE_TIMEOUT)
+    return cards
@@ -1,9 +1,55 @@
+import hashlib
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import timedelta
 from decimal import Decimal
+from unittest import mock
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.db.models import F, Sum
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APITestCase
 
+from store.analytics import refresh_sales_rollups, rebuild_sales_rollups
+from store.archive import archive_orders
+from store.authentication import invalidate_cached_user
+from store.autocomplete import ProductAutocomplete
+from store.bulk import bulk_update_products
+from store.carts import GUEST_CART_COOKIE, purge_stale_carts
+from store.checkout import (
+    CheckoutRejected, CheckoutTimedOut, MicroBatcher, build_checkout, commit_checkouts, place_checkout,
+)
 from store.factories import UserFactory, CategoryFactory, ProductFactory, OrderFactory, CartItemFactory
+from store.flash_sale import flush_flash_stock, reconcile_flash_stock
+from store import metrics
+from store.inventory import apply_inventory_feed
+from store.models import (
+    User, Category, Order, OrderItem, Product, Cart, CartItem, ArchivedOrder, ArchivedOrderItem,
+    DailySales, DailyProductSales, DailyCategorySales, RelatedProduct, StripeEvent, PendingStockDecrement,
+    PRODUCT_ORDERINGS,
+)
+from store.page_cache import invalidate_product_pages
+from store.payments import process_stripe_events, sign_stripe_payload
+from store.popularity import refresh_product_popularity
+from store.querylog import inspect_queries
+from store.seeding import seed_data
+from store.recommendations import refresh_recommendations
+from store.renderers import FastJSONRenderer
+from store.serializers import ProductSerializer
+from store.throttling import consume
+from store.warmup import compile_templates, compile_url_patterns
 
 
 class ECommerceAPITests(APITestCase):
@@ -133,3 +179,1101 @@ class ECommerceAPITests(APITestCase):
         self._auth(self.user)
         resp = self.client.get(reverse('order-detail', kwargs={'pk': order.pk}))
         self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class SalesRollupTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserFactory()
+        cls.admin_user = UserFactory(is_staff=True, is_superuser=True)
+        cls.category = CategoryFactory(name='Gadgets')
+        cls.product = ProductFactory(category=cls.category, price='10.00')
+        cls.other_product = ProductFactory(category=cls.category, price='2.50')
+
+    def _place_order(self, *lines, is_completed=True):
+        order = OrderFactory(user=self.user, is_completed=is_completed, total_amount='10.00')
+        OrderItem.objects.bulk_create(
+            OrderItem(order=order, product=product, quantity=qty, price_at_purchase=product.price)
+            for product, qty in lines
+        )
+        return order
+
+    def test_refresh_is_incremental(self):
+        self._place_order((self.product, 2), (self.other_product, 4))
+        self.assertEqual(refresh_sales_rollups(settle_seconds=0), 1)
+        self.assertEqual(refresh_sales_rollups(settle_seconds=0), 0)
+
+        self._place_order((self.product, 1))
+        self.assertEqual(refresh_sales_rollups(settle_seconds=0), 1)
+
+        day = DailySales.objects.get()
+        self.assertEqual((day.units, day.revenue, day.order_count), (7, Decimal('40.00'), 2))
+        product_row = DailyProductSales.objects.get(product=self.product)
+        self.assertEqual((product_row.units, product_row.order_count), (3, 2))
+        category_row = DailyCategorySales.objects.get(category=self.category)
+        self.assertEqual((category_row.revenue, category_row.order_count), (Decimal('40.00'), 2))
+
+    def test_only_completed_orders_count_including_ones_paid_after_the_refresh(self):
+        unpaid = self._place_order((self.product, 1), is_completed=False)
+        self._place_order((self.other_product, 2))
+        self.assertEqual(refresh_sales_rollups(settle_seconds=0), 2)
+        day = DailySales.objects.get()
+        self.assertEqual((day.units, day.revenue, day.order_count), (2, Decimal('5.00'), 1))
+
+        self.client.force_authenticate(user=self.user)
+        resp = self.client.post(reverse('api-confirm-order-payment'), {'order_id': unpaid.pk}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(refresh_sales_rollups(settle_seconds=0), 0)
+        day.refresh_from_db()
+        self.assertEqual((day.units, day.revenue, day.order_count), (3, Decimal('15.00'), 2))
+        self.assertEqual(DailyProductSales.objects.get(product=self.product).units, 1)
+
+    def test_sales_report_staff_only(self):
+        self._place_order((self.product, 1))
+        refresh_sales_rollups(settle_seconds=0)
+        url = reverse('api-sales-report')
+
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(user=self.admin_user)
+        resp = self.client.get(url, {'group_by': 'product'})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data[0]['product_id'], self.product.id)
+        self.assertEqual(resp.data[0]['revenue'], Decimal('10.00'))
+
+
+class ProductPopularityTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserFactory()
+        cls.category = CategoryFactory(name='Tools')
+        cls.steady = ProductFactory(category=cls.category)
+        cls.hot = ProductFactory(category=cls.category)
+        cls.unsold = ProductFactory(category=cls.category)
+
+        old_order = OrderFactory(user=cls.user)
+        OrderItem.objects.create(order=old_order, product=cls.steady, quantity=10, price_at_purchase='1.00')
+        Order.objects.filter(pk=old_order.pk).update(date_ordered=timezone.now() - timedelta(days=20))
+        new_order = OrderFactory(user=cls.user)
+        OrderItem.objects.create(order=new_order, product=cls.hot, quantity=4, price_at_purchase='1.00')
+
+    def setUp(self):
+        cache.clear()
+        refresh_product_popularity()
+
+    def test_scores_rank_best_sellers_and_trending(self):
+        url = reverse('api-product-list')
+        popular = [p['id'] for p in self.client.get(url, {'ordering': 'popular'}).data]
+        trending = [p['id'] for p in self.client.get(url, {'ordering': 'trending'}).data]
+        self.assertEqual(popular, [self.steady.id, self.hot.id, self.unsold.id])
+        self.assertEqual(trending, [self.hot.id, self.steady.id, self.unsold.id])
+
+    def test_top_products_are_cached_until_refresh(self):
+        url = reverse('api-product-top')
+        self.assertEqual([p['id'] for p in self.client.get(url).data], [self.steady.id, self.hot.id])
+
+        Product.objects.filter(pk=self.hot.pk).update(popularity_score=1000)
+        self.assertEqual([p['id'] for p in self.client.get(url).data], [self.steady.id, self.hot.id])
+
+        OrderItem.objects.create(order=OrderFactory(user=self.user), product=self.hot, quantity=20,
+                                 price_at_purchase='1.00')
+        with self.captureOnCommitCallbacks(execute=True):
+            refresh_product_popularity()
+        self.assertEqual([p['id'] for p in self.client.get(url).data], [self.hot.id, self.steady.id])
+        self.assertEqual(self.client.get(url, {'kind': 'bogus'}).status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ProductFacetTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.books = CategoryFactory(name='Books')
+        cls.games = CategoryFactory(name='Games')
+        cls.cheap_book = ProductFactory(category=cls.books, price='10.00', stock=3)
+        cls.sold_out_book = ProductFactory(category=cls.books, price='50.00', stock=0)
+        cls.pricey_game = ProductFactory(category=cls.games, price='600.00', stock=1)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_filter_product_list(self):
+        url = reverse('api-product-list')
+        resp = self.client.get(url, {'category': self.books.id, 'in_stock': 'true'})
+        self.assertEqual([p['id'] for p in resp.data], [self.cheap_book.id])
+        resp = self.client.get(url, {'min_price': '25', 'max_price': '1000'})
+        self.assertSetEqual({p['id'] for p in resp.data}, {self.sold_out_book.id, self.pricey_game.id})
+        self.assertEqual(self.client.get(url, {'min_price': 'abc'}).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_facet_counts_exclude_own_filter(self):
+        resp = self.client.get(reverse('api-product-facets'), {'category': self.books.id})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data['count'], 2)
+        self.assertEqual({c['name']: c['count'] for c in resp.data['categories']}, {'Books': 2, 'Games': 1})
+        self.assertEqual([r['count'] for r in resp.data['price_ranges']], [1, 1, 0, 0])
+        self.assertEqual(resp.data['stock'], {'in_stock': 1, 'out_of_stock': 1})
+
+    def test_facets_invalidated_on_product_change(self):
+        url = reverse('api-product-facets')
+        self.assertEqual(self.client.get(url).data['count'], 3)
+        ProductFactory(category=self.games, price='5.00')
+        self.assertEqual(self.client.get(url).data['count'], 4)
+
+    def test_web_product_list_filters(self):
+        resp = self.client.get(reverse('product_list'), {'category': self.games.id})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(resp.context['products']), [self.pricey_game])
+        self.assertContains(resp, 'In stock only')
+
+
+@override_settings(THROTTLE_RATES={'auth': '2/min', 'catalog': None, 'checkout': None, 'default': None})
+class ThrottlingTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_token_bucket_refills(self):
+        results = [consume('bucket', capacity=2, period=60, now=1000.0)[0] for _ in range(3)]
+        self.assertEqual(results, [True, True, False])
+        self.assertFalse(consume('bucket', capacity=2, period=60, now=1029.0)[0])
+        self.assertTrue(consume('bucket', capacity=2, period=60, now=1031.0)[0])
+
+    def test_api_route_group_throttled(self):
+        url = reverse('api-register')
+        for _ in range(2):
+            self.assertEqual(self.client.post(url, {}, format='json').status_code, status.HTTP_400_BAD_REQUEST)
+        resp = self.client.post(url, {}, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', resp)
+        # Other route groups keep their own buckets.
+        self.assertEqual(self.client.get(reverse('api-product-list')).status_code, status.HTTP_200_OK)
+
+    def test_template_views_throttled_by_middleware(self):
+        url = reverse('login_page')
+        self.assertEqual([self.client.get(url).status_code for _ in range(3)], [200, 200, 429])
+
+    def test_rotating_forwarded_for_does_not_reset_the_bucket(self):
+        url = reverse('login_page')
+        codes = [self.client.get(url, HTTP_X_FORWARDED_FOR=f'10.0.0.{n}').status_code for n in range(3)]
+        self.assertEqual(codes, [200, 200, 429])
+
+
+class CachedJWTAuthenticationTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserFactory(password='s3cret-pass')
+
+    def setUp(self):
+        cache.clear()
+        resp = self.client.post(reverse('token_obtain_pair'),
+                                {'username': self.user.username, 'password': 's3cret-pass'}, format='json')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {resp.data['access']}")
+
+    def test_user_resolved_from_cache(self):
+        url = reverse('order-list')
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+        with self.assertNumQueries(2):  # the hot and archived orders queries only; no User lookup
+            self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+
+    def test_password_change_revokes_token(self):
+        url = reverse('order-list')
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+        self.user.set_password('an0ther-pass')
+        self.user.save()
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivation_revokes_token(self):
+        url = reverse('order-list')
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+        self.user.is_active = False
+        self.user.save(update_fields=['is_active'])
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(AUTH_USER_CACHE_TIMEOUT=60)
+    def test_signal_free_deactivation_seen_on_invalidation_or_expiry(self):
+        url = reverse('order-list')
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+        User.objects.filter(pk=self.user.pk).update(is_active=False)  # no post_save
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+        later = time.time() + 61
+        with mock.patch('time.time', return_value=later):
+            self.assertEqual(self.client.get(url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+        User.objects.filter(pk=self.user.pk).update(is_active=True)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        invalidate_cached_user(self.user.pk)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_read_only_catalog_uses_claims_only_user(self):
+        with self.assertNumQueries(1):  # the products query only
+            self.assertEqual(self.client.get(reverse('api-product-list')).status_code, status.HTTP_200_OK)
+
+
+class ProductCardFragmentCacheTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = ProductFactory(name='Original Name', stock=3)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cards_served_from_cache_until_product_saved(self):
+        url = reverse('product_list')
+        self.assertContains(self.client.get(url), 'Original Name')
+
+        Product.objects.filter(pk=self.product.pk).update(name='Bulk Renamed')  # bypasses date_updated
+        self.assertContains(self.client.get(url), 'Original Name')
+
+        self.product.name = 'Saved Name'
+        self.product.save()
+        resp = self.client.get(url)
+        self.assertContains(resp, 'Saved Name')
+        self.assertContains(resp, 'form="add-to-cart-form"')
+
+    def test_stock_state_change_rerenders_card(self):
+        self.client.force_login(UserFactory())  # bypass the anonymous full-page cache
+        url = reverse('product_list')
+        self.assertContains(self.client.get(url), 'Add to Cart')
+        Product.objects.filter(pk=self.product.pk).update(stock=0)
+        self.assertContains(self.client.get(url), 'Out of Stock')
+
+
+class AnonymousPageCacheTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.product = ProductFactory(name='Cached Gadget', stock=4)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_anonymous_pages_cached_with_per_visitor_csrf_token(self):
+        url = reverse('product_detail', kwargs={'pk': self.product.pk})
+        first = self.client.get(url)
+        self.assertEqual(first['X-Page-Cache'], 'miss')
+
+        visitor = self.client_class(enforce_csrf_checks=True)
+        second = visitor.get(url)
+        self.assertEqual(second['X-Page-Cache'], 'hit')
+        token = re.search(r'name="csrfmiddlewaretoken" value="([^"]+)"', second.content.decode()).group(1)
+        self.assertNotIn(b'__page_cache_csrf_token__', second.content)
+        # The substituted token is valid for this visitor's own CSRF cookie (login redirect, not 403).
+        resp = visitor.post(reverse('add_to_cart', kwargs={'product_id': self.product.pk}),
+                            {'csrfmiddlewaretoken': token, 'quantity': 1})
+        self.assertEqual(resp.status_code, status.HTTP_302_FOUND)
+
+    def test_authenticated_users_bypass_cache(self):
+        url = reverse('product_list')
+        self.client.get(url)
+        self.client.force_login(UserFactory())
+        self.assertNotIn('X-Page-Cache', self.client.get(url))
+
+    def test_product_save_invalidates_only_affected_pages(self):
+        other = ProductFactory(name='Other Gadget')
+        detail_url = reverse('product_detail', kwargs={'pk': self.product.pk})
+        other_url = reverse('product_detail', kwargs={'pk': other.pk})
+        for url in (detail_url, other_url, reverse('product_list')):
+            self.client.get(url)
+
+        self.product.name = 'Renamed Gadget'
+        self.product.save()
+        self.assertContains(self.client.get(detail_url), 'Renamed Gadget')
+        self.assertEqual(self.client.get(other_url)['X-Page-Cache'], 'hit')
+        self.assertEqual(self.client.get(reverse('product_list'))['X-Page-Cache'], 'miss')
+
+    @override_settings(PAGE_CACHE_STALE_SECONDS=60)
+    def test_stale_while_revalidate(self):
+        url = reverse('product_detail', kwargs={'pk': self.product.pk})
+        self.client.get(url)
+        invalidate_product_pages([self.product.pk])
+
+        self.assertEqual(self.client.get(url)['X-Page-Cache'], 'miss')  # this request revalidates
+        invalidate_product_pages([self.product.pk])
+        digest = hashlib.md5(url.encode()).hexdigest()
+        cache.add(f'page-lock:product-detail:{digest}', 1)  # another worker is revalidating
+        self.assertEqual(self.client.get(url)['X-Page-Cache'], 'stale')
+
+
+class ProductBulkUpdateTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin_user = UserFactory(is_staff=True, is_superuser=True)
+        self.product = ProductFactory(price='10.00', stock=5)
+        self.other = ProductFactory(price='20.00', stock=8)
+        self.url = reverse('api-product-bulk-update')
+        self.client.force_authenticate(user=self.admin_user)
+
+    def test_json_rows_apply_with_per_row_errors(self):
+        before = self.product.date_updated
+        rows = [
+            {'id': self.product.pk, 'price': '12.50'},
+            {'slug': self.other.slug, 'stock': 8},
+            {'id': 999999, 'stock': 1},
+            {'id': self.product.pk},
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            resp = self.client.post(self.url, rows, format='json')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual((resp.data['updated'], resp.data['unchanged'], resp.data['errors']), (1, 1, 2))
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.price, Decimal('12.50'))
+        self.assertEqual(self.product.stock, 5)  # a price-only row never touches stock
+        self.assertGreater(self.product.date_updated, before)
+
+    def test_csv_upload_and_dry_run(self):
+        body = f'slug,stock,is_available\n{self.product.slug},0,false\n'
+        resp = self.client.generic('POST', f'{self.url}?dry_run=true', body, content_type='text/csv')
+        self.assertEqual(resp.data['updated'], 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 5)
+
+        self.client.generic('POST', self.url, body, content_type='text/csv')
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.stock, self.product.is_available), (0, False))
+
+    def test_file_uploads_dispatch_on_type_and_reject_bad_files(self):
+        rows = json.dumps([{'id': self.product.pk, 'stock': 7}]).encode()
+        resp = self.client.post(self.url, {'file': SimpleUploadedFile('rows.json', rows)}, format='multipart')
+        self.assertEqual(resp.data['updated'], 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 7)
+
+        for upload in (SimpleUploadedFile('rows.csv', b'slug,stock\n\xff\xfe,1\n'),
+                       SimpleUploadedFile('rows.json', b'{not json')):
+            resp = self.client.post(self.url, {'file': upload}, format='multipart')
+            self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST, upload.name)
+
+    def test_staff_only(self):
+        self.client.force_authenticate(user=UserFactory())
+        resp = self.client.post(self.url, [{'id': self.product.pk, 'stock': 1}], format='json')
+        self.assertEqual(resp.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class InventoryFeedTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = ProductFactory(stock=10)
+        self.other = ProductFactory(stock=4)
+        self.url = reverse('api-inventory-feed')
+        self.client.force_authenticate(user=UserFactory(is_staff=True))
+
+    def _post_feed(self, *lines):
+        body = '\n'.join(line if isinstance(line, str) else json.dumps(line) for line in lines)
+        return self.client.generic('POST', self.url, body, content_type='application/x-ndjson')
+
+    def test_deltas_and_absolute_counts_applied_in_sequence(self):
+        resp = self._post_feed(
+            {'id': self.product.pk, 'seq': 2, 'delta': -3},
+            {'id': self.other.pk, 'seq': 5, 'stock': 40},
+            {'id': self.product.pk, 'seq': 1, 'stock': 100},
+            {'id': self.other.pk, 'seq': 6, 'delta': 2},
+            'not json',
+            {'id': 999999, 'seq': 1, 'delta': 1},
+        )
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual((resp.data['applied'], resp.data['rejected']), (4, 2))
+        self.product.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertEqual((self.product.stock, self.product.stock_sequence), (97, 2))
+        self.assertEqual((self.other.stock, self.other.stock_sequence), (42, 6))
+
+    def test_stale_and_duplicate_sequences_dropped_across_batches(self):
+        self._post_feed({'id': self.product.pk, 'seq': 10, 'delta': -1})
+        report = apply_inventory_feed(
+            [json.dumps({'id': self.product.pk, 'seq': seq, 'delta': -1}) for seq in (10, 9, 11, 11)],
+            batch_size=2,
+        )
+        self.assertEqual((report['applied'], report['stale']), (1, 3))
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 8)
+
+    def test_staff_only(self):
+        self.client.force_authenticate(user=UserFactory())
+        resp = self._post_feed({'id': self.product.pk, 'seq': 1, 'delta': 1})
+        self.assertEqual(resp.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class QueryPlanTests(APITestCase):
+    """
+    Runs EXPLAIN on every SELECT the catalog, cart and order views issue against a seeded database
+    and fails on sequential scans or sorts over the large tables, so a missing index shows up in CI.
+    """
+    LARGE_TABLES = {model._meta.db_table for model in
+                    (Product, Order, OrderItem, CartItem, ArchivedOrder, ArchivedOrderItem, RelatedProduct)}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserFactory()
+        categories = CategoryFactory.create_batch(3)
+        cls.products = [ProductFactory(category=categories[i % 3]) for i in range(30)]
+        for other_user in [cls.user, *UserFactory.create_batch(3)]:
+            orders = Order.objects.bulk_create([Order(user=other_user) for _ in range(10)])
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product=product, quantity=1, price_at_purchase=product.price)
+                for order in orders for product in cls.products[:2]
+            ])
+        CartItem.objects.bulk_create([CartItem(cart=cls.user.cart, product=product) for product in cls.products[:5]])
+        refresh_product_popularity()
+        refresh_recommendations()
+        cls.order = cls.user.orders.first()
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(user=self.user)
+        self.client.force_login(self.user)
+
+    def _unindexed_plans(self, queries):
+        offenders = []
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                # With these disabled, the planner only picks a seq scan or sort when no index can help.
+                cursor.execute('SET LOCAL enable_seqscan = off; SET LOCAL enable_sort = off')
+            for sql in {query['sql'] for query in queries if query['sql'].lstrip().upper().startswith('SELECT')}:
+                plan = self._explain(cursor, sql)
+                if self._is_unindexed(plan):
+                    offenders.append(f'{sql}\n  -> ' + '\n  -> '.join(plan))
+        return offenders
+
+    def _explain(self, cursor, sql):
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return [row[-1] for row in cursor.fetchall()]
+        cursor.execute(f'EXPLAIN {sql}')
+        return [row[0] for row in cursor.fetchall()]
+
+    def _is_unindexed(self, plan):
+        for line in plan:
+            if connection.vendor == 'sqlite':
+                scan = re.match(r'SCAN (\w+)', line)
+                if (scan and scan.group(1) in self.LARGE_TABLES and 'USING' not in line) or 'FOR ORDER BY' in line:
+                    return True
+            else:
+                scan = re.search(r'Seq Scan on (\w+)', line)
+                if (scan and scan.group(1) in self.LARGE_TABLES) or re.search(r'(^|->\s*)(Incremental )?Sort\s', line):
+                    return True
+        return False
+
+    def test_view_queries_use_indexes(self):
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            self.skipTest('Query plans are only checked on SQLite and PostgreSQL.')
+        category = self.products[0].category_id
+        urls = [
+            reverse('api-product-list'),
+            *(f"{reverse('api-product-list')}?ordering={ordering}" for ordering in PRODUCT_ORDERINGS),
+            *(f"{reverse('api-product-list')}?category={category}&ordering={ordering}" for ordering in PRODUCT_ORDERINGS),
+            f"{reverse('api-product-list')}?category={category}&min_price=10&ordering=price",
+            f"{reverse('api-product-facets')}?category={category}",
+            f"{reverse('api-product-top')}?kind=trending",
+            reverse('api-product-detail', kwargs={'pk': self.products[0].pk}),
+            reverse('api-product-related', kwargs={'pk': self.products[0].pk}),
+            reverse('api-cart-detail'),
+            reverse('cartitem-list'),
+            reverse('order-list'),
+            reverse('order-detail', kwargs={'pk': self.order.pk}),
+            reverse('product_list'),
+            f"{reverse('product_list')}?sort=popular&category={category}&in_stock=1",
+            reverse('product_detail', kwargs={'pk': self.products[0].pk}),
+            reverse('cart_detail'),
+            reverse('my_orders'),
+        ]
+        with CaptureQueriesContext(connection) as captured:
+            for url in urls:
+                self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK, url)
+
+        offenders = self._unindexed_plans(captured.captured_queries)
+        self.assertFalse(offenders, 'Queries without index support:\n\n' + '\n\n'.join(offenders))
+
+
+class OrderArchiveTests(APITestCase):
+    def setUp(self):
+        self.user = UserFactory()
+        product = ProductFactory(price='10.00')
+        old = timezone.now() - timedelta(days=400)
+        self.old_orders = OrderFactory.create_batch(3, user=self.user)
+        pending = OrderFactory(user=self.user, is_completed=False)
+        self.recent_orders = OrderFactory.create_batch(2, user=self.user)
+        for order in [*self.old_orders, pending, *self.recent_orders]:
+            OrderItem.objects.create(order=order, product=product, quantity=2, price_at_purchase='10.00')
+        Order.objects.filter(pk__in=[order.pk for order in [*self.old_orders, pending]]).update(date_ordered=old)
+        self.client.force_authenticate(user=self.user)
+
+    def test_only_rolled_up_old_completed_orders_archived(self):
+        self.assertEqual(archive_orders(), 0)  # nothing folded into the sales rollups yet
+
+        refresh_sales_rollups(settle_seconds=0)
+        revenue = DailySales.objects.aggregate(total=Sum('revenue'))['total']
+        self.assertEqual(archive_orders(batch_size=2), 3)
+        self.assertEqual(Order.objects.count(), 3)
+        self.assertEqual(ArchivedOrderItem.objects.filter(order__user=self.user).count(), 3)
+
+        rebuild_sales_rollups(settle_seconds=0)
+        self.assertEqual(DailySales.objects.aggregate(total=Sum('revenue'))['total'], revenue)
+
+    def test_order_history_reads_archive_only_when_paged_that_far(self):
+        refresh_sales_rollups(settle_seconds=0)
+        archive_orders()
+        url = reverse('order-list')
+        self.assertEqual(len(self.client.get(url).data), 6)
+
+        with CaptureQueriesContext(connection) as first_page:
+            resp = self.client.get(url, {'limit': 3})
+        self.assertEqual(resp.data['count'], 6)
+        self.assertFalse(any('"store_archivedorder"."date_archived"' in q['sql'] for q in first_page.captured_queries))
+
+        resp = self.client.get(url, {'limit': 3, 'offset': 3})
+        self.assertEqual({order['id'] for order in resp.data['results']}, {order.pk for order in self.old_orders})
+        self.assertEqual(len(resp.data['results'][0]['items']), 1)
+
+        detail = self.client.get(reverse('order-detail', kwargs={'pk': self.old_orders[0].pk}))
+        self.assertEqual(detail.status_code, status.HTTP_200_OK)
+
+    @override_settings(ORDER_HISTORY_PAGE_SIZE=4)
+    def test_my_orders_page_pages_into_archive(self):
+        refresh_sales_rollups(settle_seconds=0)
+        archive_orders()
+        self.client.force_login(self.user)
+        resp = self.client.get(reverse('my_orders'), {'page': 2})
+        self.assertEqual(len(resp.context['orders']), 2)
+        self.assertContains(resp, f'Order #{self.old_orders[0].pk}')
+
+
+class CartPurgeTests(APITestCase):
+    def test_purges_idle_and_empty_carts_in_chunks(self):
+        idle, empty, recent_empty, active = UserFactory.create_batch(4)
+        CartItemFactory(cart=idle.cart)
+        CartItemFactory(cart=active.cart)
+        old = timezone.now() - timedelta(days=60)
+        Cart.objects.filter(user__in=[idle, empty, active]).update(updated_at=old)
+        CartItemFactory(cart=active.cart)  # adding an item marks the cart active again
+
+        report = purge_stale_carts(chunk_size=1)
+        self.assertEqual((report['carts'], report['items'], report['chunks']), (2, 1, 2))
+        self.assertSetEqual(set(Cart.objects.values_list('user_id', flat=True)), {recent_empty.pk, active.pk})
+        self.assertEqual(active.cart.items.count(), 2)
+
+
+class LazyCartTests(APITestCase):
+    WRITE_RE = re.compile(r'^\s*(INSERT|UPDATE|DELETE)\b', re.IGNORECASE)
+
+    def setUp(self):
+        cache.clear()
+        self.user = UserFactory(cart=None)  # no Cart row yet
+        self.product = ProductFactory(stock=10)
+        self.client.force_login(self.user)
+        self.client.force_authenticate(user=self.user)
+
+    def _writes(self, urls):
+        with CaptureQueriesContext(connection) as captured:
+            for url in urls:
+                self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK, url)
+        return [query['sql'] for query in captured.captured_queries if self.WRITE_RE.match(query['sql'])]
+
+    def test_reads_issue_zero_writes(self):
+        urls = [reverse('product_list'), reverse('product_detail', kwargs={'pk': self.product.pk}),
+                reverse('cart_detail'), reverse('api-cart-detail'), reverse('cartitem-list')]
+        self.assertEqual(self._writes(urls), [])
+        self.assertFalse(Cart.objects.filter(user=self.user).exists())
+        self.assertEqual(self.client.get(reverse('api-cart-detail')).data['items'], [])
+
+        self.client.post(reverse('add_to_cart', kwargs={'product_id': self.product.pk}), {'quantity': 2})
+        self.assertEqual(self.user.cart.items.get().quantity, 2)
+        self.assertEqual(self._writes([*urls, reverse('checkout_page')]), [])
+
+
+class GuestCartTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = ProductFactory(stock=5, price='10.00')
+        self.other = ProductFactory(stock=3)
+
+    def _add(self, product, quantity):
+        return self.client.post(reverse('add_to_cart', kwargs={'product_id': product.pk}), {'quantity': quantity})
+
+    def test_anonymous_cart_lives_in_signed_cookie(self):
+        with CaptureQueriesContext(connection) as captured:
+            self._add(self.product, 2)
+            self._add(self.product, 1)
+            resp = self.client.get(reverse('cart_detail'))
+        self.assertFalse([q for q in captured.captured_queries if re.match(r'\s*(INSERT|UPDATE|DELETE)', q['sql'])])
+        self.assertEqual(resp.context['cart'].get_total_items(), 3)
+        self.assertEqual(resp.context['cart_item_count'], 3)
+
+        self.client.cookies[GUEST_CART_COOKIE] = 'tampered'
+        self.assertEqual(self.client.get(reverse('cart_detail')).context['cart_item_count'], 0)
+
+    def test_guest_cart_merged_on_login_capped_at_stock(self):
+        user = UserFactory(password='s3cret-pass')
+        CartItemFactory(cart=user.cart, product=self.product, quantity=4)
+        self._add(self.product, 2)
+        self._add(self.other, 3)
+
+        resp = self.client.post(reverse('login_page'), {'username': user.username, 'password': 's3cret-pass'})
+        self.assertEqual(resp.status_code, 302)
+        self.assertEqual(resp.cookies[GUEST_CART_COOKIE].value, '')
+        quantities = dict(user.cart.items.values_list('product_id', 'quantity'))
+        self.assertEqual(quantities, {self.product.pk: 5, self.other.pk: 3})
+
+    def test_guest_cart_merge_without_upsert_support(self):
+        with mock.patch.object(type(connection.features), 'supports_update_conflicts_with_target', False):  # as MySQL
+            self.test_guest_cart_merged_on_login_capped_at_stock()
+
+
+class RendererTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = ProductFactory.create_batch(5)
+
+    def test_fast_renderer_matches_drf_except_decimals_as_strings(self):
+        data = {'when': timezone.now(), 'day': timezone.now().date(), 'name': 'caf\u00e9 \u2028', 1: [None, True]}
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(FastJSONRenderer().render({'revenue': Decimal('10.10')}), b'{"revenue":"10.10"}')
+
+    def test_long_lists_are_streamed(self):
+        url = reverse('api-product-list')
+        expected = self.client.get(url).json()
+        self.assertEqual(len(expected), 5)
+        with override_settings(API_STREAM_CHUNK_SIZE=2):
+            resp = self.client.get(url)
+        self.assertTrue(resp.streaming)
+        self.assertEqual(resp['Content-Type'], 'application/json')
+        self.assertEqual(json.loads(b''.join(resp.streaming_content)), expected)
+
+
+class ProductAutocompleteTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.table = ProductFactory(name='Café Table')
+        cls.cable = ProductFactory(name='Cable Box', slug='hdmi-cable-box')
+        cls.camera = ProductFactory(name='Camera')
+        ProductFactory(name='Cabinet', is_available=False)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_prefix_search_served_from_memory(self):
+        url = reverse('api-product-autocomplete')
+        self.client.get(url, {'q': 'ca'})
+        with self.assertNumQueries(0):
+            resp = self.client.get(url, {'q': 'CA'})
+        self.assertEqual([p['id'] for p in resp.data], [self.cable.id, self.table.id, self.camera.id])
+        self.assertEqual(resp.data[1], {'id': self.table.id, 'name': 'Café Table'})
+        self.assertEqual([p['id'] for p in self.client.get(url, {'q': 'cafe t'}).data], [self.table.id])
+        self.assertEqual([p['id'] for p in self.client.get(url, {'q': 'hdmi'}).data], [self.cable.id])
+        self.assertEqual(self.client.get(url, {'q': ' '}).data, [])
+
+    def test_workers_catch_up_from_shared_change_log(self):
+        worker, other_worker = ProductAutocomplete(), ProductAutocomplete()
+        worker.sync()
+        other_worker.sync()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.camera.name = 'Zoom Lens'
+            self.camera.save()
+            self.table.delete()
+            bulk_update_products([{'id': self.cable.id, 'is_available': 'false'}])
+
+        with self.assertNumQueries(1):  # the changed products only
+            self.assertEqual(other_worker.search('zoom', 10), [{'id': self.camera.id, 'name': 'Zoom Lens'}])
+        # Renaming keeps the slug, so the product still matches on it.
+        self.assertEqual(other_worker.search('ca', 10), [{'id': self.camera.id, 'name': 'Zoom Lens'}])
+        self.assertEqual(worker.search('z', 10), other_worker.search('z', 10))
+
+
+class RecommendationTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserFactory()
+        cls.camera, cls.lens, cls.tripod, cls.bag, cls.mug = ProductFactory.create_batch(5)
+        baskets = [
+            [cls.camera, cls.lens, cls.tripod], [cls.camera, cls.lens], [cls.camera, cls.lens, cls.bag],
+            [cls.camera, cls.tripod], [cls.mug], [cls.camera, cls.lens, cls.tripod, cls.bag, cls.mug],
+        ]
+        for basket in baskets:
+            order = Order.objects.create(user=cls.user)
+            OrderItem.objects.bulk_create([OrderItem(order=order, product=product, quantity=1,
+                                                     price_at_purchase=product.price) for product in basket])
+
+    def setUp(self):
+        cache.clear()
+
+    @override_settings(RECOMMENDATIONS_MAX_ORDER_ITEMS=4)
+    def test_top_k_ranked_by_co_purchases(self):
+        self.assertEqual(refresh_recommendations(top_k=2, chunk_size=2), 4)
+        ranked = list(RelatedProduct.objects.filter(product=self.camera).values_list('related_id', 'order_count'))
+        self.assertEqual(ranked, [(self.lens.id, 3), (self.tripod.id, 2)])
+        self.assertFalse(RelatedProduct.objects.filter(product=self.mug).exists())  # only in the skipped big order
+
+    def test_related_products_read_with_one_query(self):
+        refresh_recommendations()
+        self.lens.is_available = False
+        self.lens.save()
+        url = reverse('api-product-related', kwargs={'pk': self.camera.pk})
+        with self.assertNumQueries(1):
+            resp = self.client.get(url)
+        self.assertEqual([p['id'] for p in resp.data], [self.tripod.id, self.bag.id, self.mug.id])
+        resp = self.client.get(reverse('product_detail', kwargs={'pk': self.camera.pk}))
+        self.assertContains(resp, 'Frequently Bought Together')
+        self.assertContains(resp, reverse('product_detail', kwargs={'pk': self.tripod.pk}))
+
+
+@override_settings(STRIPE_WEBHOOK_SECRET='whsec_test')
+class StripeWebhookTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.order = OrderFactory(user=UserFactory(), total_amount=Decimal('25.50'), is_completed=False)
+        cls.other_order = OrderFactory(user=UserFactory(), total_amount=Decimal('10.00'), is_completed=False)
+
+    def _post(self, event, secret='whsec_test'):
+        payload = json.dumps(event)
+        return self.client.post(reverse('api-stripe-webhook'), payload, content_type='application/json',
+                                HTTP_STRIPE_SIGNATURE=sign_stripe_payload(payload, secret))
+
+    def _payment(self, event_id, order, amount):
+        return {'id': event_id, 'type': 'payment_intent.succeeded', 'data': {'object': {
+            'id': f'pi_{event_id}', 'amount_received': amount, 'metadata': {'order_id': str(order.pk)}}}}
+
+    def test_rejects_bad_signature(self):
+        resp = self._post(self._payment('evt_1', self.order, 2550), secret='whsec_wrong')
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(StripeEvent.objects.exists())
+
+    def test_events_deduplicated_and_applied_in_batches(self):
+        event = self._payment('evt_1', self.order, 2550)
+        for _ in range(2):  # Stripe retries deliver the same event id again
+            self.assertEqual(self._post(event).status_code, status.HTTP_200_OK)
+        self._post(self._payment('evt_2', self.other_order, 999))
+        self._post({'id': 'evt_3', 'type': 'charge.succeeded', 'data': {'object': {}}})
+        self.order.refresh_from_db()
+        self.assertFalse(self.order.is_completed)  # acknowledged, not yet applied
+
+        report = process_stripe_events(batch_size=2)
+        self.assertEqual(report, {'events': 3, 'orders_completed': 1, 'errors': 1, 'batches': 2})
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.is_completed, self.order.transaction_id), (True, 'pi_evt_1'))
+        self.assertIn('does not match', StripeEvent.objects.get(event_id='evt_2').error)
+        self.assertFalse(StripeEvent.objects.filter(processed_at__isnull=True).exists())
+
+
+class SeedDataTests(APITestCase):
+    def test_seeds_consistent_reproducible_data(self):
+        seed_data(users=20, products=60, orders=150, seed=7)
+        self.assertEqual((User.objects.count(), Product.objects.count(), Order.objects.count()), (20, 60, 150))
+        self.assertTrue(Category.objects.filter(parent__isnull=False, products__isnull=False).exists())
+        totals = {order.pk: order.total_amount for order in Order.objects.all()}
+        for order_id, total in OrderItem.objects.values('order_id').annotate(
+                total=Sum(F('quantity') * F('price_at_purchase'))).values_list('order_id', 'total'):
+            self.assertEqual(Decimal(total).quantize(Decimal('0.01')), totals[order_id])
+        self.assertTrue(User.objects.first().check_password('password'))
+
+        first_names = list(Product.objects.order_by('pk').values_list('name', 'price'))
+        seed_data(products=60, seed=7, chunk_size=1)
+        self.assertEqual(list(Product.objects.order_by('pk').values_list('name', 'price')[60:]), first_names)
+
+
+@override_settings(METRICS_TOKEN='scrape-secret')
+class MetricsTests(APITestCase):
+    def _scrape(self):
+        resp = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape-secret')
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        return dict(line.rsplit(' ', 1) for line in resp.content.decode().splitlines() if not line.startswith('#'))
+
+    def test_records_requests_checkouts_and_cart_changes(self):
+        user = UserFactory()
+        product = ProductFactory(stock=1)
+        self.client.force_authenticate(user=user)
+        before = self._scrape()
+        self.client.get(reverse('api-product-list'))
+        self.client.post(reverse('order-create'), {'address': 'a', 'city': 'b', 'postal_code': 'c', 'country': 'd'})
+        self.client.post(reverse('cartitem-list'), {'product_id': product.pk, 'quantity': 1})
+        self.client.post(reverse('cartitem-list'), {'product_id': product.pk, 'quantity': 1})
+        after = self._scrape()
+
+        def delta(sample):
+            return float(after.get(sample, 0)) - float(before.get(sample, 0))
+        self.assertEqual(delta('store_http_requests_total{route="api-product-list",method="GET",status="200"}'), 1)
+        self.assertEqual(delta('store_http_request_duration_seconds_count{route="api-product-list",method="GET"}'), 1)
+        self.assertEqual(delta('store_http_request_duration_seconds_bucket{route="api-product-list",method="GET",le="+Inf"}'), 1)
+        self.assertEqual(delta('store_checkouts_total{outcome="empty_cart"}'), 1)
+        self.assertEqual(delta('store_cart_mutations_total{cart="user",action="add"}'), 1)
+        self.assertEqual(delta('store_stock_conflicts_total{source="cart"}'), 1)
+
+    def test_worker_files_are_summed_and_token_required(self):
+        self.assertEqual(self.client.get('/metrics').status_code, status.HTTP_401_UNAUTHORIZED)
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            metrics._forget_values()
+            try:
+                metrics.CHECKOUTS.labels('success').inc(2)
+                pid = os.fork()
+                if pid == 0:  # a second worker process writing to its own file
+                    metrics.CHECKOUTS.labels('success').inc(3)
+                    os._exit(0)
+                os.waitpid(pid, 0)
+                self.assertEqual(len(os.listdir(directory)), 2)
+                resp = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape-secret')
+                # The exited worker's file was folded into this process's one.
+                self.assertEqual(os.listdir(directory), [f'{os.getpid()}.metrics'])
+                again = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape-secret')
+            finally:
+                metrics._forget_values()
+        self.assertIn('store_checkouts_total{outcome="success"} 5\n', resp.content.decode())
+        self.assertIn('store_checkouts_total{outcome="success"} 5\n', again.content.decode())
+
+    @override_settings(METRICS_TOKEN=None)
+    def test_scrapes_without_token_limited_to_staff(self):
+        # A public request proxied by a server on the same host arrives from localhost.
+        proxied = {'REMOTE_ADDR': '127.0.0.1', 'HTTP_X_FORWARDED_FOR': '203.0.113.9'}
+        self.assertEqual(self.client.get('/metrics', **proxied).status_code, status.HTTP_403_FORBIDDEN)
+        self.client.force_login(UserFactory())
+        self.assertEqual(self.client.get('/metrics').status_code, status.HTTP_403_FORBIDDEN)
+        self.client.force_login(UserFactory(is_staff=True))
+        self.assertEqual(self.client.get('/metrics').status_code, status.HTTP_200_OK)
+
+
+class QueryInspectionTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = UserFactory()
+        for product in ProductFactory.create_batch(4, stock=5):  # each in its own category
+            CartItem.objects.create(cart=cls.user.cart, product=product, quantity=1)
+
+    def test_repeated_and_slow_queries_are_attributed(self):
+        with self.assertLogs('store.queries', 'WARNING') as logs:
+            with inspect_queries('test', repeat_threshold=3, slow_query_ms=0):
+                ProductSerializer(Product.objects.order_by('pk'), many=True).data
+            with inspect_queries('test', repeat_threshold=0, slow_query_ms=1e-9):
+                Product.objects.count()
+        repeated, slow = logs.output
+        self.assertIn('Repeated query (4x) in test from store/tests.py:', repeated)
+        self.assertIn('serializer field ProductSerializer.category_name', repeated)
+        self.assertIn('WHERE "store_category"."id" = ?', repeated)
+        self.assertIn('Slow query', slow)
+
+    @override_settings(QUERY_REPEAT_THRESHOLD=3, QUERY_REPEAT_ACTION='raise')
+    def test_catalog_and_cart_views_issue_no_repeated_queries(self):
+        self.client.force_login(self.user)
+        self.client.force_authenticate(user=self.user)
+        for url in [reverse('api-product-list'), reverse('cart_detail'), reverse('checkout_page'),
+                    reverse('api-cart-detail'), reverse('cartitem-list'), reverse('product_list')]:
+            self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK, url)
+
+
+class WorkerStartupTests(APITestCase):
+    def test_loading_every_view_does_not_import_heavy_sdks(self):
+        code = ("import sys, django; django.setup(); from store.warmup import compile_url_patterns; "
+                "compile_url_patterns(); print(sorted({'stripe', 'PIL'} & set(sys.modules)))")
+        result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                                env={**os.environ, 'DJANGO_SETTINGS_MODULE': 'ecommerce_store.settings'})
+        self.assertEqual(result.stdout.strip(), '[]')
+
+    def test_wsgi_import_scans_the_catalog_only_with_warmup_and_leaves_no_connection_open(self):
+        code = ("from ecommerce_store.wsgi import application; from django.db import connection; "
+                "from store.autocomplete import product_autocomplete; "
+                "print(product_autocomplete.version is not None, connection.connection is None)")
+        for warmup, built in (('False', 'False'), ('True', 'True')):
+            directory = tempfile.mkdtemp()
+            subprocess.run([sys.executable, 'manage.py', 'migrate', '-v', '0'], check=True, capture_output=True,
+                           env={**os.environ, 'DB_ENGINE': 'django.db.backends.sqlite3',
+                                'DB_NAME': os.path.join(directory, 'db.sqlite3')})
+            result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                                    env={**os.environ, 'DJANGO_SETTINGS_MODULE': 'ecommerce_store.settings',
+                                         'DB_ENGINE': 'django.db.backends.sqlite3', 'WORKER_WARMUP': warmup,
+                                         'DB_NAME': os.path.join(directory, 'db.sqlite3')})
+            self.assertEqual(result.stdout.split(), [built, 'True'])
+
+    def test_warmup_compiles_url_patterns_and_templates(self):
+        self.assertGreater(compile_url_patterns(), 50)
+        self.assertGreaterEqual(compile_templates(), 10)
+
+
+class FlashSaleTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = ProductFactory(stock=3, is_flash_sale=True)
+        self.address = {'address': 'a', 'city': 'b', 'postal_code': 'c', 'country': 'd'}
+
+    def _checkout(self, quantity):
+        user = UserFactory()
+        CartItemFactory(cart=user.cart, product=self.product, quantity=quantity)
+        self.client.force_authenticate(user=user)
+        return self.client.post(reverse('order-create'), self.address, format='json')
+
+    def test_checkouts_never_oversell_and_flush_folds_sales_into_stock(self):
+        statuses = [self._checkout(1).status_code for _ in range(5)]
+        self.assertEqual(statuses.count(status.HTTP_201_CREATED), 3)
+        self.assertEqual(PendingStockDecrement.objects.count(), 3)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 3)  # untouched until the flush
+
+        with self.captureOnCommitCallbacks(execute=True):
+            report = flush_flash_stock(batch_size=2)
+        self.assertEqual((report['decrements'], report['batches']), (3, 2))
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 0)
+        self.assertFalse(PendingStockDecrement.objects.exists())
+        self.assertEqual(self._checkout(1).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_restock_pauses_checkouts_then_reloads_the_counter(self):
+        self.assertEqual(self._checkout(2).status_code, status.HTTP_201_CREATED)
+        with self.captureOnCommitCallbacks(execute=True):
+            apply_inventory_feed([json.dumps({'id': self.product.pk, 'seq': 1, 'delta': 10})])
+        resp = self._checkout(1)
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('restocked', str(resp.data))
+
+        with override_settings(FLASH_SALE_PAUSE_SECONDS=0):
+            self.assertEqual(reconcile_flash_stock(), {self.product.pk: (None, 11)})
+        self.assertEqual(self._checkout(11).status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self._checkout(1).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_counter_dropped_while_loading_turns_checkout_away(self):
+        real_add = cache.add
+
+        def add_then_reset(key, *args, **kwargs):
+            added = real_add(key, *args, **kwargs)
+            cache.delete(key)  # a reset_flash_stock() landing between the load and the decrement
+            return added
+
+        with mock.patch.object(cache, 'add', side_effect=add_then_reset):
+            resp = self._checkout(1)
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(PendingStockDecrement.objects.exists())
+
+
+class CheckoutBatchingTests(APITestCase):
+    def test_batch_commits_in_constant_queries_and_rejects_only_the_oversold_checkout(self):
+        product, other = ProductFactory(stock=5, price=Decimal('10.00')), ProductFactory(stock=50)
+        checkouts = []
+        for quantity in (4, 2, 1):
+            user = UserFactory()
+            items = [CartItemFactory(cart=user.cart, product=product, quantity=quantity),
+                     CartItemFactory(cart=user.cart, product=other, quantity=1)]
+            checkouts.append(build_checkout(user, items, {'city': 'Testville'}))
+
+        with self.assertNumQueries(7):  # savepoint, lock, 2 inserts, stock update, cart delete, release
+            results = commit_checkouts(checkouts)
+        self.assertIsInstance(results[1], CheckoutRejected)
+        self.assertEqual([result.total_amount for result in results if isinstance(result, Order)],
+                         [Decimal('40.00') + other.price, Decimal('10.00') + other.price])
+        product.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual((product.stock, other.stock), (0, 48))
+        self.assertEqual(OrderItem.objects.count(), 4)
+        self.assertEqual(CartItem.objects.count(), 2)  # the rejected checkout keeps its cart
+
+    def test_orders_get_ids_where_bulk_inserts_return_none(self):
+        product = ProductFactory(stock=5)
+        checkouts = []
+        for _ in range(2):
+            user = UserFactory()
+            checkouts.append(build_checkout(user, [CartItemFactory(cart=user.cart, product=product, quantity=1)],
+                                            {'city': 'Testville'}))
+
+        with mock.patch.object(type(connection.features), 'can_return_rows_from_bulk_insert', False):  # as MySQL
+            results = commit_checkouts(checkouts)
+        self.assertTrue(all(isinstance(result, Order) and result.pk for result in results))
+        self.assertEqual(sorted(OrderItem.objects.values_list('order_id', flat=True)),
+                         sorted(result.pk for result in results))
+
+    def test_micro_batcher_groups_concurrent_submissions_and_returns_each_result(self):
+        batch_sizes = []
+
+        def handler(items):
+            batch_sizes.append(len(items))
+            return [ValueError(item) if item < 0 else item * 2 for item in items]
+
+        batcher = MicroBatcher(handler, max_size=4, max_wait=0.05)
+        futures = [None] * 10
+        threads = [threading.Thread(target=lambda i=i: futures.__setitem__(i, batcher.submit(i if i != 3 else -3)))
+                   for i in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        results = [future.result(timeout=5) for i, future in enumerate(futures) if i != 3]
+        self.assertEqual(results, [i * 2 for i in range(10) if i != 3])
+        with self.assertRaises(ValueError):
+            futures[3].result(timeout=5)
+        self.assertEqual(sum(batch_sizes), 10)
+        self.assertLessEqual(max(batch_sizes), 4)
+        self.assertLess(len(batch_sizes), 10)
+
+    @override_settings(CHECKOUT_BATCHING=True, CHECKOUT_BATCH_TIMEOUT_SECONDS=0.5)
+    def test_checkout_stops_waiting_for_a_stuck_batcher(self):
+        checkout = build_checkout(UserFactory(), [], {'city': 'Testville'})
+        stuck, handled = threading.Event(), []
+
+        def handler(items):
+            stuck.wait(5)
+            handled.extend(items)
+            return items
+
+        busy, idle = MicroBatcher(handler, max_size=1, max_wait=0), MicroBatcher(handler, max_size=1, max_wait=0)
+        busy.submit('stuck batch')
+        # As outside a request's transaction; the inline commit is stubbed out.
+        with mock.patch.object(connection, 'in_atomic_block', False), \
+                mock.patch('store.checkout.commit_checkouts', return_value=['committed inline']):
+            # Queued behind a stuck batch: withdrawn and committed here instead.
+            with mock.patch('store.checkout.get_checkout_batcher', return_value=busy):
+                self.assertEqual(place_checkout(checkout), 'committed inline')
+            # Its own batch is stuck committing: it may still go through, so it is not retried.
+            with mock.patch('store.checkout.get_checkout_batcher', return_value=idle), \
+                    self.assertRaises(CheckoutTimedOut):
+                place_checkout(checkout._replace(user_id=None))
+        stuck.set()
+        time.sleep(0.1)
+        self.assertCountEqual(handled, ['stuck batch', checkout._replace(user_id=None)])  # never the withdrawn one
+
+
+class UserShardingTests(APITestCase):
+    # Runs in a subprocess: the test database has a single shard, and DATABASES is fixed at startup.
+    SCENARIO = """
+import json, django
+django.setup()
+from django.conf import settings
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework.test import APIClient
+from store.analytics import refresh_sales_rollups
+from store.factories import ProductFactory, UserFactory
+from store.models import DailySales, Order, User
+from store.sharding import SHARD_ID_BLOCK, reshard_users
+
+for alias in settings.USER_SHARD_ALIASES:
+    call_command('migrate', database=alias, verbosity=0)
+product = ProductFactory(stock=100)
+client, placed = APIClient(), {}
+for user in UserFactory.create_batch(9):
+    client.force_authenticate(User.objects.get(pk=user.pk))
+    client.post(reverse('cartitem-list'), {'product_id': product.pk, 'quantity': 1}, format='json')
+    order = client.post(reverse('order-create'), {'city': 'Shardville'}, format='json').json()
+    client.post(reverse('api-confirm-order-payment'), {'order_id': order['id']}, format='json')
+    db = next(alias for alias in settings.USER_SHARD_ALIASES
+              if Order.objects.using(alias).filter(pk=order['id']).exists())
+    placed[user.pk] = (db, order['id'])
+refresh_sales_rollups(settle_seconds=0)
+moved = min(placed)
+reshard_users([moved], target='shard_2', grace_seconds=0)
+user = User.objects.get(pk=moved)
+client.force_authenticate(user)
+listed = [order['id'] for order in client.get(reverse('order-list')).json()]
+refresh_sales_rollups(settle_seconds=0)
+print(json.dumps({
+    'placed': list(placed.values()), 'block': SHARD_ID_BLOCK, 'aliases': settings.USER_SHARD_ALIASES,
+    'moved': [user.shard, placed[moved][1], listed], 'units': DailySales.objects.get().units,
+    'back_home': reshard_users(grace_seconds=0)['users'], 'stock': type(product).objects.get().stock,
+}))
+"""
+
+    def test_orders_land_on_the_users_shard_and_survive_a_move(self):
+        directory = tempfile.mkdtemp()
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': 'ecommerce_store.settings', 'USER_SHARDS': '3',
+               'DB_ENGINE': 'django.db.backends.sqlite3', 'DB_NAME': os.path.join(directory, 'shards.sqlite3'),
+               'DJANGO_ALLOWED_HOSTS': 'testserver'}
+        result = subprocess.run([sys.executable, '-c', self.SCENARIO], capture_output=True, text=True, check=True,
+                                env=env)
+        report = json.loads(result.stdout)
+        self.assertEqual(len({db for db, _ in report['placed']}), 3)  # nine users spread over all three
+        for db, order_id in report['placed']:
+            self.assertEqual(order_id // report['block'], report['aliases'].index(db))
+        shard, order_id, listed = report['moved']
+        self.assertEqual(shard, 'shard_2')
+        self.assertEqual(listed, [order_id])  # same id, read from the new shard
+        self.assertEqual((report['units'], report['stock']), (9, 91))  # the moved order is not counted twice
+        self.assertEqual(report['back_home'], 0 if report['placed'][0][0] == 'shard_2' else 1)
@@ -0,0 +1,106 @@
+# store/throttling.py
+
+# --- Django & Python Imports ---
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+# --- Third-Party Imports ---
+from rest_framework.throttling import BaseThrottle
+
+THROTTLE_CACHE_KEY = 'throttle:{group}:{ident}'
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+BUCKET_TTL_PERIODS = 10
+
+
+# =============================================================================
+# --- Token Bucket (GCRA) ---
+# =============================================================================
+
+def parse_rate(rate):
+    """Parses a '<capacity>/<period>' rate such as '20/min' into (capacity, period_in_seconds)."""
+    capacity, period = rate.split('/')
+    return int(capacity), PERIODS[period[0]]
+
+
+def consume(key, capacity, period, now=None):
+    """
+    Takes one token from the bucket stored under `key`. Returns (allowed, retry_after_seconds).
+
+    The bucket holds `capacity` tokens and refills at capacity/period tokens per second.
+    It is stored as a single integer, the "theoretical arrival time" of the generic cell rate
+    algorithm (in microseconds), so every request is one atomic cache increment: no reads,
+    no locks and no database writes. A rejected request hands its token straight back.
+    """
+    now = int((time.time() if now is None else now) * 1_000_000)
+    interval = max(1, period * 1_000_000 // capacity)
+    burst = capacity * interval
+    # incr() keeps the original expiry, so entries live well beyond one refill period;
+    # a bucket that expires while partly drained merely restarts full.
+    timeout = period * BUCKET_TTL_PERIODS
+
+    try:
+        tat = cache.incr(key, interval)
+    except ValueError:  # no bucket yet (or evicted): it starts full
+        cache.add(key, now + interval, timeout=timeout)
+        return True, 0
+
+    if tat - interval < now:
+        # The bucket had refilled completely; restart it from the current time. Concurrent
+        # requests in this window may overwrite each other, which can only ever grant tokens.
+        cache.set(key, now + interval, timeout=timeout)
+        return True, 0
+    if tat - now > burst:
+        cache.decr(key, interval)
+        cache.touch(key, timeout)
+        return False, (tat - now - burst) / 1_000_000
+    return True, 0
+
+
+# =============================================================================
+# --- Route Groups & Identities ---
+# =============================================================================
+
+def get_throttle_group(request):
+    """Maps the resolved URL name to its THROTTLE_ROUTE_GROUPS group, falling back to 'default'."""
+    match = getattr(request, 'resolver_match', None)
+    url_name = match.view_name if match else None
+    return settings.THROTTLE_ROUTE_GROUPS.get(url_name, 'default')
+
+
+def throttle_request(request, user=None, group=None):
+    """
+    Applies the token bucket for the request's route group, keyed on the user id when
+    authenticated and on the client IP otherwise. Returns (allowed, retry_after_seconds).
+    """
+    group = group or get_throttle_group(request)
+    rate = settings.THROTTLE_RATES.get(group)
+    if rate is None:
+        return True, 0
+
+    user = user if user is not None else getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        ident = f'user-{user.pk}'
+    else:
+        ident = f'ip-{BaseThrottle().get_ident(request)}'
+    capacity, period = parse_rate(rate)
+    return consume(THROTTLE_CACHE_KEY.format(group=group, ident=ident), capacity, period)
+
+
+# =============================================================================
+# --- DRF Throttle Class ---
+# =============================================================================
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    DRF throttle backed by the shared-cache token buckets. Runs after DRF authentication,
+    so JWT-authenticated clients are limited per user rather than per IP.
+    """
+
+    def allow_request(self, request, view):
+        allowed, self.retry_after = throttle_request(request, user=request.user)
+        return allowed
+
+    def wait(self):
+        return self.retry_after
@@ -15,6 +15,7 @@ urlpatterns = [
     path('cart/', views.cart_detail, name='cart_detail'),
     path('cart/add/<int:product_id>/', views.add_to_cart, name='add_to_cart'),
     path('cart/item/update/<int:item_id>/', views.update_cart_item, name='update_cart_item'),
+    path('cart/guest/update/<int:product_id>/', views.update_guest_cart_item, name='update_guest_cart_item'),
     path('cart/item/remove/<int:item_id>/', views.remove_from_cart, name='remove_from_cart'),
 
     # --- Checkout & Order URLs ---
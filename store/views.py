@@ -1,8 +1,13 @@
 # store/views.py
 
 # --- Django & Python Imports ---
+import hmac
+import time
+
 from django.shortcuts import render, get_object_or_404, redirect
 from django.conf import settings
+from django.core.paginator import Paginator
+from django.http import Http404, HttpResponse
 from django.views.decorators.http import require_POST
 from django.contrib import messages
 from django.contrib.auth import logout, login, authenticate
@@ -10,19 +15,40 @@ from django.contrib.auth.decorators import login_required
 from django.utils import timezone
 
 # --- Third-Party Imports ---
-import stripe
 from rest_framework import permissions, viewsets, status, serializers, generics
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.parsers import JSONParser, MultiPartParser
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
 # --- Local Application Imports ---
+from .analytics import fold_in_late_completions, sales_report
+from .archive import OrderHistory, get_user_order
+from .autocomplete import product_autocomplete
+from .authentication import ClaimsJWTAuthentication
+from .bulk import bulk_update_products, read_upload_rows
+from .carts import (
+    GUEST_CART_COOKIE, GuestCart, get_cart, merge_guest_cart, read_guest_cart, write_guest_cart
+)
+from .facets import filter_products, get_product_facets
 from .forms import CustomAuthenticationForm, OrderAddressForm, CustomUserCreationForm
-from .models import User, Category, Product, Cart, CartItem, Order, OrderItem
+from .inventory import apply_inventory_feed
+from .metrics import CART_MUTATIONS, CHECKOUTS, STOCK_CONFLICTS, STRIPE_REQUEST_DURATION, render_metrics
+from .models import User, Category, Product, Cart, CartItem, Order, OrderItem, PRODUCT_ORDERINGS
+from .page_cache import anonymous_page_cache, product_list_scope, product_detail_scope
+from .parsers import CSVParser
+from .payments import get_stripe, store_stripe_event, verify_stripe_event
 from .permissions import IsAdminOrReadOnly
+from .popularity import get_top_products, SCORE_FIELDS
+from .recommendations import get_related_products
+from .renderers import StreamingListMixin
 from .serializers import (
     UserSerializer, CategorySerializer, ProductSerializer, UserRegistrationSerializer,
     CartSerializer, CartItemSerializer, CartItemCreateUpdateSerializer,
-    OrderCreateSerializer, OrderSerializer, PaymentIntentCreateSerializer
+    OrderCreateSerializer, OrderSerializer, PaymentIntentCreateSerializer, SalesReportQuerySerializer,
+    ProductFilterSerializer
 )
+from .sharding import join_catalog, shard_and_catalog_atomic, user_db
 
 
 # =============================================================================
@@ -37,7 +63,7 @@ class UserRegistrationView(generics.CreateAPIView):
     serializer_class = UserRegistrationSerializer
 
 
-class UserList(generics.ListAPIView):
+class UserList(StreamingListMixin, generics.ListAPIView):
     """API endpoint to list all users. For admin use only."""
     queryset = User.objects.all()
     serializer_class = UserSerializer
@@ -57,6 +83,7 @@ class CategoryListCreate(generics.ListCreateAPIView):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [IsAdminOrReadOnly]
+    authentication_classes = [ClaimsJWTAuthentication]
 
 
 class CategoryDetail(generics.RetrieveUpdateDestroyAPIView):
@@ -64,14 +91,74 @@ class CategoryDetail(generics.RetrieveUpdateDestroyAPIView):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [IsAdminOrReadOnly]
+    authentication_classes = [ClaimsJWTAuthentication]
 
 
 # --- Product API Views ---
-class ProductListCreate(generics.ListCreateAPIView):
-    """API endpoint to list all available products or create a new one."""
-    queryset = Product.objects.filter(is_available=True)
+class ProductListCreate(StreamingListMixin, generics.ListCreateAPIView):
+    """
+    API endpoint to list all available products or create a new one.
+    Supports the ProductFilterSerializer filters and `?ordering=` with any key of
+    PRODUCT_ORDERINGS (e.g. `popular`, `trending`).
+    """
+    queryset = Product.objects.filter(is_available=True).select_related('category')
     serializer_class = ProductSerializer
     permission_classes = [IsAdminOrReadOnly]
+    authentication_classes = [ClaimsJWTAuthentication]
+
+    def get_queryset(self):
+        filters = ProductFilterSerializer(data=self.request.query_params)
+        filters.is_valid(raise_exception=True)
+        queryset = filter_products(super().get_queryset(), filters.validated_data)
+        ordering = PRODUCT_ORDERINGS.get(self.request.query_params.get('ordering'))
+        return queryset.order_by(*ordering) if ordering else queryset
+
+
+class ProductFacetsView(generics.GenericAPIView):
+    """API endpoint returning facet counts (category, price range, stock) for the given product filters."""
+    serializer_class = ProductFilterSerializer
+    permission_classes = [permissions.AllowAny]
+    authentication_classes = [ClaimsJWTAuthentication]
+
+    def get(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return Response(get_product_facets(serializer.validated_data))
+
+
+class ProductAutocompleteView(APIView):
+    """
+    API endpoint for search-as-you-type: up to AUTOCOMPLETE_LIMIT available products whose name
+    or slug starts with `?q=`, served from the in-process index without a database query.
+    """
+    permission_classes = [permissions.AllowAny]
+    authentication_classes = [ClaimsJWTAuthentication]
+
+    def get(self, request, *args, **kwargs):
+        return Response(product_autocomplete.search(request.query_params.get('q', ''), settings.AUTOCOMPLETE_LIMIT))
+
+
+class TopProductsView(generics.ListAPIView):
+    """API endpoint for the cached best-seller (`?kind=popular`) or trending (`?kind=trending`) list."""
+    serializer_class = ProductSerializer
+    permission_classes = [permissions.AllowAny]
+    authentication_classes = [ClaimsJWTAuthentication]
+
+    def get_queryset(self):
+        kind = self.request.query_params.get('kind', 'popular')
+        if kind not in SCORE_FIELDS:
+            raise serializers.ValidationError({'kind': f"Must be one of: {', '.join(SCORE_FIELDS)}."})
+        return get_top_products(kind)
+
+
+class RelatedProductsView(generics.ListAPIView):
+    """API endpoint for the products most often bought together with product `pk` (see refresh_recommendations)."""
+    serializer_class = ProductSerializer
+    permission_classes = [permissions.AllowAny]
+    authentication_classes = [ClaimsJWTAuthentication]
+
+    def get_queryset(self):
+        return get_related_products(self.kwargs['pk'])
 
 
 class ProductDetail(generics.RetrieveUpdateDestroyAPIView):
@@ -79,17 +166,52 @@ class ProductDetail(generics.RetrieveUpdateDestroyAPIView):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
     permission_classes = [IsAdminOrReadOnly]
+    authentication_classes = [ClaimsJWTAuthentication]
+
+
+class ProductBulkUpdateView(generics.GenericAPIView):
+    """
+    Staff API endpoint to update price, stock and availability for many products at once.
+    Accepts a JSON list of rows, a `text/csv` body, or a multipart CSV or JSON upload in the `file` field;
+    `?dry_run=true` validates and reports without writing.
+    """
+    permission_classes = [permissions.IsAdminUser]
+    parser_classes = [JSONParser, CSVParser, MultiPartParser]
+
+    def post(self, request, *args, **kwargs):
+        if 'file' in request.FILES:
+            try:
+                rows = read_upload_rows(request.FILES['file'])
+            except ValueError as exc:
+                raise serializers.ValidationError({'detail': str(exc)})
+        else:
+            rows = request.data
+        if not isinstance(rows, list):
+            raise serializers.ValidationError({'detail': "Expected a list of rows or a CSV file."})
+        dry_run = request.query_params.get('dry_run', '').lower() in ('1', 'true', 'yes')
+        return Response(bulk_update_products(rows, dry_run=dry_run))
+
+
+class InventoryFeedView(APIView):
+    """
+    Staff API endpoint for warehouse feeds: applies a streamed NDJSON body of stock changes
+    (one `{"id", "seq", "delta" | "stock"}` object per line) and reports applied and rejected
+    counts. The body is read line by line and never parsed as a whole.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def post(self, request, *args, **kwargs):
+        return Response(apply_inventory_feed(request.stream or ()))
 
 
 # --- Cart API Views ---
 class CartDetailView(generics.RetrieveAPIView):
-    """API endpoint to retrieve the current authenticated user's cart."""
+    """API endpoint to retrieve the current authenticated user's cart (an empty one if none exists yet)."""
     serializer_class = CartSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_object(self):
-        cart, _ = Cart.objects.get_or_create(user=self.request.user)
-        return cart
+        return get_cart(self.request.user)
 
 
 class CartItemViewSet(viewsets.ModelViewSet):
@@ -97,8 +219,8 @@ class CartItemViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        cart, _ = Cart.objects.get_or_create(user=self.request.user)
-        return CartItem.objects.filter(cart=cart)
+        return join_catalog(CartItem.objects.using(user_db(self.request.user))
+                            .filter(cart__user=self.request.user), 'product')
 
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']:
@@ -109,11 +231,12 @@ class CartItemViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        cart, _ = Cart.objects.get_or_create(user=request.user)
+        db = user_db(request.user)
+        cart, _ = Cart.objects.using(db).get_or_create(user=request.user)
         product = get_object_or_404(Product, pk=serializer.validated_data['product_id'])
         quantity_to_add = serializer.validated_data['quantity']
 
-        cart_item, created = CartItem.objects.get_or_create(
+        cart_item, created = CartItem.objects.using(db).get_or_create(
             cart=cart,
             product=product,
             defaults={'quantity': 0}
@@ -121,6 +244,7 @@ class CartItemViewSet(viewsets.ModelViewSet):
 
         prospective_total = cart_item.quantity + quantity_to_add
         if prospective_total > product.stock:
+            STOCK_CONFLICTS.labels('cart').inc()
             raise serializers.ValidationError({
                 'detail': f"Cannot add {quantity_to_add} item(s). Only {product.stock} available."
             })
@@ -130,12 +254,21 @@ class CartItemViewSet(viewsets.ModelViewSet):
         else:
             cart_item.quantity += quantity_to_add
         cart_item.save()
+        CART_MUTATIONS.labels('user', 'add').inc()
 
         display_serializer = CartItemSerializer(cart_item, context={'request': request})
         headers = self.get_success_headers(display_serializer.data)
         return Response(display_serializer.data, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK,
                         headers=headers)
 
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        CART_MUTATIONS.labels('user', 'update').inc()
+
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        CART_MUTATIONS.labels('user', 'remove').inc()
+
 
 # --- Order API Views ---
 class OrderCreateView(generics.CreateAPIView):
@@ -152,13 +285,24 @@ class OrderCreateView(generics.CreateAPIView):
         return Response(read_serializer.data, status=status.HTTP_201_CREATED, headers=headers)
 
 
-class OrderViewSet(viewsets.ReadOnlyModelViewSet):
-    """API endpoint for listing and retrieving an authenticated user's orders."""
+class OrderViewSet(StreamingListMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    API endpoint for listing and retrieving an authenticated user's orders, archived ones included.
+    The list is paginated only when `?limit=` (and `?offset=`) is given; long unpaginated lists are streamed.
+    """
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = LimitOffsetPagination
+    lookup_value_regex = r'\d+'
 
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user)
+        return OrderHistory(self.request.user)
+
+    def get_object(self):
+        order = get_user_order(self.request.user, self.kwargs['pk'])
+        if order is None:
+            raise Http404
+        return order
 
 
 # --- Payment API Views ---
@@ -170,9 +314,11 @@ class CreatePaymentIntentView(generics.GenericAPIView):
     def post(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        order = get_object_or_404(Order, pk=serializer.validated_data['order_id'], user=request.user)
-        stripe.api_key = settings.STRIPE_SECRET_KEY
+        order = get_object_or_404(Order.objects.using(user_db(request.user)),
+                                  pk=serializer.validated_data['order_id'], user=request.user)
+        stripe = get_stripe()
 
+        start = time.perf_counter()
         try:
             intent = stripe.PaymentIntent.create(
                 amount=int(order.total_amount * 100),
@@ -180,9 +326,11 @@ class CreatePaymentIntentView(generics.GenericAPIView):
                 automatic_payment_methods={'enabled': True},
                 metadata={'order_id': order.id, 'user_id': request.user.id}
             )
-            return Response({'clientSecret': intent.client_secret})
         except Exception as e:
+            STRIPE_REQUEST_DURATION.labels('payment_intent.create', 'error').observe(time.perf_counter() - start)
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        STRIPE_REQUEST_DURATION.labels('payment_intent.create', 'ok').observe(time.perf_counter() - start)
+        return Response({'clientSecret': intent.client_secret})
 
 
 class ConfirmOrderPaymentView(generics.GenericAPIView):
@@ -193,80 +341,189 @@ class ConfirmOrderPaymentView(generics.GenericAPIView):
     def post(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        order = get_object_or_404(Order, pk=serializer.validated_data['order_id'], user=request.user)
-        order.is_completed = True
-        order.transaction_id = request.data.get('transaction_id', f"mock_{order.id}")
-        order.save(update_fields=['is_completed', 'transaction_id'])
+        db = user_db(request.user)
+        with shard_and_catalog_atomic(db):
+            order = get_object_or_404(Order.objects.using(db).select_for_update(),
+                                      pk=serializer.validated_data['order_id'], user=request.user)
+            newly_completed = not order.is_completed
+            order.is_completed = True
+            order.transaction_id = request.data.get('transaction_id', f"mock_{order.id}")
+            order.save(update_fields=['is_completed', 'transaction_id'])
+            if newly_completed:
+                fold_in_late_completions([order], using=db)
         return Response({'status': 'success', 'message': f'Order {order.id} marked as paid.'})
 
 
+class StripeWebhookView(APIView):
+    """
+    Stripe webhook endpoint. Verifies the signature, stores the raw event in the StripeEvent inbox
+    (duplicates are dropped by event id) and acknowledges at once; `manage.py process_stripe_events`
+    applies the events to orders in batches.
+    """
+    permission_classes = [permissions.AllowAny]
+    authentication_classes = []
+
+    def post(self, request, *args, **kwargs):
+        if not settings.STRIPE_WEBHOOK_SECRET:
+            return Response({'error': 'Webhook signing secret is not configured.'},
+                            status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        try:
+            payload = request.body.decode('utf-8')
+            event = verify_stripe_event(payload, request.META.get('HTTP_STRIPE_SIGNATURE', ''))
+        except (get_stripe().SignatureVerificationError, ValueError) as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        store_stripe_event(event, payload)
+        return Response({'received': True})
+
+
+# --- Analytics API Views ---
+class SalesReportView(generics.GenericAPIView):
+    """Staff API endpoint reporting sales by day, category or product from the rollup tables."""
+    serializer_class = SalesReportQuerySerializer
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return Response(sales_report(**serializer.validated_data))
+
+
 # =============================================================================
 # --- Web Page Views (Django Templates) ---
 # =============================================================================
 
+def _query_with(request, **params):
+    """Returns the current query string with `params` set (or removed when None)."""
+    query = request.GET.copy()
+    for name, value in params.items():
+        query.pop(name, None)
+        if value is not None:
+            query[name] = value
+    return query.urlencode()
+
+
+@anonymous_page_cache('product-list', scope=product_list_scope)
 def product_list(request):
-    """Displays the home page with a list of all available products."""
-    products = Product.objects.filter(is_available=True)
-    context = {'products': products}
+    """
+    Displays the home page with a list of all available products, optionally sorted via `?sort=`
+    and filtered by category, price range and stock, with facet counts in the sidebar.
+    """
+    sort = request.GET.get('sort', 'newest')
+    if sort not in PRODUCT_ORDERINGS:
+        sort = 'newest'
+    filter_serializer = ProductFilterSerializer(data=request.GET)
+    filters = filter_serializer.validated_data if filter_serializer.is_valid() else {}
+
+    products = filter_products(Product.objects.filter(is_available=True), filters).order_by(*PRODUCT_ORDERINGS[sort])
+    facets = get_product_facets(filters)
+    for category in facets['categories']:
+        category['selected'] = category['id'] == filters.get('category')
+        category['query'] = _query_with(request, category=None if category['selected'] else category['id'])
+    for price_range in facets['price_ranges']:
+        price_range['selected'] = (price_range['min_price'] == filters.get('min_price')
+                                   and price_range['max_price'] == filters.get('max_price'))
+        price_range['query'] = _query_with(request, min_price=None, max_price=None) if price_range['selected'] \
+            else _query_with(request, min_price=price_range['min_price'], max_price=price_range['max_price'])
+    in_stock_query = _query_with(request, in_stock=None if filters.get('in_stock') else 'true')
+
+    context = {'products': products, 'sort': sort, 'facets': facets, 'filters': filters,
+               'in_stock_query': in_stock_query}
     return render(request, 'store/product_list.html', context)
 
 
+@anonymous_page_cache('product-detail', scope=product_detail_scope)
 def product_detail(request, pk):
     """Displays the detail page for a single product."""
     product = get_object_or_404(Product, pk=pk, is_available=True)
-    context = {'product': product}
+    context = {'product': product, 'related_products': get_related_products(pk)}
     return render(request, 'store/product_detail.html', context)
 
 
-@login_required
 def add_to_cart(request, product_id):
-    """Handles adding a product to the cart. Handles GET requests after login redirect."""
+    """Handles adding a product to the cart; anonymous visitors get a cookie-backed guest cart."""
     product = get_object_or_404(Product, pk=product_id)
-
-    if request.method == 'GET':
-        messages.info(request, "You are now logged in. Please try adding the item again.")
-        return redirect('product_detail', pk=product_id)
+    response = redirect('product_detail', pk=product_id)
 
     if request.method == 'POST':
-        cart, _ = Cart.objects.get_or_create(user=request.user)
         try:
             quantity_to_add = int(request.POST.get('quantity', 1))
             if quantity_to_add < 1:
                 messages.error(request, "Quantity must be at least 1.")
-                return redirect('product_detail', pk=product_id)
+                return response
         except (ValueError, TypeError):
             messages.error(request, "Invalid quantity.")
-            return redirect('product_detail', pk=product_id)
-
-        cart_item, _ = CartItem.objects.get_or_create(cart=cart, product=product, defaults={'quantity': 0})
-        prospective_total = cart_item.quantity + quantity_to_add
+            return response
+
+        if request.user.is_authenticated:
+            db = user_db(request.user)
+            cart, _ = Cart.objects.using(db).get_or_create(user=request.user)
+            cart_item, _ = CartItem.objects.using(db).get_or_create(cart=cart, product=product,
+                                                                    defaults={'quantity': 0})
+            prospective_total = cart_item.quantity + quantity_to_add
+        else:
+            guest_cart = read_guest_cart(request)
+            prospective_total = guest_cart.get(product.pk, 0) + quantity_to_add
+            if product.pk not in guest_cart and len(guest_cart) >= settings.GUEST_CART_MAX_ITEMS:
+                messages.error(request, "Your cart is full. Please log in to add more products.")
+                return response
 
         if prospective_total > product.stock:
+            STOCK_CONFLICTS.labels('cart').inc()
             messages.error(request,
                            f"Cannot add {quantity_to_add} of '{product.name}'. Only {product.stock} available.")
-        else:
+        elif request.user.is_authenticated:
             cart_item.quantity = prospective_total
             cart_item.save()
+            CART_MUTATIONS.labels('user', 'add').inc()
+            messages.success(request, f"Updated cart with {quantity_to_add} x {product.name}.")
+        else:
+            write_guest_cart(response, {**guest_cart, product.pk: prospective_total})
+            CART_MUTATIONS.labels('guest', 'add').inc()
             messages.success(request, f"Updated cart with {quantity_to_add} x {product.name}.")
 
-    return redirect('product_detail', pk=product_id)
+    return response
 
 
-@login_required
 def cart_detail(request):
-    """Displays the user's shopping cart."""
-    cart, _ = Cart.objects.get_or_create(user=request.user)
+    """Displays the user's shopping cart, or the visitor's guest cart."""
+    if request.user.is_authenticated:
+        cart = get_cart(request.user)
+    else:
+        cart = GuestCart(read_guest_cart(request))
     context = {'cart': cart}
     return render(request, 'store/cart_detail.html', context)
 
 
+@require_POST
+def update_guest_cart_item(request, product_id):
+    """Sets the quantity of a product in the guest cart; 0 removes it."""
+    guest_cart = read_guest_cart(request)
+    try:
+        quantity = max(int(request.POST.get('quantity')), 0)
+    except (ValueError, TypeError):
+        messages.error(request, "Invalid quantity provided.")
+        return redirect('cart_detail')
+
+    product = get_object_or_404(Product, pk=product_id)
+    if quantity > product.stock:
+        STOCK_CONFLICTS.labels('cart').inc()
+        messages.error(request, f"Cannot update quantity. Only {product.stock} of {product.name} available.")
+        return redirect('cart_detail')
+
+    response = redirect('cart_detail')
+    write_guest_cart(response, {**guest_cart, product.pk: quantity})
+    CART_MUTATIONS.labels('guest', 'update' if quantity else 'remove').inc()
+    return response
+
+
 @login_required
 @require_POST
 def remove_from_cart(request, item_id):
     """Removes an item from the cart."""
-    cart_item = get_object_or_404(CartItem, id=item_id, cart__user=request.user)
+    cart_item = get_object_or_404(CartItem.objects.using(user_db(request.user)), id=item_id, cart__user=request.user)
     product_name = cart_item.product.name
     cart_item.delete()
+    CART_MUTATIONS.labels('user', 'remove').inc()
     messages.success(request, f"Removed {product_name} from your cart.")
     return redirect('cart_detail')
 
@@ -275,7 +532,7 @@ def remove_from_cart(request, item_id):
 @require_POST
 def update_cart_item(request, item_id):
     """Updates the quantity of an item in the cart."""
-    cart_item = get_object_or_404(CartItem, id=item_id, cart__user=request.user)
+    cart_item = get_object_or_404(CartItem.objects.using(user_db(request.user)), id=item_id, cart__user=request.user)
     try:
         quantity = int(request.POST.get('quantity'))
     except (ValueError, TypeError):
@@ -284,13 +541,16 @@ def update_cart_item(request, item_id):
 
     if quantity <= 0:
         cart_item.delete()
+        CART_MUTATIONS.labels('user', 'remove').inc()
         messages.success(request, f"Removed {cart_item.product.name} from your cart.")
     elif quantity > cart_item.product.stock:
+        STOCK_CONFLICTS.labels('cart').inc()
         messages.error(request,
                        f"Cannot update quantity. Only {cart_item.product.stock} of {cart_item.product.name} available.")
     else:
         cart_item.quantity = quantity
         cart_item.save()
+        CART_MUTATIONS.labels('user', 'update').inc()
         messages.success(request, f"Updated quantity for {cart_item.product.name}.")
 
     return redirect('cart_detail')
@@ -299,7 +559,7 @@ def update_cart_item(request, item_id):
 @login_required
 def checkout_page_view(request):
     """Displays the checkout page with cart summary and address form."""
-    cart, _ = Cart.objects.get_or_create(user=request.user)
+    cart = get_cart(request.user)
     if not cart.items.exists():
         messages.info(request, "Your cart is empty.")
         return redirect('cart_detail')
@@ -321,13 +581,14 @@ def checkout_page_view(request):
 def create_order_from_cart_view(request):
     """Handles the creation of an order from the cart using the credits system."""
     user = request.user
-    cart = get_object_or_404(Cart, user=user)
+    cart = get_object_or_404(Cart.objects.using(user_db(user)), user=user)
     if not cart.items.exists():
         messages.error(request, "Your cart is empty.")
         return redirect('cart_detail')
 
     cart_total = cart.get_total_price()
     if user.credits < cart_total:
+        CHECKOUTS.labels('insufficient_credits').inc()
         messages.error(request, f"Insufficient credits. You need ${cart_total:.2f} but only have ${user.credits:.2f}.")
         return redirect('checkout_page')
 
@@ -339,7 +600,9 @@ def create_order_from_cart_view(request):
             user.save(update_fields=['credits'])
             order.is_completed = True
             order.transaction_id = f"credits_{order.id}_{timezone.now().strftime('%Y%m%d%H%M%S')}"
-            order.save(update_fields=['is_completed', 'transaction_id'])
+            with shard_and_catalog_atomic(order._state.db):
+                order.save(update_fields=['is_completed', 'transaction_id'])
+                fold_in_late_completions([order], using=order._state.db)
             messages.success(request, f"Thank you! Order #{order.id} placed. New balance: ${user.credits:.2f}.")
             return redirect('order_success', order_id=order.id)
         except (serializers.ValidationError, Exception) as e:
@@ -354,7 +617,7 @@ def create_order_from_cart_view(request):
 @login_required
 def order_success_view(request, order_id):
     """Displays the order confirmation page."""
-    order = get_object_or_404(Order, id=order_id, user=request.user)
+    order = get_object_or_404(Order.objects.using(user_db(request.user)), id=order_id, user=request.user)
     context = {'order': order}
     return render(request, 'store/order_success.html', context)
 
@@ -362,9 +625,8 @@ def order_success_view(request, order_id):
 @login_required
 def my_orders_view(request):
     """Displays the user's order history."""
-    orders = Order.objects.filter(user=request.user).prefetch_related('items', 'items__product').order_by(
-        '-date_ordered')
-    context = {'orders': orders}
+    page = Paginator(OrderHistory(request.user), settings.ORDER_HISTORY_PAGE_SIZE).get_page(request.GET.get('page'))
+    context = {'orders': page, 'page_obj': page}
     return render(request, 'store/my_orders.html', context)
 
 
@@ -380,7 +642,7 @@ def login_page_view(request):
             login(request, user)
             messages.success(request, f"Welcome back, {user.username}!")
             next_page = request.GET.get('next')
-            return redirect(next_page) if next_page else redirect('product_list')
+            return _merge_guest_cart(request, user, redirect(next_page) if next_page else redirect('product_list'))
         else:
             messages.error(request, "Invalid username or password.")
     else:
@@ -406,9 +668,36 @@ def register_page_view(request):
             user = form.save()
             login(request, user)
             messages.success(request, f"Registration successful! Welcome, {user.username}.")
-            return redirect('product_list')
+            return _merge_guest_cart(request, user, redirect('product_list'))
         else:
             messages.error(request, "Please correct the errors below.")
     else:
         form = CustomUserCreationForm()
     return render(request, 'store/register.html', {'form': form})
+
+
+def _merge_guest_cart(request, user, response):
+    """Moves the guest cart into the user's cart and drops the cookie from `response`."""
+    if GUEST_CART_COOKIE in request.COOKIES:
+        for product_name in merge_guest_cart(request, user):
+            messages.warning(request, f"Only part of your '{product_name}' quantity is still in stock.")
+        response.delete_cookie(GUEST_CART_COOKIE)
+    return response
+
+
+# =============================================================================
+# --- Monitoring ---
+# =============================================================================
+
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint: the store metrics summed over every worker process. Without a
+    METRICS_TOKEN only logged-in staff may scrape: behind a reverse proxy every request comes
+    from localhost, so the client address proves nothing.
+    """
+    if settings.METRICS_TOKEN:
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {settings.METRICS_TOKEN}'):
+            return HttpResponse("Unauthorized.", status=401, content_type='text/plain')
+    elif not request.user.is_staff:
+        return HttpResponse("Forbidden.", status=403, content_type='text/plain')
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,49 @@
+# store/warmup.py
+
+# --- Django & Python Imports ---
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+from django.template import engines
+from django.urls import URLPattern, get_resolver
+
+# --- Local Application Imports ---
+from .autocomplete import warm_autocomplete
+
+
+def compile_url_patterns(resolver=None):
+    """Imports the URLconf (and with it every view module) and compiles each pattern's regex. Returns the count."""
+    resolver = resolver or get_resolver()
+    resolver.reverse_dict  # noqa: B018  (populates the reverse lookup tables)
+    count = 0
+    for pattern in resolver.url_patterns:
+        pattern.pattern.regex  # noqa: B018  (compiled lazily on first access)
+        count += 1 if isinstance(pattern, URLPattern) else compile_url_patterns(pattern)
+    return count
+
+
+def compile_templates():
+    """Loads every template under the project's template DIRS into the cached loader. Returns the count."""
+    engine = engines['django']
+    names = [path.relative_to(directory).as_posix()
+             for directory in map(Path, engine.dirs) for path in sorted(directory.rglob('*.html'))]
+    for name in names:
+        engine.get_template(name)
+    return len(names)
+
+
+def warm_up_worker():
+    """
+    Called from wsgi.py / asgi.py before the worker serves traffic. With WORKER_WARMUP, does the work
+    the first requests would otherwise pay for: building the product autocomplete index (a full
+    catalog scan), importing the views, compiling URL patterns and compiling templates. Without it,
+    importing the WSGI module touches no database and the index is built by the first search.
+    Under a preloading server (gunicorn --preload) this runs once in the master and is shared by the forks.
+    """
+    if settings.WORKER_WARMUP:
+        warm_autocomplete()
+        compile_url_patterns()
+        compile_templates()
+    # Forked workers must open their own connections: a socket shared across processes corrupts the protocol.
+    connections.close_all()